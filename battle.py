@@ -1,41 +1,289 @@
-import random
 import json
-from mixins import LoggerMixin
+import bisect
+import heapq
+import itertools
+import streams
+from collections import deque
+from mixins import LoggerMixin, LOG_SIZE
+from events import EventBus, ConsoleSubscriber
+from profiler import wait_input
 
 class TurnOrder:
-    """Итератор для определения порядка ходов"""
+    """Итератор для определения порядка ходов
+    
+    Порядок хранится отсортированным по ключу (-ловкость, порядок добавления)
+    и переиспользуется между раундами: при равной ловкости первым ходит тот,
+    кто раньше в списке. Позиция участника пересчитывается только если его
+    ловкость изменилась, павшие удаляются бинарным поиском в конце раунда.
+    """
     
     def __init__(self, participants):
         self.participants = participants
         self.current_turn = 0
-        self.order = self.calculate_order()
+        self.order = []
+        self._keys = []
+        self._key_of = {}
+        self._stale = []
+        self._counter = itertools.count()
+        for participant in participants:
+            self.add(participant)
+    
+    def add(self, participant, index=None):
+        """Добавление участника в порядок ходов"""
+        if index is None:
+            index = next(self._counter)
+        key = (-participant.agility, index)
+        position = bisect.bisect(self._keys, key)
+        self._keys.insert(position, key)
+        self.order.insert(position, participant)
+        self._key_of[id(participant)] = key
+        if position < self.current_turn:
+            self.current_turn += 1
+    
+    def remove(self, participant):
+        """Удаление участника: поиск позиции за O(log n)"""
+        key = self._key_of.pop(id(participant), None)
+        if key is None:
+            return
+        position = bisect.bisect_left(self._keys, key)
+        del self._keys[position]
+        del self.order[position]
+        if position < self.current_turn:
+            self.current_turn -= 1
     
     def calculate_order(self):
-        """Расчет порядка ходов на основе ловкости"""
-        return sorted(self.participants, key=lambda x: x.agility, reverse=True)
+        """Порядок ходов на основе ловкости"""
+        return list(self.order)
+    
+    @property
+    def position(self):
+        """Позиция внутри раунда: индекс в participants того, кто ходит следующим
+        
+        len(participants) - ходы раунда закончились.
+        """
+        if self.current_turn < len(self.order):
+            return self._keys[self.current_turn][1]
+        return len(self.participants)
+    
+    def seek(self, round_number, position):
+        """Продолжение раунда round_number с позиции position в новом порядке ходов"""
+        if position >= len(self.participants):
+            self.current_turn = len(self.order)
+        else:
+            participant = self.participants[position]
+            self.current_turn = bisect.bisect_left(self._keys, (-participant.agility, position))
     
     def __iter__(self):
         return self
     
     def __next__(self):
-        if self.current_turn >= len(self.order):
-            self.current_turn = 0
-            self.order = self.calculate_order()
-            raise StopIteration
-        
-        participant = self.order[self.current_turn]
-        self.current_turn += 1
-        return participant
+        while self.current_turn < len(self.order):
+            participant = self.order[self.current_turn]
+            key = self._keys[self.current_turn]
+            self.current_turn += 1
+            
+            if not participant.is_alive:
+                self._stale.append(participant)
+                continue
+            if -key[0] != participant.agility:
+                # Новая ловкость учитывается со следующего раунда
+                self._stale.append(participant)
+            return participant
+        
+        self.current_turn = 0
+        for participant in self._stale:
+            index = self._key_of[id(participant)][1]
+            self.remove(participant)
+            if participant.is_alive:
+                self.add(participant, index)
+        self._stale.clear()
+        raise StopIteration
+
+
+class SpeedTurnOrder(TurnOrder):
+    """Порядок ходов с несколькими действиями за раунд
+    
+    Участники лежат в куче по ключу (время хода, -ловкость, порядок добавления).
+    Интервал между ходами обратно пропорционален ловкости: участник вдвое
+    ловчее самого медленного ходит дважды за раунд. Извлечение, возврат в
+    очередь и удаление павшего стоят O(log n).
+    """
+    
+    def __init__(self, participants):
+        self.participants = participants
+        self.round_end = 1
+        # Извлечений из очереди в текущем раунде, включая ходы павших
+        self._popped = 0
+        self.speed_unit = min((p.agility for p in participants), default=1)
+        self._heap = []
+        self._entries = {}
+        self._counter = itertools.count()
+        for participant in participants:
+            self.add(participant)
+    
+    def add(self, participant, index=None, time=None):
+        """Добавление участника; по умолчанию он ходит уже в текущем раунде"""
+        if index is None:
+            index = next(self._counter)
+        if time is None:
+            time = self.round_end - 1
+        entry = [time, -participant.agility, index, participant]
+        self._entries[id(participant)] = entry
+        heapq.heappush(self._heap, entry)
+    
+    def remove(self, participant):
+        """Запись помечается удаленной и выбрасывается при извлечении"""
+        entry = self._entries.pop(id(participant), None)
+        if entry is not None:
+            entry[-1] = None
+    
+    def interval(self, participant):
+        return self.speed_unit / participant.agility
+    
+    def calculate_order(self):
+        entries = sorted(entry for entry in self._heap if entry[-1] is not None)
+        return [entry[-1] for entry in entries]
+    
+    @property
+    def order(self):
+        return self.calculate_order()
+    
+    @property
+    def position(self):
+        """Позиция внутри раунда: число извлечений из очереди с начала раунда"""
+        return self._popped
+    
+    def _pop(self):
+        """Следующая запись раунда: участник возвращается в очередь на время следующего хода
+        
+        Павшие тоже остаются в очереди до конца раунда, поэтому число извлечений
+        (_popped) не зависит от того, кто пал, и seek() его повторяет.
+        """
+        heap = self._heap
+        while heap:
+            time, priority, index, participant = heap[0]
+            if participant is None:
+                heapq.heappop(heap)
+                continue
+            if time >= self.round_end:
+                return None
+            
+            heapq.heappop(heap)
+            if participant.is_alive and -priority != participant.agility:
+                # Ловкость изменилась: возвращаем участника в очередь с новым ключом
+                self.add(participant, index, time)
+                continue
+            
+            self.add(participant, index, time + self.interval(participant))
+            self._popped += 1
+            return participant
+        return None
+    
+    def seek(self, round_number, position):
+        """Продолжение раунда round_number после position извлечений в новом порядке ходов"""
+        for entry in self._heap:
+            participant = entry[-1]
+            if participant is not None:
+                # Время накапливается сложением, как при обычной игре раундов
+                while entry[0] < round_number - 1:
+                    entry[0] += self.interval(participant)
+        heapq.heapify(self._heap)
+        self.round_end = round_number
+        for _ in range(position):
+            self._pop()
+    
+    def __next__(self):
+        participant = self._pop()
+        while participant is not None:
+            if participant.is_alive:
+                return participant
+            participant = self._pop()
+        
+        for participant in list(self.participants):
+            if not participant.is_alive:
+                self.remove(participant)
+        self.round_end += 1
+        self._popped = 0
+        raise StopIteration
 
 class Battle(LoggerMixin):
     """Класс управления боем"""
     
-    def __init__(self, party, boss):
+    def __init__(self, party, boss, multiple_actions=False, rng=None):
         super().__init__()
         self.party = party
         self.boss = boss
+        self.multiple_actions = multiple_actions
         self.round = 0
         self.is_active = True
+        self.winner = None
+        # Сложность, с которой создан бой (для сохранений); None - неизвестна
+        self.difficulty = None
+        # Собственный поток случайных чисел боя (streams.new_stream);
+        # его состояние входит в снимок
+        self.rng = rng if rng is not None else streams.new_stream()
+        # Запись повтора боя (replay.Recorder)
+        self.recorder = None
+        # Журнал автосохранения (journal.Journal), включается enable_autosave
+        self.journal = None
+        # Поток записи сохранений (savewriter.BackgroundWriter)
+        self.writer = None
+        # Каталог сохранений (catalog.SaveCatalog); без него снимки пишутся как есть
+        self.catalog = None
+        # Подсказки на ходу игрока (hints.HintEngine)
+        self.hints = None
+        # Позиция внутри раунда (TurnOrder.position) после последнего хода;
+        # None - между раундами. Пишется в журнал, чтобы восстановленный бой
+        # продолжил прерванный раунд
+        self.turn_position = None
+        
+        # Участники сообщают о действиях через шину боя
+        self.events = self.create_event_bus()
+        for participant in self.party + [self.boss]:
+            participant.events = self.events
+            participant.rng = self.rng
+    
+    def create_event_bus(self):
+        """Шина событий боя с выводом в консоль"""
+        bus = EventBus()
+        ConsoleSubscriber(bus)
+        return bus
+    
+    def clone(self):
+        """Копия боя для поиска и оценки «что если»
+        
+        Копируется только изменяемое боевое состояние: HP, MP, характеристики,
+        перезарядки, эффекты, немота, раунд и ГСЧ. Навыки и стратегии босса
+        общие с оригиналом. У копии своя шина событий без подписчиков, пустой
+        журнал без вывода, нет записи повтора, автосохранения и каталога.
+        """
+        cls = type(self)
+        clone = cls.__new__(cls)
+        clone.__dict__.update(self.__dict__)
+        clone.party = [participant.copy() for participant in self.party]
+        clone.boss = self.boss.copy()
+        clone.rng = streams.copy(self.rng)
+        clone.recorder = clone.journal = clone.writer = clone.catalog = clone.hints = None
+        clone._log = deque(maxlen=LOG_SIZE)
+        clone.log_echo = False
+        clone.log_sink = None
+        clone.events = EventBus()
+        for participant in clone.party + [clone.boss]:
+            participant.events = clone.events
+            participant.rng = clone.rng
+        return clone
+    
+    def restore(self, saved):
+        """Возвращает бой в состояние saved - копии этого боя из clone()
+        
+        saved не меняется, поэтому к нему можно возвращаться много раз.
+        """
+        for participant, state in zip(self.party + [self.boss], saved.party + [saved.boss]):
+            participant.restore(state)
+        self.rng.setstate(saved.rng.getstate())
+        self.round = saved.round
+        self.is_active = saved.is_active
+        self.winner = saved.winner
     
     def save_state(self, filename):
         """Сохранение состояния боя в JSON"""
@@ -64,12 +312,54 @@ class Battle(LoggerMixin):
             with open(filename, 'w', encoding='utf-8') as f:
                 json.dump(state, f, ensure_ascii=False, indent=2)
             
-            self.add_log(f"✓ Игра сохранена в файл: {filename}")
+            self.add_log("✓ Игра сохранена в файл: %s", filename)
             return True
         except Exception as e:
-            self.add_log(f"✗ Ошибка при сохранении: {e}")
+            self.add_log("✗ Ошибка при сохранении: %s", e)
             return False
     
+    def save_snapshot(self, filename):
+        """Сохранение полного состояния боя в двоичный снимок (.pbs)
+        
+        В потоке боя снимается только неизменяемая копия состояния; кодирование
+        и запись на диск идут в фоновом потоке.
+        """
+        import snapshot
+        self.report_save_errors()
+        if not filename.endswith(snapshot.EXTENSION):
+            filename += snapshot.EXTENSION
+        if self.catalog is not None:
+            self.save_writer().submit(self.catalog.write, snapshot.freeze(self), filename)
+        else:
+            self.save_writer().submit(snapshot.write_state, snapshot.freeze(self), filename)
+        self.add_log("✓ Игра сохраняется в файл: %s", filename)
+        return True
+    
+    def save_writer(self):
+        """Фоновый поток сохранений боя, создается при первом сохранении"""
+        if self.writer is None:
+            from savewriter import BackgroundWriter
+            self.writer = BackgroundWriter()
+        return self.writer
+    
+    def report_save_errors(self):
+        if self.writer is not None:
+            for error in self.writer.pop_errors():
+                self.add_log("✗ Ошибка при сохранении: %s", error)
+    
+    def wait_for_saves(self):
+        """Дожидается записи всех сохранений"""
+        if self.writer is not None:
+            self.writer.flush()
+            self.report_save_errors()
+    
+    def enable_autosave(self, basename, checkpoint_every=10, sync=True, background=True):
+        """Автосохранение: изменения после каждого хода и контрольная точка каждые N раундов"""
+        from journal import Journal
+        writer = self.save_writer() if background else None
+        self.journal = Journal(basename, checkpoint_every, sync, writer)
+        self.journal.checkpoint(self)
+    
     def load_state(self, filename):
         """Загрузка состояния боя из JSON"""
         try:
@@ -88,29 +378,61 @@ class Battle(LoggerMixin):
                 char.hp = char_data["hp"]
                 char.mp = char_data["mp"]
             
-            self.add_log(f"✓ Состояние боя загружено из {filename}")
+            self.add_log("✓ Состояние боя загружено из %s", filename)
             return True
         except FileNotFoundError:
             self.add_log("✗ Файл сохранения не найден!")
             return False
         except Exception as e:
-            self.add_log(f"✗ Ошибка при загрузке: {e}")
+            self.add_log("✗ Ошибка при загрузке: %s", e)
             return False
     
     def start_battle(self):
         """Запуск боя"""
         self.add_log("=== НАЧАЛО БОЯ ===")
-        self.add_log(f"Босс: {self.boss}")
+        self.add_log("Босс: %s", self.boss)
         self.add_log("Группа:")
         for char in self.party:
-            self.add_log(f"  - {char}")
+            self.add_log("  - %s", char)
         
-        turn_order = TurnOrder(self.party + [self.boss])
+        try:
+            turn_order = self.resume(self.create_turn_order())
+            while self.is_active:
+                self.play_round(turn_order)
+        finally:
+            # И при Ctrl+C или ошибке записи из очереди доходят до диска:
+            # поток записи - демон и при выходе интерпретатора не ждет
+            if self.journal is not None:
+                self.journal.close()
+            if self.writer is not None:
+                self.writer.close()
+                self.report_save_errors()
         
-        while self.is_active:
-            self.round += 1
-            self.add_log(f"\n=== РАУНД {self.round} ===")
-            
+        if self.recorder is not None:
+            self.recorder.finish(self)
+    
+    def create_turn_order(self):
+        if self.multiple_actions:
+            return SpeedTurnOrder(self.party + [self.boss])
+        return TurnOrder(self.party + [self.boss])
+    
+    def resume(self, turn_order):
+        """Доигрывает раунд, прерванный на позиции turn_position (бой из журнала)"""
+        if self.turn_position is not None:
+            turn_order.seek(self.round, self.turn_position)
+            self.finish_round(turn_order)
+        return turn_order
+    
+    def play_round(self, turn_order):
+        """Один раунд боя: ходы всех живых участников и обновление эффектов"""
+        self.round += 1
+        self.add_log("\n=== РАУНД %s ===", self.round)
+        self.turn_position = turn_order.position
+        self.finish_round(turn_order)
+    
+    def finish_round(self, turn_order):
+        """Ходы раунда с текущей позиции turn_order и конец раунда"""
+        if self.is_active:
             for participant in turn_order:
                 if not participant.is_alive:
                     continue
@@ -118,18 +440,36 @@ class Battle(LoggerMixin):
                 self.process_turn(participant)
                 
                 # Проверка условий окончания боя
-                if not self.boss.is_alive:
-                    self.add_log("=== ПОБЕДА! Босс повержен! ===")
-                    self.is_active = False
+                ended = self.check_battle_end()
+                self.turn_position = turn_order.position
+                if self.journal is not None:
+                    self.journal.record(self)
+                if ended:
                     break
-                
-                if all(not char.is_alive for char in self.party):
-                    self.add_log("=== ПОРАЖЕНИЕ! Вся группа пала! ===")
-                    self.is_active = False
-                    break
-            
-            # Обновление эффектов в конце раунда
-            self.update_all_effects()
+        
+        # Обновление эффектов в конце раунда
+        self.update_all_effects()
+        self.turn_position = None
+        if self.journal is not None:
+            self.journal.end_round(self)
+        if self.recorder is not None:
+            self.recorder.end_round(self)
+    
+    def check_battle_end(self):
+        """Проверка условий окончания боя"""
+        if not self.boss.is_alive:
+            self.add_log("=== ПОБЕДА! Босс повержен! ===")
+            self.winner = "party"
+            self.is_active = False
+            return True
+        
+        if all(not char.is_alive for char in self.party):
+            self.add_log("=== ПОРАЖЕНИЕ! Вся группа пала! ===")
+            self.winner = "boss"
+            self.is_active = False
+            return True
+        
+        return False
     
     def update_all_effects(self):
         """Обновление всех эффектов в конце раунда"""
@@ -137,7 +477,7 @@ class Battle(LoggerMixin):
             if participant.is_alive:
                 # Обновляем эффекты
                 effects_to_remove = []
-                for effect in participant.effects[:]:
+                for effect in list(participant.effects):
                     if effect.update(participant):
                         effects_to_remove.append(effect)
                 
@@ -150,7 +490,7 @@ class Battle(LoggerMixin):
     
     def process_turn(self, participant):
         """Обработка хода участника"""
-        self.add_log(f"\nХод {participant.name}:")
+        self.add_log("\nХод %s:", participant.name)
         
         # Обработка эффектов в начале хода
         self.process_start_of_turn_effects(participant)
@@ -158,6 +498,10 @@ class Battle(LoggerMixin):
         if not participant.is_alive:
             return
         
+        self.take_action(participant)
+    
+    def take_action(self, participant):
+        """Действие участника после эффектов начала хода"""
         if hasattr(participant, 'choose_action') and participant.__class__.__name__ == 'Boss':
             # Ход босса
             participant.choose_action(self.party)
@@ -167,9 +511,8 @@ class Battle(LoggerMixin):
     
     def process_start_of_turn_effects(self, participant):
         """Обработка эффектов в начале хода"""
-        for effect in participant.effects[:]:
-            if hasattr(effect, 'on_turn_start'):
-                effect.on_turn_start(participant)
+        for effect in participant.effects.turn_start():
+            effect.on_turn_start(participant)
     
     def choose_target(self, prompt, allow_self=False, allow_party=True, allow_boss=True):
         """Выбор цели с дополнительными параметрами"""
@@ -202,7 +545,7 @@ class Battle(LoggerMixin):
             print(f"{len(targets) + 1}. На себя - {current_player.name} (HP: {current_player.hp}/{current_player.max_hp})")
         
         try:
-            target_choice = int(input("Выберите цель: ")) - 1
+            target_choice = int(wait_input("Выберите цель: ")) - 1
             
             # Если выбрана опция "на себя"
             if allow_self and current_player and target_choice == len(targets):
@@ -231,20 +574,22 @@ class Battle(LoggerMixin):
         print("3. Использовать предмет")
         print("4. Пропустить ход")
         print("5. Сохранить игру")
+        if self.hints is not None:
+            print("6. Подсказка")
+            # Действия оцениваются, пока игрок выбирает; выбор отменяет поиск
+            self.hints.start(self, player)
         
         while True:
             try:
-                choice = int(input("Выберите действие: "))
+                choice = int(wait_input("Выберите действие: "))
                 
                 if choice == 1:
                     target = self.choose_target("Выберите цель для атаки:", allow_self=False, allow_party=False, allow_boss=True)
-                    if target:
-                        success = player.basic_attack(target)
-                        if success:
-                            print("✓ Атака успешна!")
-                        break
-                    else:
-                        break
+                    # Без цели ход теряется - записывается как пропуск
+                    action = ("attack", None, target) if target else ("skip", None, None)
+                    if self.perform_action(player, action) and target:
+                        print("✓ Атака успешна!")
+                    break
                 
                 elif choice == 2:
                     self.use_skill(player)
@@ -256,17 +601,22 @@ class Battle(LoggerMixin):
                 
                 elif choice == 4:
                     print(f"{player.name} пропускает ход.")
+                    self.perform_action(player, ("skip", None, None))
                     break
                 
                 elif choice == 5:
-                    filename = input("Введите имя файла для сохранения: ").strip()
+                    filename = wait_input("Введите имя файла для сохранения: ").strip()
                     if filename:
-                        self.save_state(filename)
+                        self.save_snapshot(filename)
                     else:
                         print("Имя файла не может быть пустым!")
                     # Продолжаем ход после сохранения
                     continue
                 
+                elif choice == 6 and self.hints is not None:
+                    print(self.hints.format())
+                    continue
+                
                 else:
                     print("Неверный выбор!")
             
@@ -275,27 +625,33 @@ class Battle(LoggerMixin):
     
     def use_skill(self, player):
         """Использование навыка игроком"""
+        action = self.choose_skill_action(player)
+        success = self.perform_action(player, action)
+        if success and action[0] == "skill":
+            print("✓ Навык использован успешно!")
+        return success
+    
+    def choose_skill_action(self, player):
+        """Выбор навыка и цели; при неверном выборе - пропуск хода"""
+        skip = ("skip", None, None)
         print("\nДоступные навыки:")
         for i, skill in enumerate(player.skills):
             cooldown = player.cooldowns.get(skill.name, 0)
             print(f"{i + 1}. {skill} {'(КД: ' + str(cooldown) + ')' if cooldown > 0 else ''}")
         
         try:
-            skill_choice = int(input("Выберите навык: ")) - 1
+            skill_choice = int(wait_input("Выберите навык: ")) - 1
             if skill_choice < 0 or skill_choice >= len(player.skills):
                 print("Неверный индекс навыка!")
-                return False
+                return skip
             
             skill = player.skills[skill_choice]
             
             # Определяем параметры выбора цели в зависимости от типа навыка
-            from skills import HealSkill, EffectSkill
+            from skills import EffectSkill
             from effects import ShieldEffect
             
-            is_healing_or_shield = (isinstance(skill, HealSkill) or 
-                                  (isinstance(skill, EffectSkill) and skill.effect_class == ShieldEffect))
-            
-            if is_healing_or_shield:
+            if self.is_support_skill(skill):
                 # Лечебные и защитные навыки можно применять на себя и союзников
                 target = self.choose_target("Выберите цель:", allow_self=True, allow_party=True, allow_boss=False)
             else:
@@ -306,43 +662,210 @@ class Battle(LoggerMixin):
                 # Дополнительная проверка для защитных навыков
                 if (isinstance(skill, EffectSkill) and skill.effect_class == ShieldEffect and target == self.boss):
                     print("Нельзя наложить щит на босса!")
-                    return False
+                    return skip
                 
-                success = player.use_skill(skill_choice, target)
-                if success:
-                    print("✓ Навык использован успешно!")
-                return success
+                return ("skill", skill_choice, target)
             
-            return False
+            return skip
         
         except ValueError:
             print("Пожалуйста, введите число!")
-            return False
+            return skip
     
     def use_item(self, player):
         """Использование предмета игроком"""
-        from items import HealthPotion, ManaPotion, Inventory
-        inventory = Inventory()
-        inventory.add_item(HealthPotion())
-        inventory.add_item(ManaPotion())
+        action = self.choose_item_action()
+        success = self.perform_action(player, action)
+        if success and action[0] == "item":
+            print("✓ Предмет использован успешно!")
+        return success
+    
+    def choose_item_action(self):
+        """Выбор предмета и цели; при неверном выборе - пропуск хода"""
+        skip = ("skip", None, None)
+        inventory = self.create_inventory()
         
         print("\nИнвентарь:")
         print(inventory)
         
         try:
-            item_choice = int(input("Выберите предмет: "))
+            item_choice = int(wait_input("Выберите предмет: "))
+            if item_choice < 0 or item_choice >= len(inventory.items):
+                print("Неверный выбор предмета!")
+                return skip
             # Предметы можно использовать на себя и союзников
             target = self.choose_target("Выберите цель:", allow_self=True, allow_party=True, allow_boss=False)
             if target:
-                success = inventory.use_item(item_choice, target)
-                if success:
-                    print("✓ Предмет использован успешно!")
-                return success
-            return False
+                return ("item", item_choice, target)
+            return skip
         
         except ValueError:
             print("Пожалуйста, введите число!")
-            return False
-        except IndexError:
-            print("Неверный выбор предмета!")
-            return False
\ No newline at end of file
+            return skip
+    
+    @staticmethod
+    def create_inventory():
+        """Инвентарь, доступный персонажу на его ходу"""
+        from items import HealthPotion, ManaPotion, Inventory
+        inventory = Inventory()
+        inventory.add_item(HealthPotion())
+        inventory.add_item(ManaPotion())
+        return inventory
+    
+    @staticmethod
+    def is_support_skill(skill):
+        """Лечебные и защитные навыки применяются на союзников"""
+        from skills import HealSkill, EffectSkill
+        from effects import ShieldEffect
+        return (isinstance(skill, HealSkill) or
+                (isinstance(skill, EffectSkill) and skill.effect_class == ShieldEffect))
+    
+    def legal_actions(self, player):
+        """Все допустимые действия персонажа в виде (тип, индекс, цель)"""
+        actions = []
+        allies = [char for char in self.party if char.is_alive]
+        
+        if self.boss.is_alive:
+            actions.append(("attack", None, self.boss))
+        
+        for i, skill in enumerate(player.skills):
+            if not player.is_skill_ready(skill):
+                continue
+            if self.is_support_skill(skill):
+                actions.extend(("skill", i, ally) for ally in allies)
+            elif self.boss.is_alive:
+                actions.append(("skill", i, self.boss))
+        
+        for i in range(len(self.create_inventory().items)):
+            actions.extend(("item", i, ally) for ally in allies)
+        
+        actions.append(("skip", None, None))
+        return actions
+    
+    def perform_action(self, player, action):
+        """Выполнение действия (тип, индекс, цель) по правилам персонажа"""
+        if self.hints is not None:
+            self.hints.cancel()
+        if self.recorder is not None:
+            self.recorder.record(self, player, action)
+        action_type, index, target = action
+        
+        if action_type == "attack":
+            return player.basic_attack(target)
+        if action_type == "skill":
+            return player.use_skill(index, target)
+        if action_type == "item":
+            return self.create_inventory().use_item(index, target)
+        return False
+
+
+class BattleResult:
+    """Итог боя без участия игрока"""
+    
+    def __init__(self, winner, rounds, stats):
+        self.winner = winner
+        self.rounds = rounds
+        self.stats = stats
+    
+    @property
+    def party_won(self):
+        return self.winner == "party"
+    
+    def __repr__(self):
+        return f"BattleResult(winner={self.winner!r}, rounds={self.rounds})"
+
+
+class HeadlessBattle(Battle):
+    """Бой без wait_input() и print(): персонажами управляют политики"""
+    
+    def __init__(self, party, boss, policies, max_rounds=200, multiple_actions=False, rng=None):
+        super().__init__(party, boss, multiple_actions, rng)
+        # Одна политика на всех или список по порядку группы
+        if not isinstance(policies, (list, tuple)):
+            policies = [policies] * len(party)
+        self.policies = dict(zip(map(id, party), policies))
+        self.max_rounds = max_rounds
+        self.stats = {
+            id(participant): {
+                "name": participant.name,
+                "class": participant.__class__.__name__,
+                "damage_dealt": 0,
+                "damage_taken": 0,
+                "healing_done": 0,
+                "healing_received": 0,
+            }
+            for participant in self.party + [self.boss]
+        }
+    
+    @classmethod
+    def from_battle(cls, battle, policies, max_rounds=200):
+        """Бой без участия игрока, продолжающий текущее состояние любого боя
+        
+        Участники и ГСЧ копируются как в Battle.clone(), исходный бой не меняется.
+        """
+        headless = cls([participant.copy() for participant in battle.party], battle.boss.copy(),
+                       policies, max_rounds, battle.multiple_actions, rng=streams.copy(battle.rng))
+        headless.round = battle.round
+        headless.is_active = battle.is_active
+        headless.winner = battle.winner
+        headless.difficulty = battle.difficulty
+        headless.turn_position = battle.turn_position
+        return headless
+    
+    def create_event_bus(self):
+        """Шина без подписчиков: события не создаются и строки не строятся"""
+        return EventBus()
+    
+    def clone(self):
+        clone = super().clone()
+        # Политики и статистика хранятся по id участников
+        pairs = list(zip(self.party + [self.boss], clone.party + [clone.boss]))
+        clone.policies = {id(new): self.policies[id(old)] for old, new in pairs if id(old) in self.policies}
+        clone.stats = {id(new): dict(self.stats[id(old)]) for old, new in pairs}
+        return clone
+    
+    def restore(self, saved):
+        super().restore(saved)
+        for participant, state in zip(self.party + [self.boss], saved.party + [saved.boss]):
+            self.stats[id(participant)] = dict(saved.stats[id(state)])
+    
+    def add_log(self, message, *args):
+        pass
+    
+    def run(self):
+        """Проведение боя до конца, возвращает BattleResult"""
+        turn_order = self.resume(self.create_turn_order())
+        while self.is_active:
+            if self.round >= self.max_rounds:
+                self.is_active = False
+                break
+            self.play_round(turn_order)
+        
+        stats = [self.stats[id(participant)] for participant in self.party + [self.boss]]
+        return BattleResult(self.winner, self.round, stats)
+    
+    def player_turn(self, player):
+        action = self.policies[id(player)].choose_action(self, player)
+        self.perform_action(player, action)
+    
+    def process_start_of_turn_effects(self, participant):
+        old_hp = participant.hp
+        super().process_start_of_turn_effects(participant)
+        self._record_change(None, participant, participant.hp - old_hp)
+    
+    def take_action(self, participant):
+        participants = self.party + [self.boss]
+        old_hp = [p.hp for p in participants]
+        super().take_action(participant)
+        for p, hp in zip(participants, old_hp):
+            self._record_change(participant, p, p.hp - hp)
+    
+    def _record_change(self, actor, target, delta):
+        if delta < 0:
+            self.stats[id(target)]["damage_taken"] -= delta
+            if actor is not None:
+                self.stats[id(actor)]["damage_dealt"] -= delta
+        elif delta > 0:
+            self.stats[id(target)]["healing_received"] += delta
+            if actor is not None:
+                self.stats[id(actor)]["healing_done"] += delta
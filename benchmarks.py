@@ -0,0 +1,396 @@
+"""Измерения производительности и памяти боевых объектов"""
+import argparse
+import contextlib
+import fnmatch
+import gc
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+
+from bosses import Boss
+from descriptors import BoundedStat
+from characters import Warrior, Mage, Healer
+from effects import PoisonEffect, ShieldEffect, RegenerationEffect
+from events import ShieldAbsorbed
+from skills import Fireball, PoisonDart
+
+
+def bytes_per_entity(factory, count=10000):
+    """Средний объем памяти на один объект, созданный factory()"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    entities = [factory() for _ in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    # Сам список entities не относится к объектам
+    return (after - before - entities.__sizeof__()) / count
+
+
+MEMORY_CASES = {
+    "Warrior": lambda: Warrior("Воин"),
+    "Mage": lambda: Mage("Маг"),
+    "Healer": lambda: Healer("Лекарь"),
+    "Boss": lambda: Boss("Босс"),
+    "PoisonEffect": PoisonEffect,
+    "ShieldEffect": ShieldEffect,
+    "RegenerationEffect": RegenerationEffect,
+    "Fireball": Fireball,
+    "PoisonDart": PoisonDart,
+}
+
+
+def memory_benchmark(count=10000):
+    """Байты на объект для персонажей (вместе с навыками), эффектов и навыков"""
+    return {name: bytes_per_entity(factory, count) for name, factory in MEMORY_CASES.items()}
+
+
+class DescriptorStats:
+    """Хранение характеристик через дескрипторы BoundedStat, для сравнения"""
+
+    hp = BoundedStat(0, 1000)
+    mp = BoundedStat(0, 500)
+
+    def __init__(self):
+        self._hp = 100
+        self._mp = 50
+
+
+def stat_access_benchmark(number=1000000):
+    """Время чтения и записи hp (нс на операцию): дескриптор против слотов"""
+    results = {}
+    for name, obj in (("BoundedStat", DescriptorStats()), ("BoundedSlots", Warrior("Воин"))):
+        read = timeit.timeit("obj.hp", globals={"obj": obj}, number=number)
+        write = timeit.timeit("obj.hp = 50", globals={"obj": obj}, number=number)
+        results[name] = {"read": read / number * 1e9, "write": write / number * 1e9}
+    return results
+
+
+def stacked_effects(count):
+    """Регенерации, исчерпанные щиты и яд в конце списка, как при долгом бое"""
+    effects = [RegenerationEffect() for _ in range(count - count // 4 - 1)]
+    effects += [ShieldEffect(shield_amount=0) for _ in range(count // 4)]
+    if count:
+        effects.append(PoisonEffect())
+    return effects
+
+
+def scan_take_damage(target, effects, damage):
+    """Human.take_damage с перебором всех эффектов через hasattr, для сравнения"""
+    for effect in effects:
+        if hasattr(effect, 'absorb_damage'):
+            incoming = damage
+            damage = effect.absorb_damage(damage)
+            target.events.emit(ShieldAbsorbed, target, incoming - damage, damage)
+            if damage == 0:
+                break
+    target.hp = max(0, target.hp - damage)
+
+
+def effect_index_benchmark(counts=(0, 1, 20, 50), number=20000):
+    """Время (мкс) поиска поглотителей, эффектов начала хода и яда: перебор против индекса"""
+    results = {}
+    for count in counts:
+        target = Warrior("Воин")
+        target.hp = 1000
+        effects = stacked_effects(count)
+        for effect in effects:
+            target.effects.append(effect)
+        plain = list(effects)
+
+        timings = {
+            "take_damage (перебор)": lambda: scan_take_damage(target, plain, 1),
+            "take_damage (индекс)": lambda: target.take_damage(1),
+            "начало хода (перебор)": lambda: [e for e in plain if hasattr(e, 'on_turn_start')],
+            "начало хода (индекс)": target.effects.turn_start,
+            "поиск яда (перебор)": lambda: any(isinstance(e, PoisonEffect) for e in plain),
+            "поиск яда (индекс)": lambda: target.effects.has(PoisonEffect),
+        }
+        results[count] = {name: timeit.timeit(call, number=number) / number * 1e6
+                          for name, call in timings.items()}
+    return results
+
+
+def snapshot_benchmark(number=2000):
+    """Размер (байт) и время (мкс) сохранения и загрузки: JSON против двоичного снимка
+
+    JSON хранит только HP/MP и раунд, снимок - полное состояние боя.
+    """
+    import snapshot
+    from battle import Battle
+    from main import load_save_file
+
+    party = [Warrior("Воин"), Mage("Маг"), Healer("Лекарь")]
+    party[0].add_effect(PoisonEffect(5, 3))
+    party[1].add_effect(ShieldEffect(30))
+    party[2].add_effect(RegenerationEffect())
+    battle = Battle(party, Boss("Босс"))
+    battle.log_echo = False
+
+    with tempfile.TemporaryDirectory() as directory, contextlib.redirect_stdout(io.StringIO()):
+        json_file = os.path.join(directory, "save.json")
+        pbs_file = os.path.join(directory, "save" + snapshot.EXTENSION)
+        timings = {
+            "JSON": (lambda: battle.save_state(json_file), lambda: load_save_file(json_file), json_file),
+            "снимок": (lambda: snapshot.save(battle, pbs_file), lambda: snapshot.load(pbs_file), pbs_file),
+        }
+        results = {}
+        for name, (save, load, filename) in timings.items():
+            save_time = timeit.timeit(save, number=number) / number * 1e6
+            load_time = timeit.timeit(load, number=number) / number * 1e6
+            results[name] = {"size": os.path.getsize(filename), "save": save_time, "load": load_time}
+    return results
+
+
+# Набор бенчмарков горячих путей боя: имя -> фабрика, которая готовит
+# состояние и возвращает измеряемый вызов
+SUITE_CASES = {}
+BASELINE_VERSION = 1
+# Замедление больше этой доли считается регрессией
+REGRESSION_THRESHOLD = 0.10
+# Бой с эффектами, которые не истекают за время измерения
+LONG_DURATION = 10 ** 9
+
+
+def suite_case(name):
+    def register(factory):
+        SUITE_CASES[name] = factory
+        return factory
+    return register
+
+
+def _take_damage_case(count):
+    def factory():
+        target = Warrior("Воин")
+        for effect in stacked_effects(count):
+            target.effects.append(effect)
+
+        def call():
+            target.hp = 1000
+            target.take_damage(1)
+        return call
+    return factory
+
+
+for _count in (0, 1, 20):
+    suite_case(f"take_damage/{_count} эффектов")(_take_damage_case(_count))
+
+
+@suite_case("update_all_effects")
+def _update_all_effects_case():
+    from battle import HeadlessBattle
+    from policies import GreedyPolicy
+    party = [Warrior("Воин"), Mage("Маг"), Healer("Лекарь")]
+    battle = HeadlessBattle(party, Boss("Босс"), GreedyPolicy())
+    for participant in party + [battle.boss]:
+        participant.effects.append(PoisonEffect(1, LONG_DURATION))
+        participant.effects.append(ShieldEffect(30, LONG_DURATION))
+        participant.effects.append(RegenerationEffect(5, LONG_DURATION))
+    return battle.update_all_effects
+
+
+@suite_case("TurnOrder/раунд")
+def _turn_order_case():
+    from battle import TurnOrder
+    participants = [Warrior("Воин"), Mage("Маг"), Healer("Лекарь"), Warrior("Воин 2"), Boss("Босс")]
+    order = TurnOrder(participants)
+
+    def call():
+        for _ in order:
+            pass
+    return call
+
+
+@suite_case("Battle.clone")
+def _clone_case():
+    from battle import HeadlessBattle
+    from policies import GreedyPolicy
+    party = [Warrior("Воин"), Mage("Маг"), Healer("Лекарь")]
+    party[0].add_effect(PoisonEffect(5, 3))
+    party[1].add_effect(ShieldEffect(30))
+    return HeadlessBattle(party, Boss("Босс"), GreedyPolicy()).clone
+
+
+def _boss_phase_case(hp_fraction):
+    def factory():
+        from events import EventBus
+        boss = Boss("Босс")
+        party = [Warrior("Воин"), Mage("Маг"), Healer("Лекарь")]
+        bus = EventBus()
+        for participant in party + [boss]:
+            participant.events = bus
+        boss.hp = int(boss.max_hp * hp_fraction)
+        # Каждый вызов начинается с тех же целей и босса: без этого яд
+        # копился бы на целях, и поздние вызовы мерили бы другой ход
+        initial = [participant.copy() for participant in party + [boss]]
+
+        def call():
+            for participant, state in zip(party + [boss], initial):
+                participant.restore(state)
+            boss.choose_action(party)
+        # Участники доступны тестам набора
+        call.party, call.boss = party, boss
+        return call
+    return factory
+
+
+for _phase, _fraction in (("phase1", 0.9), ("phase2", 0.5), ("phase3", 0.2)):
+    suite_case(f"Boss.choose_action/{_phase}")(_boss_phase_case(_fraction))
+
+
+def _read_hp_case(factory):
+    def case():
+        obj = factory()
+        return lambda: obj.hp
+    return case
+
+
+suite_case("чтение hp/BoundedStat")(_read_hp_case(DescriptorStats))
+suite_case("чтение hp/BoundedSlots")(_read_hp_case(lambda: Warrior("Воин")))
+
+
+def _headless_battles_case(difficulty, battles=10):
+    def factory():
+        from simulate import run_battle
+        return lambda: [run_battle(difficulty, [1, 2, 3], seed) for seed in range(battles)]
+    return factory
+
+
+for _difficulty in ("easy", "normal", "hard", "hardcore"):
+    suite_case(f"10 боев/{_difficulty}")(_headless_battles_case(_difficulty))
+
+
+@suite_case("estimator.estimate/normal")
+def _estimate_case():
+    from estimator import estimate
+    from roster import create_party, create_boss
+    party = create_party("normal", [1, 2, 3])
+    boss = create_boss("normal")
+    return lambda: estimate(party, boss)
+
+
+def matches(name, patterns):
+    """Имя подходит под один из шаблонов fnmatch; без шаблонов подходит любое"""
+    return not patterns or any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns)
+
+
+def run_suite(patterns=None, repeat=5, names=None):
+    """Время (нс на вызов) бенчмарков набора с именами из names, подходящими под patterns
+
+    patterns - шаблоны fnmatch для полного имени («10 боев/hard» не выбирает
+    «10 боев/hardcore», «10 боев/*» выбирает все). Берется минимум из repeat
+    замеров, число вызовов в замере подбирает timeit.Timer.autorange().
+    """
+    results = {}
+    for name, factory in SUITE_CASES.items():
+        if not matches(name, patterns) or (names is not None and name not in names):
+            continue
+        timer = timeit.Timer(factory())
+        number, _ = timer.autorange()
+        results[name] = min(timer.repeat(repeat, number)) / number * 1e9
+    return results
+
+
+def save_baseline(results, filename):
+    baseline = {
+        "version": BASELINE_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump(baseline, f, ensure_ascii=False, indent=2)
+
+
+def load_baseline(filename):
+    with open(filename, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline.get("version") != BASELINE_VERSION:
+        raise ValueError(f"Неподдерживаемая версия базовых замеров в {filename}")
+    return baseline["results"]
+
+
+def compare_results(baseline, current, threshold=REGRESSION_THRESHOLD):
+    """[(имя, было нс, стало нс, отношение, регрессия)] для бенчмарков из обоих замеров"""
+    rows = []
+    for name, before in baseline.items():
+        after = current.get(name)
+        if after is None:
+            continue
+        ratio = after / before if before else float("inf")
+        rows.append((name, before, after, ratio, ratio > 1 + threshold))
+    return rows
+
+
+def format_time(ns):
+    if ns >= 1e6:
+        return f"{ns / 1e6:8.2f} мс"
+    if ns >= 1e3:
+        return f"{ns / 1e3:8.2f} мкс"
+    return f"{ns:8.1f} нс"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарки боевого движка")
+    parser.add_argument("benchmark", choices=["memory", "stats", "effects", "snapshot", "suite", "compare"],
+                        help="suite - набор горячих путей боя; compare - сравнение с базовыми замерами")
+    parser.add_argument("files", nargs="*",
+                        help="для compare: базовые замеры и, необязательно, новые (иначе набор запускается)")
+    parser.add_argument("-n", "--count", type=int, default=10000)
+    parser.add_argument("-o", "--output", help="файл JSON для замеров suite/compare")
+    parser.add_argument("-k", "--filter", action="append",
+                        help="только бенчмарки набора с именем по шаблону fnmatch, например '10 боев/*'")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="доля замедления, которая считается регрессией")
+    args = parser.parse_args(argv)
+
+    if args.benchmark == "memory":
+        for name, size in memory_benchmark(args.count).items():
+            print(f"{name:<20} {size:8.1f} байт")
+    elif args.benchmark == "stats":
+        for name, timing in stat_access_benchmark().items():
+            print(f"{name:<14} чтение: {timing['read']:6.1f} нс  запись: {timing['write']:6.1f} нс")
+    elif args.benchmark == "effects":
+        for count, timings in effect_index_benchmark().items():
+            print(f"Эффектов: {count}")
+            for name, value in timings.items():
+                print(f"  {name:<24} {value:8.3f} мкс")
+    elif args.benchmark == "snapshot":
+        for name, timing in snapshot_benchmark().items():
+            print(f"{name:<8} {timing['size']:6d} байт  сохранение: {timing['save']:7.1f} мкс  "
+                  f"загрузка: {timing['load']:7.1f} мкс")
+    elif args.benchmark == "suite":
+        results = run_suite(args.filter, args.repeat)
+        for name, ns in results.items():
+            print(f"{name:<32} {format_time(ns)}")
+        if args.output:
+            save_baseline(results, args.output)
+    elif args.benchmark == "compare":
+        if not 1 <= len(args.files) <= 2:
+            parser.error("compare: укажите файл базовых замеров и, необязательно, файл новых")
+        baseline = load_baseline(args.files[0])
+        if len(args.files) == 2:
+            current = load_baseline(args.files[1])
+        else:
+            current = run_suite(args.filter, args.repeat, names=set(baseline))
+            if args.output:
+                save_baseline(current, args.output)
+        rows = compare_results(baseline, current, args.threshold)
+        for name, before, after, ratio, regressed in rows:
+            mark = "  РЕГРЕССИЯ" if regressed else ""
+            print(f"{name:<32} {format_time(before)} -> {format_time(after)}  {ratio - 1:+7.1%}{mark}")
+        regressions = sum(row[4] for row in rows)
+        print(f"Регрессий: {regressions} из {len(rows)} (порог {args.threshold:.0%})")
+        return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,14 @@
+from collections import deque
+
 from core import Character
-from mixins import LoggerMixin
+from mixins import LoggerMixin, LOG_SIZE
+from events import DamageDealt, SkillUsed, PhaseChanged
 
 
 class BossStrategy:
+    __slots__ = ('boss',)
+    title = "Базовая"
+
     def __init__(self, boss):
         self.boss = boss
 
@@ -11,6 +17,9 @@ class BossStrategy:
 
 
 class AggressiveStrategy(BossStrategy):
+    __slots__ = ()
+    title = "Агрессивная"
+
     def choose_action(self, targets):
         alive_targets = [t for t in targets if t.is_alive]
         if not alive_targets:
@@ -20,6 +29,9 @@ class AggressiveStrategy(BossStrategy):
 
 
 class AOEStrategy(BossStrategy):
+    __slots__ = ()
+    title = "Массовые атаки"
+
     def choose_action(self, targets):
         alive_targets = [t for t in targets if t.is_alive]
         if not alive_targets:
@@ -32,30 +44,38 @@ class AOEStrategy(BossStrategy):
 
 
 class DebuffStrategy(BossStrategy):
+    __slots__ = ()
+    title = "Дебаффы"
+
     def choose_action(self, targets):
         from effects import PoisonEffect
         alive_targets = [t for t in targets if t.is_alive]
         if not alive_targets:
             return ("attack", None)
         for target in alive_targets:
-            if not any(isinstance(effect, PoisonEffect) for effect in target.effects):
+            if not target.effects.has(PoisonEffect):
                 return ("poison", target)
         weakest = min(alive_targets, key=lambda x: x.hp)
         return ("attack", weakest)
 
 
 class Boss(Character, LoggerMixin):
+    __slots__ = ('damage_multiplier', 'strategies', 'current_strategy', '_log', 'log_echo', 'log_sink')
+
+    # Журнал не входит в боевое состояние; стратегии общие у копий
+    SHARED_SLOTS = Character.SHARED_SLOTS | {'_log', 'log_echo', 'log_sink'}
+
     def __init__(self, name, level=10):
         Character.__init__(self, name, level)
         LoggerMixin.__init__(self)
 
-        self._hp = 500 + level * 50
-        self._mp = 200 + level * 20
-        self._strength = 30 + level * 3
-        self._agility = 20 + level * 2
-        self._intelligence = 25 + level * 2
-        self.max_hp = self._hp
-        self.max_mp = self._mp
+        self.hp = 500 + level * 50
+        self.mp = 200 + level * 20
+        self.strength = 30 + level * 3
+        self.agility = 20 + level * 2
+        self.intelligence = 25 + level * 2
+        self.max_hp = self.hp
+        self.max_mp = self.mp
         self.damage_multiplier = 1.0  # Множитель урона для сложности
 
         self.strategies = {
@@ -65,6 +85,14 @@ class Boss(Character, LoggerMixin):
         }
         self.current_strategy = self.strategies["phase1"]
 
+    def copy(self):
+        clone = super().copy()
+        # Копия пишет в свой пустой журнал и не выводит его
+        clone._log = deque(maxlen=LOG_SIZE)
+        clone.log_echo = False
+        clone.log_sink = None
+        return clone
+
     def basic_attack(self, target):
         if not target or not target.is_alive:
             return False
@@ -72,7 +100,7 @@ class Boss(Character, LoggerMixin):
         damage = (20 + self.strength * 0.4) * self.damage_multiplier
         damage = self.calculate_crit(damage, crit_chance=0.2)
         actual_damage = target.take_damage(int(damage))
-        self.add_log(f"{self.name} атакует {target.name} и наносит {actual_damage} урона!")
+        self.events.emit(DamageDealt, self, target, actual_damage, "attack")
         return True
 
     def use_skill(self, skill_index, target):
@@ -81,11 +109,16 @@ class Boss(Character, LoggerMixin):
     def choose_action(self, targets):
         hp_percent = self.hp / self.max_hp
         if hp_percent > 0.7:
-            self.current_strategy = self.strategies["phase1"]
+            phase = "phase1"
         elif hp_percent > 0.3:
-            self.current_strategy = self.strategies["phase2"]
+            phase = "phase2"
         else:
-            self.current_strategy = self.strategies["phase3"]
+            phase = "phase3"
+        
+        strategy = self.strategies[phase]
+        if strategy is not self.current_strategy:
+            self.current_strategy = strategy
+            self.events.emit(PhaseChanged, self, phase, strategy)
 
         action_type, target = self.current_strategy.choose_action(targets)
 
@@ -110,7 +143,7 @@ class Boss(Character, LoggerMixin):
         for target in targets:
             if target.is_alive:
                 actual_damage = target.take_damage(int(damage))
-                self.add_log(f"{self.name} использует массовую атаку на {target.name}!")
+                self.events.emit(DamageDealt, self, target, actual_damage, "aoe")
 
     def poison_attack(self, target):
         if self.mp < 25:
@@ -123,4 +156,4 @@ class Boss(Character, LoggerMixin):
         poison_damage = 12 * self.damage_multiplier
         poison = PoisonEffect(damage_per_turn=int(poison_damage), duration=3)
         target.add_effect(poison)
-        self.add_log(f"{self.name} отравляет {target.name}!")
\ No newline at end of file
+        self.events.emit(SkillUsed, self, target, "Ядовитый плевок")
\ No newline at end of file
@@ -0,0 +1,210 @@
+"""Каталог сохранений: папка с сохранениями и индекс их метаданных
+
+Индекс (index.json в папке сохранений) хранит для каждого файла сложность,
+состав группы, раунд, HP босса в процентах, время сохранения и версию
+формата, а также размер и mtime файла. Список сохранений строится по
+индексу: файлы с теми же размером и mtime не открываются, новые и
+измененные файлы читаются и дописываются в индекс, удаленные - убираются.
+
+Старые сохранения в JSON (Battle.save_state) лежали в рабочей папке:
+import_legacy() один раз копирует их в папку сохранений, имена
+скопированных файлов тоже хранятся в индексе, а для файлов, которые не
+оказались сохранениями, - размер и mtime: их не читают, пока они не изменятся.
+"""
+import json
+import os
+import shutil
+import threading
+import time
+
+import snapshot
+
+INDEX_NAME = "index.json"
+INDEX_VERSION = 1
+SAVE_EXTENSIONS = (snapshot.EXTENSION, ".json")
+
+
+def _metadata(state, version):
+    """Метаданные сохранения из состояния snapshot.freeze()"""
+    *party, boss = state.participants
+    boss_stats = boss.sections[0]
+    hp, max_hp = boss_stats[0], boss_stats[2]
+    return {
+        "valid": True,
+        "version": version,
+        "difficulty": state.difficulty,
+        "party": [[p.name, p.class_name] for p in party],
+        "round": state.round,
+        "boss_hp_percent": round(100 * hp / max_hp) if max_hp else 0,
+    }
+
+
+def _read_snapshot(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    battle = snapshot.loads(data)
+    return _metadata(snapshot.freeze(battle), int.from_bytes(data[4:6], 'little'))
+
+
+def _read_json_save(path):
+    """Метаданные старого сохранения в JSON (Battle.save_state)"""
+    with open(path, 'r', encoding='utf-8') as f:
+        state = json.load(f)
+    return {
+        "valid": True,
+        "version": "json",
+        "difficulty": None,
+        "party": [[char["name"], char["class"]] for char in state["party"]],
+        "round": state["round"],
+        "boss_hp_percent": None,
+    }
+
+
+class SaveCatalog:
+    """Сохранения в папке directory с индексом метаданных"""
+
+    def __init__(self, directory="saves"):
+        self.directory = directory
+        self.index_file = os.path.join(directory, INDEX_NAME)
+        self._entries = None
+        # Имена старых JSON-сохранений, уже скопированных import_legacy()
+        self._imported = None
+        # Прочие *.json рабочей папки: имя -> [mtime_ns, размер] при последней проверке
+        self._rejected = None
+        # Индекс обновляется и из потока записи сохранений
+        self._lock = threading.Lock()
+
+    def path(self, name):
+        """Путь к сохранению в папке каталога; папка создается при необходимости"""
+        os.makedirs(self.directory, exist_ok=True)
+        return os.path.join(self.directory, name)
+
+    def _load_index(self):
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = None
+        if not isinstance(index, dict) or index.get("version") != INDEX_VERSION:
+            index = {}
+        if self._imported is None:
+            self._imported = set(index.get("imported", []))
+        if self._rejected is None:
+            self._rejected = dict(index.get("rejected", {}))
+        return index.get("saves", {})
+
+    def _save_index(self):
+        data = json.dumps({"version": INDEX_VERSION, "saves": self._entries,
+                           "imported": sorted(self._imported or ()),
+                           "rejected": self._rejected or {}}, ensure_ascii=False)
+        snapshot.write_atomic(self.index_file, data.encode('utf-8'))
+
+    def import_legacy(self, directory="."):
+        """Копирует старые JSON-сохранения из directory в папку каталога
+
+        Каждый файл копируется один раз, даже если копию потом удалили;
+        файлы с тем же именем в папке каталога не перезаписываются. Файлы,
+        которые не являются сохранениями, снова читаются, только если
+        изменились. Возвращает имена скопированных файлов.
+        """
+        with self._lock:
+            if self._entries is None:
+                self._entries = self._load_index()
+            try:
+                scan = os.scandir(directory)
+            except FileNotFoundError:
+                return []
+            copied = []
+            changed = False
+            with scan:
+                for entry in scan:
+                    if not entry.name.endswith(".json") or entry.name in self._imported or not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                    signature = [stat.st_mtime_ns, stat.st_size]
+                    if self._rejected.get(entry.name) == signature:
+                        continue
+                    changed = True
+                    if not self._read(entry.path)["valid"]:
+                        self._rejected[entry.name] = signature
+                        continue
+                    self._rejected.pop(entry.name, None)
+                    self._imported.add(entry.name)
+                    target = self.path(entry.name)
+                    if not os.path.exists(target):
+                        shutil.copy2(entry.path, target)
+                        copied.append(entry.name)
+            if changed:
+                self._save_index()
+        return copied
+
+    def _read(self, path):
+        try:
+            if path.endswith(snapshot.EXTENSION):
+                return _read_snapshot(path)
+            return _read_json_save(path)
+        except (OSError, ValueError, KeyError, TypeError, snapshot.SnapshotError):
+            # Не сохранение или поврежденный файл: запоминаем, чтобы не читать снова
+            return {"valid": False}
+
+    def refresh(self):
+        """Сверяет индекс с папкой и перечитывает только новые и измененные файлы"""
+        with self._lock:
+            known = self._entries if self._entries is not None else self._load_index()
+            entries = {}
+            changed = False
+            try:
+                scan = os.scandir(self.directory)
+            except FileNotFoundError:
+                scan = None
+            if scan is not None:
+                with scan:
+                    for entry in scan:
+                        if entry.name == INDEX_NAME or not entry.name.endswith(SAVE_EXTENSIONS):
+                            continue
+                        stat = entry.stat()
+                        meta = known.get(entry.name)
+                        if meta is None or meta["mtime_ns"] != stat.st_mtime_ns or meta["size"] != stat.st_size:
+                            meta = self._read(entry.path)
+                            meta.update(mtime_ns=stat.st_mtime_ns, size=stat.st_size, timestamp=stat.st_mtime)
+                            changed = True
+                        entries[entry.name] = meta
+
+            self._entries = entries
+            if scan is not None and (changed or len(entries) != len(known)):
+                self._save_index()
+
+    def entries(self):
+        """Сохранения [(имя файла, метаданные)], новые первыми"""
+        self.refresh()
+        saves = [(name, meta) for name, meta in self._entries.items() if meta["valid"]]
+        saves.sort(key=lambda item: item[1]["timestamp"], reverse=True)
+        return saves
+
+    def write(self, state, name):
+        """Записывает снимок состояния freeze() и сразу вносит его в индекс
+
+        Вызывается из потока записи сохранений.
+        """
+        if not name.endswith(snapshot.EXTENSION):
+            name += snapshot.EXTENSION
+        path = self.path(name)
+        snapshot.write_state(state, path)
+        stat = os.stat(path)
+        meta = _metadata(state, snapshot.VERSION)
+        meta.update(mtime_ns=stat.st_mtime_ns, size=stat.st_size, timestamp=stat.st_mtime)
+        with self._lock:
+            if self._entries is None:
+                self._entries = self._load_index()
+            self._entries[name] = meta
+            self._save_index()
+        return path
+
+
+def describe(name, meta):
+    """Строка сохранения для меню загрузки"""
+    party = ", ".join(class_name for _, class_name in meta["party"])
+    boss_hp = "?" if meta["boss_hp_percent"] is None else f"{meta['boss_hp_percent']}%"
+    difficulty = (meta["difficulty"] or "?").upper()
+    saved = time.strftime("%Y-%m-%d %H:%M", time.localtime(meta["timestamp"]))
+    return f"{name} [{difficulty}] раунд {meta['round']}, босс {boss_hp}, группа: {party} ({saved})"
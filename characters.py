@@ -1,18 +1,21 @@
 from core import Character
+from events import DamageDealt, ActionFailed
 from skills import PowerStrike, Fireball, Heal, PoisonDart, Shield
 
 class Warrior(Character):
     """Класс воина"""
     
+    __slots__ = ()
+    
     def __init__(self, name, level=1):
         super().__init__(name, level)
-        self._hp = 150 + level * 20
-        self._mp = 30 + level * 5
-        self._strength = 50 + level * 2
-        self._agility = 15 + level * 1
-        self._intelligence = 8 + level * 0.5
-        self.max_hp = self._hp
-        self.max_mp = self._mp
+        self.hp = 150 + level * 20
+        self.mp = 30 + level * 5
+        self.strength = 50 + level * 2
+        self.agility = 15 + level * 1
+        self.intelligence = 8 + level * 0.5
+        self.max_hp = self.hp
+        self.max_mp = self.mp
         
         # Навыки воина
         self.skills = [PowerStrike()]
@@ -21,12 +24,12 @@ class Warrior(Character):
         damage = 50 + self.strength * 0.3
         damage = self.calculate_crit(damage, crit_chance=0.45)
         actual_damage = target.take_damage(int(damage))
-        print(f"{self.name} атакует {target.name} и наносит {actual_damage} урона!")
+        self.events.emit(DamageDealt, self, target, actual_damage, "attack")
         return True
     
     def use_skill(self, skill_index, target):
         if skill_index < 0 or skill_index >= len(self.skills):
-            print("Неверный индекс навыка!")
+            self.events.emit(ActionFailed, self, "bad_skill")
             return False
         
         skill = self.skills[skill_index]
@@ -38,15 +41,17 @@ class Warrior(Character):
 class Mage(Character):
     """Класс мага"""
     
+    __slots__ = ()
+    
     def __init__(self, name, level=1):
         super().__init__(name, level)
-        self._hp = 80 + level * 10
-        self._mp = 130 + level * 15
-        self._strength = 42 + level * 0.5
-        self._agility = 12 + level * 1
-        self._intelligence = 25 + level * 3
-        self.max_hp = self._hp
-        self.max_mp = self._mp
+        self.hp = 80 + level * 10
+        self.mp = 130 + level * 15
+        self.strength = 42 + level * 0.5
+        self.agility = 12 + level * 1
+        self.intelligence = 25 + level * 3
+        self.max_hp = self.hp
+        self.max_mp = self.mp
         
         # Навыки мага
         self.skills = [Fireball(), Shield()]
@@ -54,12 +59,12 @@ class Mage(Character):
     def basic_attack(self, target):
         damage = 45 + self.intelligence * 0.2
         actual_damage = target.take_damage(int(damage))
-        print(f"{self.name} атакует {target.name} магией и наносит {actual_damage} урона!")
+        self.events.emit(DamageDealt, self, target, actual_damage, "magic_attack")
         return True
     
     def use_skill(self, skill_index, target):
         if skill_index < 0 or skill_index >= len(self.skills):
-            print("Неверный индекс навыка!")
+            self.events.emit(ActionFailed, self, "bad_skill")
             return False
         
         skill = self.skills[skill_index]
@@ -71,15 +76,17 @@ class Mage(Character):
 class Healer(Character):
     """Класс лекаря"""
     
+    __slots__ = ()
+    
     def __init__(self, name, level=1):
         super().__init__(name, level)
-        self._hp = 90 + level * 12
-        self._mp = 70 + level * 12
-        self._strength = 30 + level * 1
-        self._agility = 90 + level * 1.5
-        self._intelligence = 18 + level * 2
-        self.max_hp = self._hp
-        self.max_mp = self._mp
+        self.hp = 90 + level * 12
+        self.mp = 70 + level * 12
+        self.strength = 30 + level * 1
+        self.agility = 90 + level * 1.5
+        self.intelligence = 18 + level * 2
+        self.max_hp = self.hp
+        self.max_mp = self.mp
         
         # Навыки лекаря
         self.skills = [Heal(), PoisonDart()]
@@ -87,12 +94,12 @@ class Healer(Character):
     def basic_attack(self, target):
         damage = 35 + self.strength * 0.2
         actual_damage = target.take_damage(int(damage))
-        print(f"{self.name} атакует {target.name} и наносит {actual_damage} урона!")
+        self.events.emit(DamageDealt, self, target, actual_damage, "attack")
         return True
     
     def use_skill(self, skill_index, target):
         if skill_index < 0 or skill_index >= len(self.skills):
-            print("Неверный индекс навыка!")
+            self.events.emit(ActionFailed, self, "bad_skill")
             return False
         
         skill = self.skills[skill_index]
@@ -1,28 +1,54 @@
+import random
 from abc import ABC, abstractmethod
-from descriptors import BoundedStat
-from mixins import CritMixin, LoggerMixin, SilenceMixin
+from descriptors import BoundedSlots, slot_accessors, _set_slot
+from mixins import CritMixin, SilenceMixin
+from events import default_bus, ShieldAbsorbed, ActionFailed, EffectStacked
+from effects import EffectList
 
-class Human(ABC):
+_state_slot_cache = {}
+
+
+def _state_slots(cls):
+    """(чтение, запись) слотов участника, которые копирует restore(): все, кроме SHARED_SLOTS"""
+    accessors = _state_slot_cache.get(cls)
+    if accessors is None:
+        accessors = _state_slot_cache[cls] = slot_accessors(cls, cls.SHARED_SLOTS)
+    return accessors
+
+
+class Human(BoundedSlots, ABC):
     """Базовый класс для всех персонажей"""
     
-    # Дескрипторы для характеристик
-    hp = BoundedStat(0, 1000)
-    mp = BoundedStat(0, 500)
-    strength = BoundedStat(1, 100)
-    agility = BoundedStat(1, 100)
-    intelligence = BoundedStat(1, 100)
+    # Атрибуты в слотах вместо __dict__: меньше памяти на каждого бойца
+    __slots__ = ('name', 'level', 'hp', 'mp', 'strength', 'agility', 'intelligence',
+                 'max_hp', 'max_mp', 'effects', 'events', 'rng')
+    
+    # Слоты, которые копия участника делит с оригиналом (Battle.clone их переназначает)
+    SHARED_SLOTS = frozenset({'events', 'rng'})
+    
+    # Границы характеристик, проверяются при записи
+    STATS = {
+        "hp": (0, 1000),
+        "mp": (0, 500),
+        "strength": (1, 100),
+        "agility": (1, 100),
+        "intelligence": (1, 100),
+    }
     
     def __init__(self, name, level=1):
         self.name = name
         self.level = level
-        self._hp = 100
-        self._mp = 50
-        self._strength = 30
-        self._agility = 10
-        self._intelligence = 10
+        self.hp = 100
+        self.mp = 50
+        self.strength = 30
+        self.agility = 10
+        self.intelligence = 10
         self.max_hp = 120
         self.max_mp = 50
-        self.effects = []
+        self.effects = EffectList()
+        self.events = default_bus
+        # Генератор случайных чисел; Battle назначает участникам генератор боя
+        self.rng = random
     
     @property
     def is_alive(self):
@@ -32,20 +58,27 @@ class Human(ABC):
         """Получение урона с учетом эффектов"""
         actual_damage = damage
         # Проверяем щиты
-        for effect in self.effects:
-            if hasattr(effect, 'absorb_damage'):
-                actual_damage = effect.absorb_damage(actual_damage)
-                if actual_damage == 0:
-                    print(f"Щит поглотил весь урон!")
-                    break
+        for effect in self.effects.absorbers:
+            incoming = actual_damage
+            actual_damage = effect.absorb_damage(actual_damage)
+            self.events.emit(ShieldAbsorbed, self, incoming - actual_damage, actual_damage)
+            if actual_damage == 0:
+                break
         
         self.hp = max(0, self.hp - actual_damage)
         return actual_damage
     
     def add_effect(self, effect):
-        """Добавление эффекта"""
-        self.effects.append(effect)
-        effect.apply_effect(self)
+        """Добавление эффекта с учетом правила наложения его типа
+        
+        Эффект регистрируется один раз - в effect.apply_effect; если правило
+        слило его с уже наложенным, регистрации нет.
+        """
+        existing = self.effects.first_of_type(type(effect))
+        if effect.stacking.stack(self, effect):
+            effect.apply_effect(self)
+        else:
+            self.events.emit(EffectStacked, self, existing, effect)
     
     def remove_effect(self, effect):
         """Удаление эффекта"""
@@ -55,13 +88,33 @@ class Human(ABC):
     def update_effects(self):
         """Обновление всех эффектов в конце хода"""
         effects_to_remove = []
-        for effect in self.effects[:]:
+        for effect in list(self.effects):
             if effect.update(self):
                 effects_to_remove.append(effect)
         
         for effect in effects_to_remove:
             self.remove_effect(effect)
     
+    def restore(self, other):
+        """Переносит боевое состояние other (копии этого участника) в себя
+        
+        Значения копируются в слоты напрямую, без проверки границ: они уже
+        проверены у other. Эффекты копируются, навыки остаются общими.
+        """
+        get, setters = _state_slots(type(self))
+        for set_slot, value in zip(setters, get(other)):
+            set_slot(self, value)
+        _set_slot(self, 'effects', other.effects.copy())
+    
+    def copy(self):
+        """Копия участника с собственным боевым состоянием"""
+        cls = type(self)
+        clone = cls.__new__(cls)
+        clone.restore(self)
+        for name in self.SHARED_SLOTS:
+            _set_slot(clone, name, getattr(self, name))
+        return clone
+    
     def __str__(self):
         return f"{self.name} (Ур. {self.level}) - HP: {self.hp}/{self.max_hp}, MP: {self.mp}/{self.max_mp}"
     
@@ -71,6 +124,9 @@ class Human(ABC):
 class Character(Human, CritMixin, SilenceMixin, ABC):
     """Абстрактный класс персонажа"""
     
+    # Слоты миксинов объявляются здесь: у миксинов пустые __slots__
+    __slots__ = ('_silenced', '_silence_duration', 'skills', 'cooldowns')
+    
     def __init__(self, name, level=1):
         # Явно вызываем конструкторы всех родителей
         Human.__init__(self, name, level)
@@ -91,19 +147,28 @@ class Character(Human, CritMixin, SilenceMixin, ABC):
     def can_use_skill(self, skill):
         """Проверка возможности использования навыка"""
         if self.is_silenced:
-            print(f"{self.name} немой и не может использовать навыки!")
+            self.events.emit(ActionFailed, self, "silenced")
             return False
         
         if self.mp < skill.mana_cost:
-            print(f"Недостаточно маны для {skill.name}!")
+            self.events.emit(ActionFailed, self, "no_mana", skill.name)
             return False
         
         if skill.name in self.cooldowns and self.cooldowns[skill.name] > 0:
-            print(f"Навык {skill.name} на перезарядке! Осталось: {self.cooldowns[skill.name]} ходов")
+            self.events.emit(ActionFailed, self, "cooldown", skill.name, self.cooldowns[skill.name])
             return False
         
         return True
     
+    def is_skill_ready(self, skill):
+        """Тихая проверка навыка: без сообщений, для автоматических решений"""
+        return (not self.is_silenced and self.mp >= skill.mana_cost
+                and self.cooldowns.get(skill.name, 0) <= 0)
+    
+    def restore(self, other):
+        super().restore(other)
+        _set_slot(self, 'cooldowns', dict(other.cooldowns))
+    
     def update_cooldowns(self):
         """Обновление перезарядки навыков"""
         for skill_name in list(self.cooldowns.keys()):
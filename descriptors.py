@@ -1,3 +1,6 @@
+import operator
+
+
 class BoundedStat:
     """Дескриптор для валидации характеристик"""
 
@@ -13,4 +16,47 @@ class BoundedStat:
 
     def __set__(self, obj, value):
         value = max(self.min_value, min(value, self.max_value))
-        setattr(obj, self.name, value)
\ No newline at end of file
+        setattr(obj, self.name, value)
+
+
+_set_slot = object.__setattr__
+
+
+def slot_accessors(cls, exclude=()):
+    """Чтение всех слотов класса и его предков одним вызовом и запись каждого слота
+
+    Возвращает (get, setters): get(obj) - кортеж значений слотов, setters -
+    методы __set__ их дескрипторов по порядку. Запись идет мимо __setattr__,
+    то есть без проверки границ BoundedSlots. Нужно для быстрого копирования.
+    """
+    names, setters = [], []
+    for klass in reversed(cls.__mro__):
+        for name in vars(klass).get('__slots__', ()):
+            if name not in exclude:
+                names.append(name)
+                setters.append(vars(klass)[name].__set__)
+    get = operator.attrgetter(*names)
+    if len(names) == 1:
+        # attrgetter с одним именем возвращает само значение, а не кортеж
+        single = get
+        get = lambda obj: (single(obj),)
+    return get, tuple(setters)
+
+
+class BoundedSlots:
+    """Миксин для характеристик в слотах: чтение напрямую, ограничение только при записи
+
+    Подкласс перечисляет границы в STATS как {имя: (min, max)} и объявляет
+    слоты с теми же именами. В отличие от дескриптора BoundedStat чтение
+    obj.hp - обычный доступ к слоту без вызова Python-кода.
+    """
+
+    __slots__ = ()
+    STATS = {}
+
+    def __setattr__(self, name, value):
+        bounds = self.STATS.get(name)
+        if bounds is not None:
+            low, high = bounds
+            value = low if value < low else high if value > high else value
+        _set_slot(self, name, value)
@@ -1,12 +1,224 @@
+import heapq
 from abc import ABC, abstractmethod
+from descriptors import slot_accessors
+from events import EffectApplied, EffectExpired, DamageDealt, Healed
+
+# Хуки, по которым эффекты индексируются у носителя
+EFFECT_HOOKS = ('absorb_damage', 'on_turn_start')
+
+
+class EffectList:
+    """Эффекты участника с индексами по хукам и по типу
+    
+    Ведет себя как список эффектов (append, remove, in, итерация), но хранит
+    их в упорядоченных словарях эффект -> число регистраций. Добавление и
+    удаление стоят O(1), поглотители урона, эффекты начала хода и эффекты
+    заданного типа доступны без перебора всех эффектов.
+    """
+    
+    __slots__ = ('_counts', '_size', 'absorbers', 'tickers', '_by_type')
+    
+    def __init__(self, effects=()):
+        self._counts = {}
+        self._size = 0
+        self.absorbers = {}
+        self.tickers = {}
+        self._by_type = {}
+        for effect in effects:
+            self.append(effect)
+    
+    @staticmethod
+    def _increment(index, effect):
+        index[effect] = index.get(effect, 0) + 1
+    
+    @staticmethod
+    def _decrement(index, effect):
+        count = index[effect] - 1
+        if count:
+            index[effect] = count
+        else:
+            del index[effect]
+    
+    def _indexes(self, effect):
+        hooks = effect.hooks
+        if 'absorb_damage' in hooks:
+            yield self.absorbers
+        if 'on_turn_start' in hooks:
+            yield self.tickers
+        yield self._by_type.setdefault(type(effect), {})
+    
+    def append(self, effect):
+        self._size += 1
+        self._increment(self._counts, effect)
+        for index in self._indexes(effect):
+            self._increment(index, effect)
+    
+    def remove(self, effect):
+        if effect not in self._counts:
+            raise ValueError("эффект не найден")
+        self._size -= 1
+        self._decrement(self._counts, effect)
+        for index in self._indexes(effect):
+            self._decrement(index, effect)
+        if not self._by_type[type(effect)]:
+            del self._by_type[type(effect)]
+    
+    def first_of_type(self, effect_class):
+        """Первый наложенный эффект ровно этого класса или None"""
+        index = self._by_type.get(effect_class)
+        return next(iter(index)) if index else None
+    
+    def has(self, effect_class):
+        """Есть ли эффект данного класса (или его подкласса)"""
+        if effect_class in self._by_type:
+            return True
+        for effect_type in self._by_type:
+            if issubclass(effect_type, effect_class):
+                return True
+        return False
+    
+    def of_type(self, effect_class):
+        """Эффекты данного класса (или его подклассов)"""
+        return [effect for effect_type, index in self._by_type.items()
+                if issubclass(effect_type, effect_class) for effect in index]
+    
+    def turn_start(self):
+        """Эффекты с on_turn_start с учетом повторных регистраций"""
+        if not self.tickers:
+            return ()
+        if self._size == len(self._counts):
+            return list(self.tickers)
+        return [effect for effect, count in self.tickers.items() for _ in range(count)]
+    
+    def __iter__(self):
+        for effect, count in self._counts.items():
+            for _ in range(count):
+                yield effect
+    
+    def __contains__(self, effect):
+        return effect in self._counts
+    
+    def __len__(self):
+        return self._size
+    
+    def __bool__(self):
+        return bool(self._counts)
+    
+    def copy(self):
+        """Список с копиями эффектов (Effect.copy) и теми же регистрациями"""
+        if not self._counts:
+            return EffectList()
+        copies = {effect: effect.copy() for effect in self._counts}
+        clone = EffectList.__new__(EffectList)
+        clone._counts = {copies[effect]: count for effect, count in self._counts.items()}
+        clone._size = self._size
+        clone.absorbers = {copies[effect]: count for effect, count in self.absorbers.items()}
+        clone.tickers = {copies[effect]: count for effect, count in self.tickers.items()}
+        clone._by_type = {effect_type: {copies[effect]: count for effect, count in index.items()}
+                          for effect_type, index in self._by_type.items()}
+        return clone
+    
+    def __repr__(self):
+        return f"EffectList({list(self)!r})"
+
+class StackingPolicy:
+    """Правило наложения эффекта на цель, у которой уже есть эффект того же типа"""
+    
+    def stack(self, target, effect):
+        """Сочетает effect с наложенными; True - effect нужно зарегистрировать отдельно"""
+        return True
+
+
+class IndependentStacks(StackingPolicy):
+    """Каждое наложение - отдельный эффект; при max_stacks вытесняется самый короткий"""
+    
+    def __init__(self, max_stacks=None):
+        self.max_stacks = max_stacks
+    
+    def stack(self, target, effect):
+        if self.max_stacks is not None:
+            existing = target.effects.of_type(type(effect))
+            if len(existing) >= self.max_stacks:
+                shortest = min(existing, key=lambda e: e.remaining_duration)
+                shortest.remove_effect(target)
+        return True
+
+
+class RefreshDuration(StackingPolicy):
+    """Повторное наложение обновляет длительность и оставляет большую силу"""
+    
+    def stack(self, target, effect):
+        existing = target.effects.first_of_type(type(effect))
+        if existing is None:
+            return True
+        existing.remaining_duration = max(existing.remaining_duration, effect.remaining_duration)
+        existing.intensity = max(existing.intensity, effect.intensity)
+        return False
+
+
+class AddIntensity(StackingPolicy):
+    """Повторное наложение складывает силу и обновляет длительность"""
+    
+    def stack(self, target, effect):
+        existing = target.effects.first_of_type(type(effect))
+        if existing is None:
+            return True
+        existing.remaining_duration = max(existing.remaining_duration, effect.remaining_duration)
+        existing.intensity += effect.intensity
+        return False
+
+
+class MergeStacks(StackingPolicy):
+    """Все наложения сливаются в один эффект с суммарной силой
+    
+    Каждая часть истекает в свой срок, поэтому урон совпадает с отдельными
+    эффектами, а обработка за ход не растет с числом наложений.
+    """
+    
+    def stack(self, target, effect):
+        existing = target.effects.first_of_type(type(effect))
+        if existing is None:
+            return True
+        existing.merge(effect)
+        return False
+
 
 class Effect(ABC):
     """Абстрактный базовый класс для эффектов"""
     
+    __slots__ = ('name', 'duration', 'remaining_duration', '_stacks', '_elapsed')
+    
+    # Хуки, которые реализует класс; заполняется для каждого подкласса
+    hooks = frozenset()
+    
+    # Правило повторного наложения на ту же цель
+    stacking = IndependentStacks()
+    
+    # (чтение, запись) слотов класса и всех его предков для copy();
+    # заполняется для каждого подкласса
+    _slot_accessors = None
+    
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.hooks = frozenset(hook for hook in EFFECT_HOOKS if hasattr(cls, hook))
+        cls._slot_accessors = slot_accessors(cls)
+    
     def __init__(self, name, duration):
         self.name = name
         self.duration = duration
         self.remaining_duration = duration
+        # Части слитого эффекта: куча (ход истечения, сила)
+        self._stacks = None
+        self._elapsed = 0
+    
+    @property
+    def intensity(self):
+        """Сила эффекта, которую складывают правила наложения"""
+        return 0
+    
+    @intensity.setter
+    def intensity(self, value):
+        pass
     
     @abstractmethod
     def apply_effect(self, target):
@@ -16,58 +228,126 @@ class Effect(ABC):
     def remove_effect(self, target):
         pass
     
+    def merge(self, other):
+        """Вливает other: силы складываются, каждая часть истекает в свой срок"""
+        if self._stacks is None:
+            self._stacks = [(self._elapsed + self.remaining_duration, self.intensity)]
+        heapq.heappush(self._stacks, (self._elapsed + other.remaining_duration, other.intensity))
+        self.intensity += other.intensity
+        self.remaining_duration = max(self.remaining_duration, other.remaining_duration)
+    
+    def copy(self):
+        """Независимая копия эффекта (для Battle.clone)"""
+        clone = object.__new__(type(self))
+        get, setters = self._slot_accessors
+        for set_slot, value in zip(setters, get(self)):
+            set_slot(clone, value)
+        if self._stacks is not None:
+            clone._stacks = list(self._stacks)
+        return clone
+    
     def update(self, target):
         """Обновление эффекта в конце хода"""
         self.remaining_duration -= 1
+        if self._stacks:
+            self._elapsed += 1
+            while self._stacks and self._stacks[0][0] <= self._elapsed:
+                self.intensity -= heapq.heappop(self._stacks)[1]
         if self.remaining_duration <= 0:
             self.remove_effect(target)
             return True
         return False
     
+    def describe_applied(self, target):
+        """Текст о наложении эффекта, строится только для подписчиков"""
+        return f"{target.name} получает эффект {self.name}"
+    
+    def describe_expired(self, target):
+        return f"{self.name} на {target.name} закончился."
+    
+    def describe_stacked(self, target):
+        return f"{self.name} на {target.name} усилен: {self.intensity} ({self.remaining_duration} ходов)"
+    
     def __str__(self):
         return f"{self.name} ({self.remaining_duration} ходов)"
 
 class PoisonEffect(Effect):
     """Эффект яда - урон каждый ход"""
     
+    __slots__ = ('damage_per_turn',)
+    
+    stacking = MergeStacks()
+    
     def __init__(self, damage_per_turn=5, duration=3):
         super().__init__("Яд", duration)
         self.damage_per_turn = damage_per_turn
     
+    @property
+    def intensity(self):
+        return self.damage_per_turn
+    
+    @intensity.setter
+    def intensity(self, value):
+        self.damage_per_turn = value
+    
     def apply_effect(self, target):
         # Добавляем эффект к цели
         target.effects.append(self)
-        print(f"{target.name} отравлен! Будет получать {self.damage_per_turn} урона каждый ход в течение {self.duration} ходов.")
+        target.events.emit(EffectApplied, target, self)
     
     def remove_effect(self, target):
         # Удаляем эффект из цели
         if self in target.effects:
             target.effects.remove(self)
-        print(f"Яд на {target.name} рассеялся.")
+        target.events.emit(EffectExpired, target, self)
     
     def on_turn_start(self, target):
         """Вызывается в начале хода цели"""
         if target.is_alive:
             actual_damage = target.take_damage(self.damage_per_turn)
-            print(f"{target.name} получает {actual_damage} урона от яда!")
+            target.events.emit(DamageDealt, None, target, actual_damage, "poison", self.name)
         return True
+    
+    def describe_applied(self, target):
+        return f"{target.name} отравлен! Будет получать {self.damage_per_turn} урона каждый ход в течение {self.duration} ходов."
+    
+    def describe_expired(self, target):
+        return f"Яд на {target.name} рассеялся."
 
 class ShieldEffect(Effect):
     """Эффект щита - поглощает урон"""
     
+    __slots__ = ('shield_amount', 'current_shield')
+    
+    stacking = AddIntensity()
+    
     def __init__(self, shield_amount=20, duration=2):
         super().__init__("Щит", duration)
         self.shield_amount = shield_amount
         self.current_shield = shield_amount
     
+    @property
+    def intensity(self):
+        return self.current_shield
+    
+    @intensity.setter
+    def intensity(self, value):
+        self.current_shield = value
+    
     def apply_effect(self, target):
         target.effects.append(self)
-        print(f"{target.name} получает щит на {self.shield_amount} урона!")
+        target.events.emit(EffectApplied, target, self)
     
     def remove_effect(self, target):
         if self in target.effects:
             target.effects.remove(self)
-        print(f"Щит на {target.name} исчез.")
+        target.events.emit(EffectExpired, target, self)
+    
+    def describe_applied(self, target):
+        return f"{target.name} получает щит на {self.shield_amount} урона!"
+    
+    def describe_expired(self, target):
+        return f"Щит на {target.name} исчез."
     
     def absorb_damage(self, damage):
         """Поглощает урон, возвращает оставшийся урон"""
@@ -80,25 +360,41 @@ class ShieldEffect(Effect):
             remaining = damage - self.current_shield
             self.current_shield = 0
         
-        if absorbed > 0:
-            print(f"Щит поглотил {absorbed} урона!")
         return remaining
 
 class RegenerationEffect(Effect):
     """Эффект регенерации - восстанавливает HP каждый ход"""
     
+    __slots__ = ('heal_per_turn',)
+    
+    stacking = RefreshDuration()
+    
     def __init__(self, heal_per_turn=10, duration=3):
         super().__init__("Регенерация", duration)
         self.heal_per_turn = heal_per_turn
     
+    @property
+    def intensity(self):
+        return self.heal_per_turn
+    
+    @intensity.setter
+    def intensity(self, value):
+        self.heal_per_turn = value
+    
     def apply_effect(self, target):
         target.effects.append(self)
-        print(f"{target.name} получает регенерацию! Будет восстанавливать {self.heal_per_turn} HP каждый ход.")
+        target.events.emit(EffectApplied, target, self)
     
     def remove_effect(self, target):
         if self in target.effects:
             target.effects.remove(self)
-        print(f"Регенерация на {target.name} закончилась.")
+        target.events.emit(EffectExpired, target, self)
+    
+    def describe_applied(self, target):
+        return f"{target.name} получает регенерацию! Будет восстанавливать {self.heal_per_turn} HP каждый ход."
+    
+    def describe_expired(self, target):
+        return f"Регенерация на {target.name} закончилась."
     
     def on_turn_start(self, target):
         """Вызывается в начале хода цели"""
@@ -107,5 +403,5 @@ class RegenerationEffect(Effect):
             target.hp = min(target.max_hp, target.hp + self.heal_per_turn)
             heal_amount = target.hp - old_hp
             if heal_amount > 0:
-                print(f"{target.name} восстанавливает {heal_amount} HP от регенерации")
+                target.events.emit(Healed, None, target, heal_amount, "regeneration", self.name)
         return True
\ No newline at end of file
@@ -0,0 +1,376 @@
+"""Аналитическая оценка исхода боя: раунды до победы и шанс победы группы
+
+Оценка считается без доигрываний: бой проходится один раз по ходам, и
+каждое действие дает математическое ожидание урона по формулам
+characters.py, skills.py и bosses.py с учетом шанса крита, перезарядок,
+запаса маны и фаз босса (70% и 30% HP). Группа действует по правилам
+GreedyPolicy, как в simulate.py: лечение и щит союзнику ниже 50% HP,
+иначе атакующий навык, иначе базовая атака. HP - ожидаемые значения,
+участник выбывает, когда ожидаемое HP доходит до нуля.
+
+Шанс победы - нормальное приближение: урон группы к моменту гибели
+группы сравнивается с HP босса; дисперсия складывается из разброса
+критов группы и разброса момента гибели группы (криты босса).
+
+Оценка занимает доли миллисекунды: годится для меню и для быстрого
+отсева в переборах параметров. calibrate() сравнивает ее с боями
+simulate.run_battle.
+"""
+import argparse
+import json
+import math
+import time
+
+from battle import TurnOrder
+from characters import Warrior, Mage, Healer
+from effects import PoisonEffect, ShieldEffect
+from policies import GreedyPolicy
+from skills import DamageSkill, HealSkill, EffectSkill
+
+# Базовые атаки классов (characters.py): урон до крита и шанс крита
+BASIC_ATTACKS = {
+    Warrior: (lambda c: 50 + c.strength * 0.3, 0.45),
+    Mage: (lambda c: 45 + c.intelligence * 0.2, 0.0),
+    Healer: (lambda c: 35 + c.strength * 0.2, 0.0),
+}
+CRIT_MULTIPLIER = 1.5
+# Шанс крита навыков урона (CritMixin.calculate_crit по умолчанию)
+SKILL_CRIT = 0.1
+
+# Босс (bosses.py): границы фаз по доле HP, атака, массовая атака и яд
+PHASE2_BELOW = 0.7
+PHASE3_BELOW = 0.3
+BOSS_CRIT = 0.2
+AOE_COST = 40
+POISON_COST = 25
+BOSS_POISON = 12
+POISON_DURATION = 3
+
+MAX_ROUNDS = 200
+# После гибели босса бой дальше не проходится, если запас урона больше стольких сигм
+CERTAIN_Z = 6.0
+DIFFICULTIES = ["easy", "normal", "hard", "hardcore"]
+CALIBRATION_PARTIES = ["wmh", "wwh", "mmh", "wmm", "hhh", "www", "wmhh", "wwmm"]
+
+
+def hit(damage, crit_chance):
+    """(среднее, дисперсия) урона int(damage) с критом x1.5 с вероятностью crit_chance"""
+    normal = int(damage)
+    crit = int(damage * CRIT_MULTIPLIER)
+    mean = normal + crit_chance * (crit - normal)
+    return mean, crit_chance * (1 - crit_chance) * (crit - normal) ** 2
+
+
+def _normal_cdf(z):
+    return 0.5 * (1 + math.erf(z / math.sqrt(2)))
+
+
+def _tick(parts):
+    """Урон яда в начале хода: сумма частей (MergeStacks), каждая со своим сроком"""
+    return sum(damage for damage, _ in parts)
+
+
+def _expire(parts):
+    """Конец раунда: срок каждой части уменьшается, истекшие удаляются"""
+    parts[:] = [[amount, rounds - 1] for amount, rounds in parts if rounds > 1]
+
+
+class _SkillModel:
+    __slots__ = ('kind', 'cost', 'cooldown', 'amount', 'variance', 'duration')
+
+    def __init__(self, skill, caster):
+        self.cost = skill.mana_cost
+        self.cooldown = skill.cooldown
+        self.variance = 0.0
+        self.duration = 0
+        if isinstance(skill, DamageSkill):
+            self.kind = "damage"
+            stat = caster.strength * 1.5 if skill.damage_type == "physical" else caster.intelligence * 1.7
+            self.amount, self.variance = hit(skill.base_damage + stat, SKILL_CRIT)
+        elif isinstance(skill, HealSkill):
+            self.kind = "heal"
+            self.amount = int(skill.base_heal + caster.intelligence * 1.2)
+        elif isinstance(skill, EffectSkill) and skill.effect_class is ShieldEffect:
+            effect = ShieldEffect(**skill.effect_kwargs)
+            self.kind = "shield"
+            self.amount, self.duration = effect.shield_amount, effect.duration
+        elif isinstance(skill, EffectSkill) and skill.effect_class is PoisonEffect:
+            effect = PoisonEffect(**skill.effect_kwargs)
+            self.kind = "poison"
+            self.amount, self.duration = effect.damage_per_turn, effect.duration
+        else:
+            self.kind = None
+
+    @property
+    def is_support(self):
+        return self.kind in ("heal", "shield")
+
+
+class _Member:
+    """Ожидаемое состояние персонажа группы"""
+
+    __slots__ = ('hp', 'max_hp', 'mp', 'attack', 'skills', 'cooldowns', 'shields', 'poison')
+
+    def __init__(self, character):
+        self.hp = character.hp
+        self.max_hp = character.max_hp
+        self.mp = character.mp
+        damage, crit_chance = BASIC_ATTACKS[type(character)]
+        self.attack = hit(damage(character), crit_chance)
+        self.skills = [_SkillModel(skill, character) for skill in character.skills]
+        self.cooldowns = [character.cooldowns.get(skill.name, 0) for skill in character.skills]
+        self.shields = []
+        self.poison = []
+
+    @property
+    def is_alive(self):
+        return self.hp > 0
+
+    def ready(self, i):
+        return self.skills[i].kind is not None and self.cooldowns[i] <= 0 and self.mp >= self.skills[i].cost
+
+    def use(self, i):
+        self.mp -= self.skills[i].cost
+        self.cooldowns[i] = self.skills[i].cooldown
+
+    def take_damage(self, damage):
+        for shield in self.shields:
+            absorbed = min(shield[0], damage)
+            shield[0] -= absorbed
+            damage -= absorbed
+        self.hp = max(0.0, self.hp - damage)
+
+
+class Estimate:
+    """Итог оценки: шанс победы группы и раунды до гибели босса и группы"""
+
+    __slots__ = ('win_chance', 'boss_rounds', 'party_rounds', 'party_dpr', 'boss_dpr')
+
+    def __init__(self, win_chance, boss_rounds, party_rounds, party_dpr, boss_dpr):
+        self.win_chance = win_chance
+        # Раунд, в котором падает босс / вся группа (None - не в пределах MAX_ROUNDS)
+        self.boss_rounds = boss_rounds
+        self.party_rounds = party_rounds
+        # Средний урон за раунд группы по боссу и босса по группе
+        self.party_dpr = party_dpr
+        self.boss_dpr = boss_dpr
+
+    @property
+    def rounds(self):
+        """Ожидаемая длина боя: до гибели того, кто вероятнее проиграет"""
+        rounds = self.boss_rounds if self.win_chance >= 0.5 else self.party_rounds
+        return rounds if rounds is not None else MAX_ROUNDS
+
+    def __str__(self):
+        return (f"Прогноз: шанс победы ~{self.win_chance:.0%}, раундов в бою ~{self.rounds} "
+                f"(урон группы {self.party_dpr:.0f}/раунд, босса {self.boss_dpr:.0f}/раунд)")
+
+
+def estimate(party, boss, max_rounds=MAX_ROUNDS, heal_threshold=GreedyPolicy().heal_threshold):
+    """Оценка боя группы party против boss из текущего состояния участников"""
+    members = [_Member(character) for character in party]
+    order = TurnOrder(party + [boss]).order
+    actors = [None if participant is boss else members[party.index(participant)] for participant in order]
+
+    boss_hp = boss.hp
+    boss_mp = boss.mp
+    multiplier = boss.damage_multiplier
+    boss_attack = hit((20 + boss.strength * 0.4) * multiplier, BOSS_CRIT)
+    aoe = int((15 + boss.intelligence * 0.3) * multiplier)
+    boss_poison = int(BOSS_POISON * multiplier)
+    poison_on_boss = []
+
+    # Урон группы по боссу и его дисперсия; урон босса по группе и дисперсия
+    dealt = dealt_variance = 0.0
+    taken = taken_variance = 0.0
+    boss_rounds = party_rounds = None
+
+    def boss_turn(alive):
+        nonlocal boss_mp, taken, taken_variance
+        if not alive:
+            # Группа уже пала: бить некого
+            return
+        fraction = max(0.0, boss_hp - dealt) / boss.max_hp
+        weakest = min(alive, key=lambda m: m.hp)
+        if PHASE3_BELOW < fraction <= PHASE2_BELOW and len(alive) >= 2 and boss_mp >= AOE_COST:
+            boss_mp -= AOE_COST
+            for member in alive:
+                member.take_damage(aoe)
+            taken += aoe * len(alive)
+            return
+        target = weakest
+        if fraction <= PHASE3_BELOW:
+            unpoisoned = [m for m in alive if not m.poison]
+            if unpoisoned:
+                target = unpoisoned[0]
+                if boss_mp >= POISON_COST:
+                    boss_mp -= POISON_COST
+                    target.poison.append([boss_poison, POISON_DURATION])
+                    return
+        elif PHASE3_BELOW < fraction <= PHASE2_BELOW and len(alive) >= 2:
+            # Массовая атака без маны - удар по первому живому
+            target = alive[0]
+        target.take_damage(boss_attack[0])
+        taken += boss_attack[0]
+        taken_variance += boss_attack[1]
+
+    def member_turn(member):
+        nonlocal dealt, dealt_variance
+        wounded = [m for m in members if m.is_alive and m.hp / m.max_hp < heal_threshold]
+        if wounded:
+            for i, skill in enumerate(member.skills):
+                if skill.is_support and member.ready(i):
+                    target = min(wounded, key=lambda m: m.hp / m.max_hp)
+                    member.use(i)
+                    if skill.kind == "heal":
+                        target.hp = min(target.max_hp, target.hp + skill.amount)
+                    else:
+                        target.shields.append([skill.amount, skill.duration])
+                    return
+        for i, skill in enumerate(member.skills):
+            if not skill.is_support and member.ready(i):
+                member.use(i)
+                if skill.kind == "damage":
+                    dealt += skill.amount
+                    dealt_variance += skill.variance
+                else:
+                    poison_on_boss.append([skill.amount, skill.duration])
+                return
+        dealt += member.attack[0]
+        dealt_variance += member.attack[1]
+
+    def deviation():
+        # Урон группы к ее гибели против HP босса; момент гибели плавает из-за критов босса
+        party_dpr = dealt / round_number
+        boss_dpr = taken / round_number
+        rounds_variance = taken_variance / boss_dpr ** 2 if boss_dpr else 0.0
+        return math.sqrt(dealt_variance + party_dpr ** 2 * rounds_variance)
+
+    round_number = 0
+    while round_number < max_rounds:
+        round_number += 1
+        for actor in actors:
+            if actor is None:
+                alive = [m for m in members if m.is_alive]
+                dealt += _tick(poison_on_boss)
+                boss_turn(alive)
+            elif actor.is_alive:
+                if actor.poison:
+                    actor.take_damage(_tick(actor.poison))
+                if actor.is_alive:
+                    member_turn(actor)
+            if boss_rounds is None and dealt >= boss_hp:
+                boss_rounds = round_number
+            # Группу ранят только ход босса и яд
+            if (actor is None or actor.poison) and not any(m.hp > 0 for m in members):
+                party_rounds = round_number
+                break
+        if party_rounds is not None:
+            break
+        if boss_rounds is not None and dealt - boss_hp > CERTAIN_Z * deviation():
+            break
+        _expire(poison_on_boss)
+        for member in members:
+            member.cooldowns = [turns - 1 for turns in member.cooldowns]
+            _expire(member.poison)
+            _expire(member.shields)
+
+    sd = deviation()
+    if party_rounds is None and boss_rounds is None:
+        win_chance = 0.0
+    elif sd == 0:
+        win_chance = 1.0 if dealt >= boss_hp else 0.0
+    else:
+        win_chance = _normal_cdf((dealt - boss_hp) / sd)
+    return Estimate(win_chance, boss_rounds, party_rounds, dealt / round_number, taken / round_number)
+
+
+def calibrate(difficulties=DIFFICULTIES, parties=CALIBRATION_PARTIES, battles=200, seed=0):
+    """Оценки против боев simulate.run_battle: строка отчета на каждую конфигурацию"""
+    from roster import create_party, create_boss
+    from simulate import parse_composition, run_battle
+
+    rows = []
+    for difficulty in difficulties:
+        for text in parties:
+            composition = parse_composition(text)
+            party = create_party(difficulty, composition)
+            boss = create_boss(difficulty)
+            start = time.perf_counter()
+            result = estimate(party, boss)
+            elapsed = time.perf_counter() - start
+
+            outcomes = [run_battle(difficulty, composition, battle_seed)
+                        for battle_seed in range(seed, seed + battles)]
+            wins = sum(outcome.party_won for outcome in outcomes)
+            rows.append({
+                "difficulty": difficulty,
+                "party": text,
+                "estimated_win": result.win_chance,
+                "simulated_win": wins / battles,
+                "estimated_rounds": result.rounds,
+                "simulated_rounds": sum(outcome.rounds for outcome in outcomes) / battles,
+                # Средний квадрат ошибки оценки на исходах отдельных боев
+                "brier": (wins * (1 - result.win_chance) ** 2
+                          + (battles - wins) * result.win_chance ** 2) / battles,
+                "estimate_us": elapsed * 1e6,
+            })
+    return rows
+
+
+def summarize(rows):
+    n = len(rows)
+    return {
+        "configurations": n,
+        "win_mae": sum(abs(r["estimated_win"] - r["simulated_win"]) for r in rows) / n,
+        "rounds_mae": sum(abs(r["estimated_rounds"] - r["simulated_rounds"]) for r in rows) / n,
+        "brier": sum(r["brier"] for r in rows) / n,
+        "max_estimate_us": max(r["estimate_us"] for r in rows),
+    }
+
+
+def format_report(rows):
+    lines = [f"{'сложность':<10} {'группа':<6} {'победа: оценка':>15} {'бои':>6} "
+             f"{'раунды: оценка':>15} {'бои':>6} {'мкс':>6}"]
+    for r in rows:
+        lines.append(f"{r['difficulty']:<10} {r['party']:<6} {r['estimated_win']:>15.0%} {r['simulated_win']:>6.0%} "
+                     f"{r['estimated_rounds']:>15} {r['simulated_rounds']:>6.1f} {r['estimate_us']:>6.0f}")
+    summary = summarize(rows)
+    lines.append(f"Средняя ошибка шанса победы: {summary['win_mae']:.1%}, раундов: {summary['rounds_mae']:.2f}, "
+                 f"Брайер: {summary['brier']:.3f}, оценка не дольше {summary['max_estimate_us']:.0f} мкс")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    from roster import create_party, create_boss
+    from simulate import parse_composition
+
+    parser = argparse.ArgumentParser(description="Аналитическая оценка исхода боя")
+    parser.add_argument("-d", "--difficulty", action="append", choices=DIFFICULTIES,
+                        help="уровень сложности (по умолчанию все)")
+    parser.add_argument("-p", "--party", action="append",
+                        help="состав группы: w - воин, m - маг, h - лекарь")
+    parser.add_argument("--calibrate", action="store_true",
+                        help="сравнить оценки с боями simulate.py")
+    parser.add_argument("-n", "--battles", type=int, default=200, help="боев на конфигурацию при калибровке")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", metavar="FILE", help="записать отчет калибровки в JSON")
+    args = parser.parse_args(argv)
+
+    difficulties = args.difficulty or DIFFICULTIES
+    if args.calibrate:
+        rows = calibrate(difficulties, args.party or CALIBRATION_PARTIES, args.battles, args.seed)
+        print(format_report(rows))
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump({"summary": summarize(rows), "rows": rows}, f, ensure_ascii=False, indent=2)
+        return
+
+    for difficulty in difficulties:
+        for text in args.party or ["wmh"]:
+            party = create_party(difficulty, parse_composition(text))
+            print(f"{difficulty} {text}: {estimate(party, create_boss(difficulty))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""Типизированные боевые события и шина подписчиков
+
+Участники боя сообщают о результатах действий через свою шину событий
+(combatant.events). Событие создается только если на его тип есть подписчики,
+поэтому без слушателей не строится ни объектов, ни строк.
+"""
+
+
+class CombatEvent:
+    """Базовый класс боевого события"""
+
+    __slots__ = ()
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{self.__class__.__name__}({fields})"
+
+
+class DamageDealt(CombatEvent):
+    """Нанесен урон. kind: attack, magic_attack, skill, aoe, poison"""
+
+    __slots__ = ('source', 'target', 'amount', 'kind', 'name')
+
+    def __init__(self, source, target, amount, kind, name=None):
+        self.source = source
+        self.target = target
+        self.amount = amount
+        self.kind = kind
+        self.name = name
+
+
+class Healed(CombatEvent):
+    """Восстановлено HP. kind: skill, regeneration, potion"""
+
+    __slots__ = ('source', 'target', 'amount', 'kind', 'name')
+
+    def __init__(self, source, target, amount, kind, name=None):
+        self.source = source
+        self.target = target
+        self.amount = amount
+        self.kind = kind
+        self.name = name
+
+
+class ManaRestored(CombatEvent):
+    """Восстановлена мана"""
+
+    __slots__ = ('target', 'amount', 'name')
+
+    def __init__(self, target, amount, name=None):
+        self.target = target
+        self.amount = amount
+        self.name = name
+
+
+class SkillUsed(CombatEvent):
+    """Использован навык без прямого урона или лечения (наложение эффекта)"""
+
+    __slots__ = ('caster', 'target', 'name')
+
+    def __init__(self, caster, target, name):
+        self.caster = caster
+        self.target = target
+        self.name = name
+
+
+class EffectApplied(CombatEvent):
+    __slots__ = ('target', 'effect')
+
+    def __init__(self, target, effect):
+        self.target = target
+        self.effect = effect
+
+
+class EffectStacked(CombatEvent):
+    """Эффект слился с уже наложенным эффектом того же типа (into)"""
+
+    __slots__ = ('target', 'into', 'effect')
+
+    def __init__(self, target, into, effect):
+        self.target = target
+        self.into = into
+        self.effect = effect
+
+
+class EffectExpired(CombatEvent):
+    __slots__ = ('target', 'effect')
+
+    def __init__(self, target, effect):
+        self.target = target
+        self.effect = effect
+
+
+class ShieldAbsorbed(CombatEvent):
+    """Щит поглотил урон; remaining - урон, прошедший сквозь щит"""
+
+    __slots__ = ('target', 'amount', 'remaining')
+
+    def __init__(self, target, amount, remaining):
+        self.target = target
+        self.amount = amount
+        self.remaining = remaining
+
+
+class PhaseChanged(CombatEvent):
+    __slots__ = ('boss', 'phase', 'strategy')
+
+    def __init__(self, boss, phase, strategy):
+        self.boss = boss
+        self.phase = phase
+        self.strategy = strategy
+
+
+class ActionFailed(CombatEvent):
+    """Действие не выполнено. reason: silenced, no_mana, cooldown, bad_skill, bad_item"""
+
+    __slots__ = ('actor', 'reason', 'name', 'remaining')
+
+    def __init__(self, actor, reason, name=None, remaining=0):
+        self.actor = actor
+        self.reason = reason
+        self.name = name
+        self.remaining = remaining
+
+
+EVENT_TYPES = (DamageDealt, Healed, ManaRestored, SkillUsed, EffectApplied, EffectStacked,
+               EffectExpired, ShieldAbsorbed, PhaseChanged, ActionFailed)
+
+
+class EventBus:
+    """Шина событий: подписчики на отдельные типы событий"""
+
+    __slots__ = ('_handlers',)
+
+    def __init__(self):
+        self._handlers = {}
+
+    def subscribe(self, event_type, handler):
+        self._handlers.setdefault(event_type, []).append(handler)
+
+    def subscribe_all(self, handler):
+        for event_type in EVENT_TYPES:
+            self.subscribe(event_type, handler)
+
+    def unsubscribe(self, event_type, handler):
+        handlers = self._handlers.get(event_type)
+        if handlers and handler in handlers:
+            handlers.remove(handler)
+            if not handlers:
+                del self._handlers[event_type]
+
+    def wants(self, event_type):
+        """Есть ли подписчики на тип событий"""
+        return event_type in self._handlers
+
+    def emit(self, event_type, *args):
+        """Создает событие и рассылает его, только если есть подписчики"""
+        handlers = self._handlers.get(event_type)
+        if handlers:
+            event = event_type(*args)
+            for handler in handlers:
+                handler(event)
+
+
+# Шина для участников вне боя; Battle назначает участникам свою шину
+default_bus = EventBus()
+
+
+class ConsoleSubscriber:
+    """Вывод боевых событий в консоль; действия босса идут в его журнал"""
+
+    def __init__(self, bus=None):
+        if bus is not None:
+            bus.subscribe_all(self)
+
+    def __call__(self, event):
+        message = self.format(event)
+        if message is None:
+            return
+        actor = getattr(event, 'source', None) or getattr(event, 'caster', None) or getattr(event, 'boss', None)
+        if hasattr(actor, 'add_log'):
+            actor.add_log(message)
+        else:
+            print(message)
+
+    def format(self, event):
+        if isinstance(event, DamageDealt):
+            return self.format_damage(event)
+        if isinstance(event, Healed):
+            return self.format_heal(event)
+        if isinstance(event, ManaRestored):
+            return f"{event.target.name} использует {event.name} и восстанавливает {event.amount} MP!"
+        if isinstance(event, SkillUsed):
+            return f"{event.caster.name} использует {event.name} на {event.target.name}!"
+        if isinstance(event, EffectApplied):
+            return event.effect.describe_applied(event.target)
+        if isinstance(event, EffectStacked):
+            return event.into.describe_stacked(event.target)
+        if isinstance(event, EffectExpired):
+            return event.effect.describe_expired(event.target)
+        if isinstance(event, ShieldAbsorbed):
+            lines = []
+            if event.amount > 0:
+                lines.append(f"Щит поглотил {event.amount} урона!")
+            if event.remaining == 0:
+                lines.append("Щит поглотил весь урон!")
+            return "\n".join(lines) or None
+        if isinstance(event, PhaseChanged):
+            return f"{event.boss.name} меняет тактику: {event.strategy.title}"
+        if isinstance(event, ActionFailed):
+            return self.format_failure(event)
+        return None
+
+    @staticmethod
+    def format_damage(event):
+        source, target, amount = event.source, event.target, event.amount
+        if event.kind == "attack":
+            return f"{source.name} атакует {target.name} и наносит {amount} урона!"
+        if event.kind == "magic_attack":
+            return f"{source.name} атакует {target.name} магией и наносит {amount} урона!"
+        if event.kind == "skill":
+            return f"{source.name} использует {event.name} на {target.name} и наносит {amount} урона!"
+        if event.kind == "aoe":
+            return f"{source.name} использует массовую атаку на {target.name}!"
+        return f"{target.name} получает {amount} урона от яда!"
+
+    @staticmethod
+    def format_heal(event):
+        if event.kind == "skill":
+            return (f"{event.source.name} использует {event.name} на {event.target.name} "
+                    f"и восстанавливает {event.amount} HP!")
+        if event.kind == "potion":
+            return f"{event.target.name} использует {event.name} и восстанавливает {event.amount} HP!"
+        return f"{event.target.name} восстанавливает {event.amount} HP от регенерации"
+
+    @staticmethod
+    def format_failure(event):
+        if event.reason == "silenced":
+            return f"{event.actor.name} немой и не может использовать навыки!"
+        if event.reason == "no_mana":
+            return f"Недостаточно маны для {event.name}!"
+        if event.reason == "cooldown":
+            return f"Навык {event.name} на перезарядке! Осталось: {event.remaining} ходов"
+        if event.reason == "bad_skill":
+            return "Неверный индекс навыка!"
+        return "Неверный индекс предмета!"
@@ -0,0 +1,177 @@
+"""Подсказка «рекомендуемое действие», которая считается, пока игрок думает
+
+Пока Battle.player_turn ждет input(), процессор простаивает. В начале хода
+HintEngine.start() копирует бой (HeadlessBattle.from_battle) и запускает
+фоновый поток, который доигрывает каждое допустимое действие игрока
+(battle.legal_actions): остаток раунда, затем до horizon раундов, где
+группой управляет GreedyPolicy, а босс - обычные стратегии фаз. Действия
+для доигрывания выбираются по UCB1 (search.ucb_choice), поэтому оценки
+лучших действий уточняются быстрее.
+
+Оценка доигрывания для группы - search.party_value: 1 за победу, 0 за
+поражение, иначе оценка по оставшемуся HP. Среднее по доигрываниям -
+оценка шанса победы.
+
+Battle.perform_action отменяет поиск, как только игрок выбрал действие:
+доигрывание проверяет отмену перед каждым ходом, поэтому поток
+останавливается за один ход и больше не делит процессор (и GIL) с боем.
+Живой бой поток не трогает, его ГСЧ тоже.
+
+Подсказки включаются параметром main.py --hints.
+"""
+import random
+import threading
+
+import search
+from battle import HeadlessBattle
+from policies import GreedyPolicy
+
+# Раундов доигрывания после текущего
+HORIZON = 50
+# Предел доигрываний за ход, чтобы поток не работал бесконечно
+MAX_ROLLOUTS = 5000
+# Сколько лучших действий показывать
+SHOWN = 3
+
+
+class _Cancelled(Exception):
+    pass
+
+
+class _Rollout(HeadlessBattle):
+    """Доигрывание подсказки: перед каждым ходом проверяет, не отменен ли поиск"""
+
+    cancelled = None
+
+    def process_turn(self, participant):
+        if self.cancelled.is_set():
+            raise _Cancelled()
+        super().process_turn(participant)
+
+
+def describe(battle, player, action):
+    """Действие (тип, индекс, цель) словами"""
+    action_type, index, target = action
+    if action_type == "attack":
+        return f"Базовая атака → {target.name}"
+    if action_type == "skill":
+        return f"Навык «{player.skills[index].name}» → {target.name}"
+    if action_type == "item":
+        return f"Предмет «{battle.create_inventory().items[index].name}» → {target.name}"
+    return "Пропустить ход"
+
+
+class TurnHints:
+    """Оценки действий одного хода игрока; считаются в фоновом потоке до cancel()"""
+
+    def __init__(self, battle, player, horizon=HORIZON, seed=None):
+        participants = battle.party + [battle.boss]
+        self.actions = battle.legal_actions(player)
+        self.descriptions = [describe(battle, player, action) for action in self.actions]
+        self.horizon = horizon
+        # [доигрываний, сумма оценок] по действиям; пишет только поток поиска
+        self.stats = [[0, 0.0] for _ in self.actions]
+        self.rng = random.Random(seed)
+
+        # Копия боя снимается здесь, в потоке боя; цели хранятся индексами
+        self._cancelled = threading.Event()
+        self._root = _Rollout.from_battle(battle, GreedyPolicy())
+        self._root.cancelled = self._cancelled
+        search.use_strategies(self._root.boss, search.rules_of(self._root.boss))
+        self._player_index = battle.party.index(player)
+        self._targets = [None if target is None else participants.index(target)
+                         for _, _, target in self.actions]
+        self._thread = threading.Thread(target=self._run, name="hints", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        """Останавливает поиск и дожидается потока (не дольше одного хода доигрывания)"""
+        self._cancelled.set()
+        if self._thread.ident is not None:
+            self._thread.join()
+
+    def join(self, timeout=None):
+        self._thread.join(timeout)
+
+    @property
+    def rollouts(self):
+        return sum(visits for visits, _ in self.stats)
+
+    def rollout(self, choice, seed):
+        """Оценка действия choice в одном доигрывании; None, если поиск отменен"""
+        battle = self._root.clone()
+        battle.rng.seed(seed)
+        start_round = battle.round
+        battle.max_rounds = battle.round + self.horizon
+        participants = battle.party + [battle.boss]
+        action_type, index, _ = self.actions[choice]
+        target = self._targets[choice]
+        try:
+            battle.perform_action(battle.party[self._player_index],
+                                  (action_type, index, None if target is None else participants[target]))
+            search.finish_round(battle, self._player_index)
+
+            turn_order = battle.create_turn_order()
+            while battle.is_active and battle.round < battle.max_rounds:
+                battle.play_round(turn_order)
+        except _Cancelled:
+            return None
+
+        return search.party_value(battle, start_round)
+
+    def _run(self):
+        stats = self.stats
+        total = 0
+        while total < MAX_ROLLOUTS and not self._cancelled.is_set():
+            choice = total if total < len(stats) else search.ucb_choice(stats, total)
+            value = self.rollout(choice, self.rng.getrandbits(64))
+            if value is None:
+                break
+            stats[choice][1] += value
+            stats[choice][0] += 1
+            total += 1
+
+    def ranking(self):
+        """[(описание, действие, доигрываний, оценка шанса победы)], лучшие первыми"""
+        rows = [(description, action, visits, value / visits)
+                for description, action, (visits, value) in zip(self.descriptions, self.actions, self.stats)
+                if visits]
+        # Поиск чаще доигрывает лучшие действия: сортировка по числу доигрываний
+        rows.sort(key=lambda row: (-row[2], -row[3]))
+        return rows
+
+    def format(self, limit=SHOWN):
+        rows = self.ranking()
+        if not rows:
+            return "Подсказка еще считается, попробуйте через секунду."
+        lines = [f"Подсказка ({self.rollouts} доигрываний):"]
+        for i, (description, _, visits, chance) in enumerate(rows[:limit], 1):
+            lines.append(f"{i}. {description}: шанс победы ~{chance:.0%} ({visits})")
+        return "\n".join(lines)
+
+
+class HintEngine:
+    """Подсказки для боя: Battle.player_turn вызывает start(), perform_action - cancel()"""
+
+    def __init__(self, horizon=HORIZON, seed=None):
+        self.horizon = horizon
+        self.rng = random.Random(seed)
+        self.current = None
+
+    def start(self, battle, player):
+        """Начинает оценку действий player; предыдущий поиск отменяется"""
+        self.cancel()
+        self.current = TurnHints(battle, player, self.horizon, self.rng.getrandbits(64)).start()
+        return self.current
+
+    def cancel(self):
+        if self.current is not None:
+            self.current.cancel()
+
+    def format(self):
+        if self.current is None:
+            return "Подсказка недоступна."
+        return self.current.format()
@@ -0,0 +1,235 @@
+"""Инструментирование горячих путей боя: число вызовов, время и тики эффектов
+
+По умолчанию выключено и ничего не стоит: методы классов остаются
+исходными. enable() подменяет методы из hot_paths() обертками, которые
+считают вызовы и время (perf_counter_ns), disable() возвращает исходные
+методы. Время включающее: process_turn содержит и choose_action босса,
+и использование навыков.
+
+Для процентилей у каждого таймера хранится выборка длительностей
+ограниченного размера (reservoir sampling). Тики эффектов - эффекты,
+сработавшие в начале хода и обновленные в конце раунда, по номерам раундов.
+"""
+import atexit
+import functools
+import json
+import random
+import time
+
+# Размер выборки длительностей одного таймера
+SAMPLE_SIZE = 10000
+PERCENTILES = (50, 90, 99)
+ROUND_TIMER = "battle.Battle.update_all_effects"
+
+# Текущие метрики (Metrics) или None, если инструментирование выключено
+metrics = None
+_patched = []
+# Файл отчета при выходе из программы; _dump_at_exit регистрируется в atexit один раз
+_dump_to = None
+
+
+def _subclasses(cls):
+    for subclass in cls.__subclasses__():
+        yield subclass
+        yield from _subclasses(subclass)
+
+
+def _start_of_turn_ticks(battle, participant):
+    return len(participant.effects.turn_start())
+
+
+def _end_of_round_ticks(battle):
+    return sum(len(p.effects) for p in battle.party + [battle.boss] if p.is_alive)
+
+
+def hot_paths():
+    """[(класс, имя метода, подсчет тиков эффектов или None)] для инструментирования"""
+    from battle import Battle
+    from bosses import Boss
+    from items import Item
+    from skills import Skill
+
+    paths = [
+        (Battle, "process_turn", None),
+        (Battle, "process_start_of_turn_effects", _start_of_turn_ticks),
+        (Battle, "update_all_effects", _end_of_round_ticks),
+        (Boss, "choose_action", None),
+    ]
+    for base in (Skill, Item):
+        paths += [(cls, "use", None) for cls in _subclasses(base)
+                  if "use" in vars(cls) and not getattr(vars(cls)["use"], "__isabstractmethod__", False)]
+    return paths
+
+
+class Timer:
+    """Число вызовов, суммарное время и выборка длительностей (нс)"""
+
+    __slots__ = ('calls', 'total', 'samples', '_rng')
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0
+        self.samples = []
+        # Свой генератор: выборка не трогает случайность боя
+        self._rng = random.Random(0)
+
+    def add(self, duration):
+        self.calls += 1
+        self.total += duration
+        if len(self.samples) < SAMPLE_SIZE:
+            self.samples.append(duration)
+        else:
+            slot = self._rng.randrange(self.calls)
+            if slot < SAMPLE_SIZE:
+                self.samples[slot] = duration
+
+    def merge(self, calls, total, samples):
+        """Добавляет таймер из другого процесса; выборка остается равномерной по вызовам"""
+        if not calls:
+            return
+        # Каждый элемент выборки представляет calls / len(samples) вызовов
+        weights = ([self.calls / len(self.samples)] * len(self.samples) if self.samples else [])
+        weights += [calls / len(samples)] * len(samples) if samples else []
+        pool = self.samples + list(samples)
+        self.calls += calls
+        self.total += total
+        if len(pool) > SAMPLE_SIZE:
+            pool = self._rng.choices(pool, weights, k=SAMPLE_SIZE)
+        self.samples = pool
+
+    def summary(self):
+        result = {
+            "calls": self.calls,
+            "total_ms": self.total / 1e6,
+            "mean_us": self.total / self.calls / 1e3 if self.calls else 0.0,
+        }
+        ordered = sorted(self.samples)
+        for p in PERCENTILES:
+            value = ordered[min(len(ordered) - 1, len(ordered) * p // 100)] if ordered else 0
+            result[f"p{p}_us"] = value / 1e3
+        return result
+
+
+class Metrics:
+    """Таймеры горячих путей и тики эффектов по раундам"""
+
+    def __init__(self):
+        self.timers = {}
+        self.effect_ticks = {}
+
+    def timer(self, label):
+        timer = self.timers.get(label)
+        if timer is None:
+            timer = self.timers[label] = Timer()
+        return timer
+
+    def add_ticks(self, round_number, count):
+        self.effect_ticks[round_number] = self.effect_ticks.get(round_number, 0) + count
+
+    def reset(self):
+        for timer in self.timers.values():
+            timer.calls = timer.total = 0
+            timer.samples.clear()
+        self.effect_ticks.clear()
+
+    def state(self):
+        """Сырые данные для передачи из рабочего процесса (см. merge)"""
+        return {
+            "timers": {label: (t.calls, t.total, t.samples) for label, t in self.timers.items()},
+            "effect_ticks": dict(self.effect_ticks),
+        }
+
+    def merge(self, state):
+        for label, (calls, total, samples) in state["timers"].items():
+            self.timer(label).merge(calls, total, samples)
+        for round_number, count in state["effect_ticks"].items():
+            self.add_ticks(int(round_number), count)
+
+    def report(self):
+        """{"timers": {метка: сводка}, "effect_ticks": {раунд: тики}}"""
+        return {
+            "timers": {label: timer.summary() for label, timer in self.timers.items() if timer.calls},
+            "effect_ticks": dict(sorted(self.effect_ticks.items())),
+        }
+
+    def format(self):
+        lines = [f"{'метод':<44} {'вызовы':>9} {'всего мс':>10} {'сред. мкс':>10} "
+                 + " ".join(f"{f'p{p} мкс':>9}" for p in PERCENTILES)]
+        timers = sorted(self.report()["timers"].items(), key=lambda item: -item[1]["total_ms"])
+        for label, s in timers:
+            lines.append(f"{label:<44} {s['calls']:>9} {s['total_ms']:>10.2f} {s['mean_us']:>10.2f} "
+                         + " ".join(f"{s[f'p{p}_us']:>9.2f}" for p in PERCENTILES))
+        if self.effect_ticks:
+            # Раунды всех боев: по одному update_all_effects на раунд
+            round_timer = self.timers.get(ROUND_TIMER)
+            rounds = round_timer.calls if round_timer else len(self.effect_ticks)
+            total = sum(self.effect_ticks.values())
+            lines.append(f"Тики эффектов: {total} за {rounds} раундов, "
+                         f"в среднем {total / rounds:.1f} на раунд")
+        return "\n".join(lines)
+
+    def dump(self, filename):
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=2)
+
+
+def _wrap(owner, method, func, ticks):
+    timer = metrics.timer(f"{owner.__module__}.{owner.__name__}.{method}")
+    add_ticks = metrics.add_ticks
+    clock = time.perf_counter_ns
+
+    if ticks is None:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                timer.add(clock() - start)
+    else:
+        @functools.wraps(func)
+        def wrapper(battle, *args, **kwargs):
+            add_ticks(battle.round, ticks(battle, *args, **kwargs))
+            start = clock()
+            try:
+                return func(battle, *args, **kwargs)
+            finally:
+                timer.add(clock() - start)
+    return wrapper
+
+
+def _dump_at_exit():
+    if metrics is not None and _dump_to is not None:
+        metrics.dump(_dump_to)
+
+
+def enable(dump_to=None):
+    """Включает инструментирование и возвращает Metrics
+
+    dump_to - файл JSON, куда отчет записывается при выходе из программы
+    (последний указанный; disable() отменяет запись).
+    """
+    global metrics, _dump_to
+    if metrics is None:
+        metrics = Metrics()
+        for owner, method, ticks in hot_paths():
+            func = vars(owner)[method]
+            _patched.append((owner, method, func))
+            setattr(owner, method, _wrap(owner, method, func, ticks))
+    if dump_to is not None:
+        if _dump_to is None:
+            atexit.register(_dump_at_exit)
+        _dump_to = dump_to
+    return metrics
+
+
+def disable():
+    """Возвращает исходные методы; собранные метрики остаются у вызывающего"""
+    global metrics, _dump_to
+    while _patched:
+        owner, method, func = _patched.pop()
+        setattr(owner, method, func)
+    if _dump_to is not None:
+        atexit.unregister(_dump_at_exit)
+        _dump_to = None
+    metrics = None
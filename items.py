@@ -1,3 +1,6 @@
+from events import Healed, ManaRestored, ActionFailed
+
+
 class Item:
     """Базовый класс предмета"""
     
@@ -21,7 +24,7 @@ class HealthPotion(Item):
         old_hp = target.hp
         target.hp = min(target.max_hp, target.hp + 50)
         heal_amount = target.hp - old_hp
-        print(f"{target.name} использует {self.name} и восстанавливает {heal_amount} HP!")
+        target.events.emit(Healed, None, target, heal_amount, "potion", self.name)
         return True
 
 class ManaPotion(Item):
@@ -34,7 +37,7 @@ class ManaPotion(Item):
         old_mp = target.mp
         target.mp = min(target.max_mp, target.mp + 30)
         restore_amount = target.mp - old_mp
-        print(f"{target.name} использует {self.name} и восстанавливает {restore_amount} MP!")
+        target.events.emit(ManaRestored, target, restore_amount, self.name)
         return True
 
 class Inventory:
@@ -54,7 +57,7 @@ class Inventory:
     
     def use_item(self, item_index, target):
         if item_index < 0 or item_index >= len(self.items):
-            print("Неверный индекс предмета!")
+            target.events.emit(ActionFailed, target, "bad_item")
             return False
         
         item = self.items[item_index]
@@ -0,0 +1,247 @@
+"""Автосохранение боя: журнал изменений и периодические контрольные точки
+
+Контрольная точка - полный снимок боя (snapshot.py) в файле <имя>.pbs.
+После каждого хода в журнал <имя>.pbj дописывается запись только с тем,
+что изменилось: раунд, позиция внутри раунда (Battle.turn_position) и исход
+боя, измененные слова состояния ГСЧ и измененные части записей участников
+(snapshot.SECTIONS). По позиции восстановленный бой доигрывает прерванный
+раунд: оставшиеся ходы и обновление эффектов в конце раунда. Каждые
+checkpoint_every раундов пишется новая контрольная точка, а журнал
+начинается заново.
+
+Журнал (little-endian):
+    заголовок    b"PBJL", версия (u16), crc32 контрольной точки (u32)
+    запись       длина (u32), crc32 (u32), данные
+
+Запись с неверной длиной или crc32 (оборванная при сбое) и все после нее
+при восстановлении отбрасываются. Журнал от другой контрольной точки
+(сбой между записью точки и началом нового журнала) не применяется.
+"""
+import os
+import struct
+import zlib
+
+import snapshot
+import streams
+
+MAGIC = b"PBJL"
+VERSION = 2
+EXTENSION = ".pbj"
+
+_HEADER = struct.Struct("<4sHI")
+_RECORD = struct.Struct("<II")
+# Раунд, бой идет, раунд не закончен, позиция внутри раунда
+_TURN = struct.Struct("<IBBI")
+_WORD = struct.Struct("<HI")
+# Позиция буферизованного генератора: есть ли блок, seed блока, выдано бросков
+_BLOCK = struct.Struct("<BQI")
+# Измененный участник: индекс и маска измененных частей записи
+_CHANGE = struct.Struct("<HB")
+
+# Изменение ГСЧ: нет, отдельные слова состояния, состояние целиком,
+# позиция в блоке буферизованного генератора и изменение его основного генератора
+RNG_SAME, RNG_WORDS, RNG_FULL, RNG_BUFFERED = 0, 1, 2, 3
+# Больше измененных слов - дешевле записать состояние целиком
+RNG_MAX_WORDS = 64
+
+
+def _pack_rng_delta(out, old, new):
+    if new == old:
+        out += b"\x00"
+        return
+    if (old is not None and new is not None and old[0] == new[0] == streams.BUFFERED
+            and old[1:3] == new[1:3]):
+        block_seed = new[4]
+        out += bytes((RNG_BUFFERED,))
+        out += _BLOCK.pack(block_seed is not None, block_seed or 0, new[5])
+        _pack_rng_delta(out, old[3], new[3])
+        return
+    if old is None or new is None or old[0] != new[0] or old[0] == streams.BUFFERED:
+        out += bytes((RNG_FULL,))
+        snapshot._pack_rng(out, new)
+        return
+    changed = [i for i, (a, b) in enumerate(zip(old[1], new[1])) if a != b]
+    if len(changed) > RNG_MAX_WORDS:
+        out += bytes((RNG_FULL,))
+        snapshot._pack_rng(out, new)
+        return
+    out += bytes((RNG_WORDS,))
+    out += snapshot._U16.pack(len(changed))
+    for i in changed:
+        out += _WORD.pack(i, new[1][i])
+    snapshot._pack_value(out, new[2])
+
+
+def _unpack_rng_delta(reader, state):
+    kind = reader.byte()
+    if kind == RNG_SAME:
+        return state
+    if kind == RNG_FULL:
+        return snapshot._unpack_rng(reader)
+    if kind == RNG_BUFFERED and state is not None and state[0] == streams.BUFFERED:
+        has_block, block_seed, consumed = reader.unpack(_BLOCK)
+        core_state = _unpack_rng_delta(reader, state[3])
+        return (streams.BUFFERED, state[1], state[2], core_state,
+                block_seed if has_block else None, consumed)
+    if kind != RNG_WORDS or state is None:
+        raise snapshot.SnapshotError(f"Неизвестное изменение ГСЧ: {kind}")
+    internal = list(state[1])
+    for _ in range(reader.unpack(snapshot._U16)[0]):
+        i, value = reader.unpack(_WORD)
+        internal[i] = value
+    return state[0], tuple(internal), reader.value()
+
+
+def _participants(battle):
+    return battle.party + [battle.boss]
+
+
+class Journal:
+    """Журнал автосохранения одного боя
+
+    В потоке боя только снимается состояние (snapshot.freeze); сравнение с
+    прошлой записью, кодирование и запись на диск выполняет writer
+    (savewriter.BackgroundWriter) в своем потоке. Без writer запись идет сразу.
+    """
+
+    def __init__(self, basename, checkpoint_every=10, sync=True, writer=None):
+        self.checkpoint_file = basename + snapshot.EXTENSION
+        self.journal_file = basename + EXTENSION
+        self.checkpoint_every = checkpoint_every
+        self.sync = sync
+        self.writer = writer
+        self.bytes_written = 0
+        self._started = False
+        # Состояние потока записи: открытый журнал и последнее записанное состояние
+        self._file = None
+        self._last = None
+        self._position = None
+
+    def _submit(self, job, *args):
+        if self.writer is None:
+            job(*args)
+        else:
+            self.writer.submit(job, *args)
+
+    def checkpoint(self, battle):
+        """Полный снимок боя и новый пустой журнал"""
+        self._started = True
+        self._submit(self._write_checkpoint, snapshot.freeze(battle))
+
+    def record(self, battle):
+        """Дописывает в журнал изменения с прошлой записи"""
+        if not self._started:
+            # Снимок не хранит позицию внутри раунда: она уходит в первую запись
+            self.checkpoint(battle)
+        self._submit(self._write_changes, snapshot.freeze(battle), battle.turn_position)
+
+    def end_round(self, battle):
+        """Конец раунда: запись изменений или новая контрольная точка"""
+        if not self._started or (self.checkpoint_every and battle.round % self.checkpoint_every == 0):
+            self.checkpoint(battle)
+        else:
+            self.record(battle)
+
+    def close(self):
+        self._submit(self._close)
+
+    def _write_checkpoint(self, state):
+        data = snapshot.encode(state)
+        snapshot.write_atomic(self.checkpoint_file, data)
+        header = _HEADER.pack(MAGIC, VERSION, zlib.crc32(data))
+        snapshot.write_atomic(self.journal_file, header)
+
+        self._close()
+        self._file = open(self.journal_file, 'ab')
+        self._last = state
+        self._position = None
+
+    def _write_changes(self, state, position=None):
+        last = self._last
+        changed = []
+        for index, (old, new) in enumerate(zip(last.participants, state.participants)):
+            mask = 0
+            for i, (old_section, section) in enumerate(zip(old.sections, new.sections)):
+                if section != old_section:
+                    mask |= 1 << i
+            if mask:
+                changed.append((index, mask, new.sections))
+
+        if (not changed and state.rng == last.rng and state.round == last.round and position == self._position
+                and state.is_active == last.is_active and state.winner == last.winner):
+            return
+
+        payload = bytearray(_TURN.pack(state.round, state.is_active, position is not None, position or 0))
+        snapshot._pack_value(payload, state.winner)
+        _pack_rng_delta(payload, last.rng, state.rng)
+        payload += snapshot._U16.pack(len(changed))
+        for index, mask, sections in changed:
+            payload += _CHANGE.pack(index, mask)
+            for i, ((_, pack, _), section) in enumerate(zip(snapshot.SECTIONS, sections)):
+                if mask >> i & 1:
+                    pack(payload, section)
+
+        self._write(_RECORD.pack(len(payload), zlib.crc32(payload)) + payload)
+        self._last = state
+        self._position = position
+
+    def _write(self, data):
+        self._file.write(data)
+        self._file.flush()
+        if self.sync:
+            os.fsync(self._file.fileno())
+        self.bytes_written += len(data)
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def _apply_record(battle, reader, rng):
+    battle.round, is_active, in_round, position = reader.unpack(_TURN)
+    battle.is_active = bool(is_active)
+    battle.turn_position = position if in_round else None
+    battle.winner = reader.value()
+    rng = _unpack_rng_delta(reader, rng)
+    participants = _participants(battle)
+    for _ in range(reader.unpack(snapshot._U16)[0]):
+        index, mask = reader.unpack(_CHANGE)
+        for i, (_, _, unpack) in enumerate(snapshot.SECTIONS):
+            if mask >> i & 1:
+                unpack(reader, participants[index])
+    return rng
+
+
+def recover(basename, battle_class=None):
+    """Бой из контрольной точки и всех целых записей журнала"""
+    if basename.endswith(snapshot.EXTENSION):
+        basename = basename[:-len(snapshot.EXTENSION)]
+    with open(basename + snapshot.EXTENSION, 'rb') as f:
+        data = f.read()
+    battle = snapshot.loads(data, battle_class)
+
+    try:
+        with open(basename + EXTENSION, 'rb') as f:
+            journal = f.read()
+    except FileNotFoundError:
+        return battle
+    if len(journal) < _HEADER.size:
+        return battle
+    magic, version, checkpoint_crc = _HEADER.unpack_from(journal)
+    if magic != MAGIC or version != VERSION or checkpoint_crc != zlib.crc32(data):
+        return battle
+
+    rng = battle.rng.getstate() if battle.rng is not None else None
+    pos = _HEADER.size
+    while pos + _RECORD.size <= len(journal):
+        size, crc = _RECORD.unpack_from(journal, pos)
+        payload = journal[pos + _RECORD.size:pos + _RECORD.size + size]
+        if len(payload) < size or zlib.crc32(payload) != crc:
+            break
+        rng = _apply_record(battle, snapshot._Reader(memoryview(payload)), rng)
+        pos += _RECORD.size + size
+
+    if rng is not None:
+        battle.rng.setstate(rng)
+    return battle
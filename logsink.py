@@ -0,0 +1,73 @@
+import os
+import queue
+import threading
+
+
+class AsyncFileSink:
+    """Запись журнала в файл в фоновом потоке, пакетами, с ротацией по размеру
+
+    submit() только кладет запись в очередь, поэтому ход боя не ждет диска.
+    Записи форматируются в фоновом потоке.
+    """
+
+    def __init__(self, filename, max_bytes=1024 * 1024, backup_count=3, batch_size=256):
+        self.filename = filename
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.batch_size = batch_size
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, record):
+        self._queue.put(record)
+
+    def close(self):
+        """Дописывает оставшиеся записи и останавливает поток"""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _run(self):
+        stream = open(self.filename, 'a', encoding='utf-8')
+        try:
+            running = True
+            while running:
+                batch = [self._queue.get()]
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+
+                if None in batch:
+                    running = False
+                    batch = [record for record in batch if record is not None]
+
+                if batch:
+                    text = "".join(record.format() + "\n" for record in batch)
+                    if stream.tell() and stream.tell() + len(text.encode('utf-8')) > self.max_bytes:
+                        stream.close()
+                        self._rotate()
+                        stream = open(self.filename, 'a', encoding='utf-8')
+                    stream.write(text)
+                    stream.flush()
+        finally:
+            stream.close()
+
+    def _rotate(self):
+        """battle.log -> battle.log.1 -> ... -> battle.log.N"""
+        if self.backup_count <= 0:
+            os.remove(self.filename)
+            return
+        for i in range(self.backup_count - 1, 0, -1):
+            source = f"{self.filename}.{i}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.filename}.{i + 1}")
+        os.replace(self.filename, f"{self.filename}.1")
@@ -1,9 +1,41 @@
 from characters import Warrior, Mage, Healer
 from bosses import Boss
+import roster
+from roster import CHARACTER_CLASSES, create_character, create_boss
 from battle import Battle
+import snapshot
+import journal
+from catalog import SaveCatalog, describe
+from replay import Recorder
+from profiler import profiling, wait_input
+import search
+from hints import HintEngine
+from estimator import estimate
+import argparse
 import random
-import os
 import json
+import os
+import time
+
+
+# Папка сохранений с индексом метаданных
+SAVE_DIR = "saves"
+_catalog = None
+
+# Папка записей повторов (replay.py) и шаг ключевых кадров в раундах
+REPLAY_DIR = "replays"
+KEYFRAME_EVERY = 10
+
+# Босс с поиском хода (search.py): бюджет в мс на ход и процессы пула;
+# задаются параметрами командной строки, None - обычный босс
+SMART_BOSS_MS = None
+SMART_BOSS_WORKERS = 0
+
+# Подсказки на ходу игрока (hints.py); включаются параметром --hints
+HINTS = False
+
+# Файлы автосохранения текущего боя в папке сохранений: <имя>.pbs и <имя>.pbj
+AUTOSAVE_NAME = "autosave"
 
 
 def select_difficulty():
@@ -16,7 +48,7 @@ def select_difficulty():
     print("Выбор уровня сложности влияет на максимальное количество здоровья босса, а также на силу атаки и некоторые другие незначительные характеристики босса и персонажей")
     while True:
         try:
-            choice = int(input("Выберите сложность (1-4): "))
+            choice = int(wait_input("Выберите сложность (1-4): "))
             if 1 <= choice <= 4:
                 difficulties = {
                     1: "easy",
@@ -31,19 +63,15 @@ def select_difficulty():
             print("Пожалуйста, введите число!")
 
 
-def create_party(difficulty):
-    """Создание группы с учетом сложности"""
-    party = []
+def create_party(difficulty, composition=None):
+    """Создание группы с учетом сложности
 
-    # Модификаторы сложности для персонажей
-    difficulty_modifiers = {
-        "easy": {"hp_multiplier": 1.3, "mp_multiplier": 1.2, "stats_multiplier": 1.1},
-        "normal": {"hp_multiplier": 1.0, "mp_multiplier": 1.0, "stats_multiplier": 1.0},
-        "hard": {"hp_multiplier": 0.8, "mp_multiplier": 0.9, "stats_multiplier": 0.9},
-        "hardcore": {"hp_multiplier": 0.7, "mp_multiplier": 0.8, "stats_multiplier": 0.8}
-    }
+    composition - список номеров классов (1-3) для создания группы без ввода
+    """
+    if composition is not None:
+        return roster.create_party(difficulty, composition)
 
-    mod = difficulty_modifiers[difficulty]
+    party = []
 
     print(f"\nСложность: {difficulty.upper()}")
     print("Доступные классы:")
@@ -54,79 +82,52 @@ def create_party(difficulty):
     party_size = 0
     while party_size < 3 or party_size > 4:
         try:
-            party_size = int(input("Выберите размер группы (3-4): "))
+            party_size = int(wait_input("Выберите размер группы (3-4): "))
         except ValueError:
             print("Пожалуйста, введите число!")
 
     for i in range(party_size):
         print(f"\nСоздание персонажа {i + 1}:")
-        name = input("Введите имя персонажа: ")
+        name = wait_input("Введите имя персонажа: ")
 
         while True:
             try:
-                class_choice = int(input("Выберите класс (1-3): "))
-                if class_choice == 1:
-                    character = Warrior(name)
-                    break
-                elif class_choice == 2:
-                    character = Mage(name)
-                    break
-                elif class_choice == 3:
-                    character = Healer(name)
+                class_choice = int(wait_input("Выберите класс (1-3): "))
+                if class_choice in CHARACTER_CLASSES:
+                    character = create_character(class_choice, name, difficulty)
                     break
                 else:
                     print("Неверный выбор класса!")
             except ValueError:
                 print("Пожалуйста, введите число!")
 
-        # Применяем модификаторы сложности
-        character.max_hp = int(character.max_hp * mod["hp_multiplier"])
-        character.hp = character.max_hp
-        character.max_mp = int(character.max_mp * mod["mp_multiplier"])
-        character.mp = character.max_mp
-        character.strength = int(character.strength * mod["stats_multiplier"])
-        character.agility = int(character.agility * mod["stats_multiplier"])
-        character.intelligence = int(character.intelligence * mod["stats_multiplier"])
-
         party.append(character)
         print(f"Создан {character.__class__.__name__}: {character}")
 
     return party
 
 
-def create_boss(difficulty, level=10):
-    """Создание босса с учетом сложности"""
-    # Модификаторы сложности для босса
-    difficulty_modifiers = {
-        "easy": {"hp_multiplier": 0.7, "stats_multiplier": 0.8, "damage_multiplier": 0.8},
-        "normal": {"hp_multiplier": 1.0, "stats_multiplier": 1.0, "damage_multiplier": 1.0},
-        "hard": {"hp_multiplier": 1.3, "stats_multiplier": 1.2, "damage_multiplier": 1.2},
-        "hardcore": {"hp_multiplier": 1.6, "stats_multiplier": 1.4, "damage_multiplier": 1.5}
-    }
+def get_catalog():
+    """Каталог сохранений; создается при первом обращении
 
-    mod = difficulty_modifiers[difficulty]
-    boss = Boss("Древний Великан", level)
-
-    # Применяем модификаторы
-    boss.max_hp = int(boss.max_hp * mod["hp_multiplier"])
-    boss.hp = boss.max_hp
-    boss.max_mp = int(boss.max_mp * mod["stats_multiplier"])
-    boss.mp = boss.max_mp
-    boss.strength = int(boss.strength * mod["stats_multiplier"])
-    boss.agility = int(boss.agility * mod["stats_multiplier"])
-    boss.intelligence = int(boss.intelligence * mod["stats_multiplier"])
-    boss.damage_multiplier = mod["damage_multiplier"]
-
-    return boss
+    Тогда же в него один раз копируются старые JSON-сохранения из рабочей папки.
+    """
+    global _catalog
+    if _catalog is None:
+        _catalog = SaveCatalog(SAVE_DIR)
+        _catalog.import_legacy(".")
+    return _catalog
 
 
 def list_save_files():
-    """Список файлов сохранения"""
-    return [f for f in os.listdir(".") if f.endswith(".json")]
+    """Сохранения из каталога: [(имя файла, метаданные)], без чтения самих файлов"""
+    return get_catalog().entries()
 
 
 def load_save_file(filename):
     """Загрузка сохранения"""
+    if filename.endswith(snapshot.EXTENSION):
+        return load_snapshot_file(filename)
     try:
         if not filename.endswith('.json'):
             filename += '.json'
@@ -171,6 +172,19 @@ def load_save_file(filename):
         return None
 
 
+def load_snapshot_file(filename):
+    """Загрузка двоичного снимка боя"""
+    try:
+        # Снимок автосохранения восстанавливается вместе с журналом
+        battle = journal.recover(filename)
+        print(f"\nЗагружаем: {filename}")
+        print("✓ Игра загружена!")
+        return battle
+    except (OSError, snapshot.SnapshotError) as e:
+        print(f"✗ Ошибка загрузки: {e}")
+        return None
+
+
 def main_menu():
     """Главное меню"""
     print("\n" + "=" * 50)
@@ -181,7 +195,7 @@ def main_menu():
 
     while True:
         try:
-            choice = input("Выберите действие (1-3): ").strip()
+            choice = wait_input("Выберите действие (1-3): ").strip()
             if choice == "1":
                 return new_game()
             elif choice == "2":
@@ -201,20 +215,33 @@ def new_game():
     # Выбор сложности
     difficulty = select_difficulty()
 
-    # Seed
-    seed = input("Введите seed (или Enter для случайного): ").strip()
-    if seed:
-        random.seed(seed)
-        print(f"Seed: {seed}")
+    # Seed: без ввода выбирается случайный, он нужен для записи повтора
+    seed = wait_input("Введите seed (или Enter для случайного): ").strip()
+    if not seed:
+        seed = str(random.SystemRandom().getrandbits(32))
+    print(f"Seed: {seed}")
 
     # Создание группы и босса
     party = create_party(difficulty)
     boss = create_boss(difficulty)
 
     print(f"\nБосс ({difficulty.upper()}): {boss}")
-    input("Нажмите Enter чтобы начать...")
+    print(estimate(party, boss))
+    wait_input("Нажмите Enter чтобы начать...")
+
+    battle = Battle(party, boss, rng=random.Random(seed))
+    battle.difficulty = difficulty
+
+    # Ходы босса с поиском зависят от времени и по записи не повторяются
+    if SMART_BOSS_MS is not None:
+        return battle
 
-    return Battle(party, boss)
+    # Повтор пишется по ходу боя: seed, конфигурация и действия игроков
+    os.makedirs(REPLAY_DIR, exist_ok=True)
+    replay_file = os.path.join(REPLAY_DIR, time.strftime("%Y%m%d-%H%M%S"))
+    battle.recorder = Recorder.for_battle(replay_file, battle, seed, KEYFRAME_EVERY)
+    print(f"Повтор записывается в {battle.recorder.filename}")
+    return battle
 
 
 def load_game_menu():
@@ -227,18 +254,18 @@ def load_game_menu():
         return main_menu()
 
     print("\nСохранения:")
-    for i, filename in enumerate(save_files, 1):
-        print(f"{i}. {filename}")
+    for i, (filename, meta) in enumerate(save_files, 1):
+        print(f"{i}. {describe(filename, meta)}")
     print(f"{len(save_files) + 1}. Назад")
 
     try:
-        choice = int(input("Выберите сохранение: "))
+        choice = int(wait_input("Выберите сохранение: "))
         if choice == len(save_files) + 1:
             return main_menu()
         elif 1 <= choice <= len(save_files):
-            battle = load_save_file(save_files[choice - 1])
+            battle = load_save_file(get_catalog().path(save_files[choice - 1][0]))
             if battle:
-                input("Нажмите Enter чтобы продолжить...")
+                wait_input("Нажмите Enter чтобы продолжить...")
                 return battle
     except (ValueError, IndexError):
         print("Неверный выбор!")
@@ -246,23 +273,52 @@ def load_game_menu():
     return main_menu()
 
 
-def main():
+def main(argv=None):
     """Основная функция"""
+    parser = argparse.ArgumentParser(description="Пати против босса")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="сэмплирующий профилировщик: свернутые стеки записываются в FILE при выходе")
+    parser.add_argument("--smart-boss", type=float, metavar="MS",
+                        help="босс выбирает ход поиском Монте-Карло за MS миллисекунд (без записи повтора)")
+    parser.add_argument("--boss-workers", type=int, default=0, metavar="N",
+                        help="процессы для доигрываний поиска босса")
+    parser.add_argument("--hints", action="store_true",
+                        help="подсказки на ходу игрока: лучшие действия считаются в фоне, пока игрок думает")
+    args = parser.parse_args(argv)
+    global SMART_BOSS_MS, SMART_BOSS_WORKERS, HINTS
+    SMART_BOSS_MS, SMART_BOSS_WORKERS = args.smart_boss, args.boss_workers
+    HINTS = args.hints
+    with profiling(args.profile):
+        play()
+
+
+def play():
+    """Игровой цикл: бои, пока игрок не выберет выход"""
     try:
         while True:
             battle = main_menu()
             if battle:
+                if SMART_BOSS_MS is not None:
+                    search.attach(battle, SMART_BOSS_MS, SMART_BOSS_WORKERS)
+                if HINTS:
+                    battle.hints = HintEngine()
+                catalog = get_catalog()
+                battle.catalog = catalog
+                battle.enable_autosave(catalog.path(AUTOSAVE_NAME))
                 battle.start_battle()
 
             # После боя
             print("\n1. Новая игра")
             print("2. Выход")
-            choice = input("Выберите действие (1-2): ").strip()
+            choice = wait_input("Выберите действие (1-2): ").strip()
             if choice != "1":
                 break
 
     except KeyboardInterrupt:
         print("\nВыход...")
+    finally:
+        # Пулы процессов поиска босса (--boss-workers)
+        search.shutdown()
 
 
 if __name__ == "__main__":
@@ -1,34 +1,82 @@
 import json
+import time
+from collections import deque
 from datetime import datetime
 
 
 class CritMixin:
     """Миксин для критического урона"""
 
+    __slots__ = ()
+
     def calculate_crit(self, base_damage, crit_chance=0.1):
-        import random
-        if random.random() < crit_chance:
+        # Бросок из генератора боя (self.rng), а не из глобального random
+        if self.rng.random() < crit_chance:
             return base_damage * 1.5
         return base_damage
 
 
+class LogRecord:
+    """Запись журнала: монотонное время и аргументы, форматируется при чтении"""
+
+    __slots__ = ('timestamp', 'message', 'args')
+
+    def __init__(self, timestamp, message, args=()):
+        self.timestamp = timestamp
+        self.message = message
+        self.args = args
+
+    def get_message(self):
+        return self.message % self.args if self.args else self.message
+
+    def format(self):
+        timestamp = datetime.fromtimestamp(self.timestamp + CLOCK_OFFSET).strftime("%H:%M:%S")
+        return f"[{timestamp}] {self.get_message()}"
+
+
+# Перевод монотонного времени записей в часы для вывода
+CLOCK_OFFSET = time.time() - time.monotonic()
+
+# Сколько последних записей хранит журнал
+LOG_SIZE = 1000
+
+
 class LoggerMixin:
-    """Миксин для логирования"""
+    """Миксин для логирования
+
+    Хранит последние LOG_SIZE записей в кольцевом буфере. Сообщение можно
+    передать шаблоном с аргументами (add_log("Раунд %s", n)): строка
+    собирается только при чтении журнала, выводе в консоль (log_echo) или
+    записи в log_sink.
+    """
+
+    __slots__ = ()
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.log = []
+        self._log = deque(maxlen=LOG_SIZE)
+        self.log_echo = True
+        self.log_sink = None
 
-    def add_log(self, message):
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        log_entry = f"[{timestamp}] {message}"
-        self.log.append(log_entry)
-        print(log_entry)
+    def add_log(self, message, *args):
+        record = LogRecord(time.monotonic(), message, args)
+        self._log.append(record)
+        if self.log_sink is not None:
+            self.log_sink.submit(record)
+        if self.log_echo:
+            print(record.format())
+
+    @property
+    def log(self):
+        """Отформатированные записи журнала, от старых к новым"""
+        return [record.format() for record in self._log]
 
 
 class SilenceMixin:
     """Миксин для эффекта немоты"""
 
+    __slots__ = ()
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self._silenced = False
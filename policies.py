@@ -0,0 +1,46 @@
+class PlayerPolicy:
+    """Политика управления персонажем в бою без участия игрока"""
+
+    def choose_action(self, battle, player):
+        """Возвращает действие (тип, индекс, цель) из battle.legal_actions(player)"""
+        return ("skip", None, None)
+
+
+class RandomPolicy(PlayerPolicy):
+    """Случайное допустимое действие
+
+    Без своего rng действие выбирается генератором боя (battle.rng).
+    """
+
+    def __init__(self, rng=None):
+        self.rng = rng
+
+    def choose_action(self, battle, player):
+        return (self.rng or battle.rng).choice(battle.legal_actions(player))
+
+
+class GreedyPolicy(PlayerPolicy):
+    """Простые правила: лечить раненых, иначе бить босса сильнейшим навыком"""
+
+    def __init__(self, heal_threshold=0.5):
+        self.heal_threshold = heal_threshold
+
+    def choose_action(self, battle, player):
+        actions = battle.legal_actions(player)
+
+        # Лечение самого раненого союзника
+        heals = [a for a in actions if a[0] == "skill" and battle.is_support_skill(player.skills[a[1]])
+                 and a[2].hp / a[2].max_hp < self.heal_threshold]
+        if heals:
+            return min(heals, key=lambda a: a[2].hp / a[2].max_hp)
+
+        # Атакующий навык по боссу
+        for action in actions:
+            if action[0] == "skill" and action[2] is battle.boss:
+                return action
+
+        for action in actions:
+            if action[0] == "attack":
+                return action
+
+        return ("skip", None, None)
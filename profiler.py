@@ -0,0 +1,156 @@
+"""Сэмплирующий профилировщик для долгих сессий
+
+Поток профилировщика каждые interval секунд снимает стеки всех остальных
+потоков (sys._current_frames) и считает одинаковые стеки. В отличие от
+cProfile код игры не трассируется, поэтому замедление почти не заметно.
+
+Результат - свернутые стеки (collapsed stacks) для flamegraph.pl,
+speedscope и подобных: строка "поток;модуль:функция;... число". Кадр
+подписан модулем (battle, skills, effects, descriptors...), поэтому
+на графе видно, какому модулю принадлежит время; module_totals()
+суммирует сэмплы по модулям.
+
+Ожидание ввода с клавиатуры - не работа игры. input() - встроенная функция
+без своего кадра, поэтому игра читает ввод через wait_input(): поток, у
+которого она есть в стеке, считается простаивающим, как и потоки в
+IDLE_FUNCTIONS.
+"""
+import collections
+import contextlib
+import os
+import sys
+import threading
+
+DEFAULT_INTERVAL = 0.005
+# Потоки, стоящие в этих функциях, ждут, а не работают: их стеки не считаются
+IDLE_FUNCTIONS = frozenset({
+    "threading:Condition.wait",
+    "threading:Event.wait",
+    "threading:Thread.join",
+    "threading:Thread._wait_for_tstate_lock",
+    "queue:Queue.get",
+    # Фоновые записи стоят прямо в цикле, ожидая задание из SimpleQueue
+    "savewriter:BackgroundWriter._run",
+    "logsink:AsyncFileSink._run",
+})
+# Ожидание ввода игрока: стек с этим кадром не считается, где бы он ни стоял
+# (под ним могут быть хуки readline или подмененный в тестах input)
+WAIT_INPUT = "profiler:wait_input"
+
+
+def wait_input(prompt=""):
+    """input(), который профилировщик не считает работой вызывающего кода"""
+    return input(prompt)
+
+
+class SamplingProfiler:
+    """Профилировщик в фоновом потоке: start()/stop() или with"""
+
+    def __init__(self, interval=DEFAULT_INTERVAL, include_idle=False):
+        self.interval = interval
+        self.include_idle = include_idle
+        self.samples = 0
+        self.stacks = collections.Counter()
+        self._labels = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _label(self, frame):
+        code = frame.f_code
+        label = self._labels.get(code)
+        if label is None:
+            module = frame.f_globals.get("__name__", "?")
+            if module == "__main__":
+                module = os.path.splitext(os.path.basename(code.co_filename))[0]
+            name = getattr(code, "co_qualname", code.co_name)
+            label = self._labels[code] = f"{module}:{name}"
+        return label
+
+    def _run(self):
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            if len(names) != len(frames):
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in frames.items():
+                if ident == own:
+                    continue
+                if not self.include_idle and self._label(frame) in IDLE_FUNCTIONS:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(self._label(frame))
+                    frame = frame.f_back
+                if not self.include_idle and WAIT_INPUT in stack:
+                    continue
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self):
+        """Строки свернутых стеков, самые частые первыми"""
+        return [f"{';'.join(stack)} {count}" for stack, count in self.stacks.most_common()]
+
+    def module_totals(self):
+        """{модуль: (собственные сэмплы, сэмплы с модулем в стеке)}, по убыванию собственных"""
+        own = collections.Counter()
+        inclusive = collections.Counter()
+        for stack, count in self.stacks.items():
+            modules = [label.split(":", 1)[0] for label in stack[1:]]
+            if modules:
+                own[modules[-1]] += count
+            for module in set(modules):
+                inclusive[module] += count
+        modules = sorted(inclusive, key=lambda module: (-own[module], -inclusive[module]))
+        return {module: (own[module], inclusive[module]) for module in modules}
+
+    def write(self, filename):
+        with open(filename, 'w', encoding='utf-8') as f:
+            for line in self.collapsed():
+                f.write(line + "\n")
+
+    def format_modules(self, limit=10):
+        total = sum(self.stacks.values()) or 1
+        lines = [f"Сэмплов: {self.samples} (каждые {self.interval * 1000:g} мс)",
+                 f"{'модуль':<28} {'собств.':>8} {'всего':>8}"]
+        for module, (own, inclusive) in list(self.module_totals().items())[:limit]:
+            lines.append(f"{module:<28} {own / total:>8.1%} {inclusive / total:>8.1%}")
+        return "\n".join(lines)
+
+
+@contextlib.contextmanager
+def profiling(filename, interval=DEFAULT_INTERVAL):
+    """Профилирует блок with; в конце стеки пишутся в filename, сводка по модулям - в stderr
+
+    Без filename блок выполняется без профилировщика.
+    """
+    if not filename:
+        yield None
+        return
+    profiler = SamplingProfiler(interval).start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        profiler.write(filename)
+        print(profiler.format_modules(), file=sys.stderr)
+        print(f"Свернутые стеки: {filename}", file=sys.stderr)
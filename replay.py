@@ -0,0 +1,407 @@
+"""Повтор боя: seed, конфигурация и поток действий игроков
+
+Бой детерминирован, если известны начальное состояние и генератор
+случайных чисел (Battle.rng): босс выбирает действия по состоянию боя,
+а случайность (криты) берется только из генератора. Поэтому повтору
+достаточно seed, сложности, состава группы и действий игроков.
+
+Формат (little-endian):
+    заголовок    b"PBRP", версия (u16), затем значения с тегом типа
+                 (как в snapshot.py): seed, сложность, несколько действий
+                 за раунд, группа [[класс 1-3, имя], ...]
+    действие     b"A", ходящий, тип, индекс, цель (по u8; 255 - нет)
+    конец        b"E", раундов (u32), sha256 итогового состояния (32 байта)
+
+Ходящий и цель - номера в списке группа + босс.
+
+Ключевые кадры (<повтор>.pbk) - снимки боя (snapshot.py) в конце каждого
+N-го раунда вместе с номером следующего действия. Переход к раунду R
+загружает ближайший кадр не позже R и проигрывает не больше N раундов,
+поэтому время перехода не зависит от длины боя. Чем реже кадры, тем
+меньше файл и тем дольше переход:
+    заголовок    b"PBKF", версия (u16), шаг кадров (u32)
+    кадр         раунд (u32), номер действия (u32), длина (u32), снимок
+Кадры пишутся только для боев без нескольких действий за раунд: очередь
+SpeedTurnOrder не входит в снимок.
+"""
+import argparse
+import bisect
+import hashlib
+import random
+import struct
+import time
+
+import snapshot
+from policies import PlayerPolicy
+from profiler import profiling
+
+MAGIC = b"PBRP"
+VERSION = 1
+EXTENSION = ".pbr"
+
+_HEADER = struct.Struct("<4sH")
+_ACTION = struct.Struct("<BBBB")
+_END = struct.Struct("<I32s")
+_KEYFRAME_HEADER = struct.Struct("<4sHI")
+_KEYFRAME = struct.Struct("<III")
+KEYFRAME_MAGIC = b"PBKF"
+KEYFRAME_EXTENSION = ".pbk"
+NONE = 255
+
+ACTION_TYPES = ("attack", "skill", "item", "skip")
+ACTION_CODES = {name: code for code, name in enumerate(ACTION_TYPES)}
+
+
+class ReplayError(Exception):
+    """Повтор поврежден или разошелся с записью"""
+
+
+class ReplayExhausted(ReplayError):
+    """Записанные действия закончились раньше боя"""
+
+
+def state_hash(battle):
+    """Хеш полного состояния боя для сверки повтора"""
+    return hashlib.sha256(snapshot.dumps(battle)).digest()
+
+
+def keyframe_file(filename):
+    """Файл ключевых кадров рядом с повтором"""
+    if filename.endswith(EXTENSION):
+        filename = filename[:-len(EXTENSION)]
+    return filename + KEYFRAME_EXTENSION
+
+
+def class_code(character):
+    from roster import CHARACTER_CLASSES
+    for code, cls in CHARACTER_CLASSES.items():
+        if type(character) is cls:
+            return code
+    raise ReplayError(f"Класс {type(character).__name__} нельзя записать в повтор")
+
+
+class Recorder:
+    """Запись повтора по мере боя: Battle.perform_action передает каждое действие"""
+
+    def __init__(self, filename, seed, difficulty, party, multiple_actions=False, keyframe_every=None):
+        if not filename.endswith(EXTENSION):
+            filename += EXTENSION
+        self.filename = filename
+        self.keyframes = None
+        if keyframe_every and not multiple_actions:
+            self.keyframes = KeyframeWriter(keyframe_file(filename), keyframe_every)
+        header = bytearray(_HEADER.pack(MAGIC, VERSION))
+        snapshot._pack_value(header, seed)
+        snapshot._pack_value(header, difficulty)
+        snapshot._pack_value(header, multiple_actions)
+        snapshot._pack_value(header, [[class_code(char), char.name] for char in party])
+        self._file = open(filename, 'wb')
+        self._write(header)
+
+    @classmethod
+    def for_battle(cls, filename, battle, seed, keyframe_every=None):
+        return cls(filename, seed, battle.difficulty, battle.party, battle.multiple_actions, keyframe_every)
+
+    def _write(self, data):
+        # Сброс после каждого действия: при сбое игры теряется не больше одного хода
+        self._file.write(data)
+        self._file.flush()
+
+    def record(self, battle, player, action):
+        action_type, index, target = action
+        participants = battle.party + [battle.boss]
+        self._write(b"A" + _ACTION.pack(
+            participants.index(player),
+            ACTION_CODES[action_type],
+            NONE if index is None else index,
+            NONE if target is None else participants.index(target),
+        ))
+        if self.keyframes is not None:
+            self.keyframes.record(battle, player, action)
+
+    def end_round(self, battle):
+        if self.keyframes is not None:
+            self.keyframes.end_round(battle)
+
+    def finish(self, battle):
+        if self.keyframes is not None:
+            self.keyframes.finish(battle)
+        if self._file is None:
+            return
+        self._write(b"E" + _END.pack(battle.round, state_hash(battle)))
+        self._file.close()
+        self._file = None
+
+
+class KeyframeWriter:
+    """Ключевые кадры повтора: снимок боя в конце каждого every-го раунда
+
+    Подключается к бою как Battle.recorder (сам или через Recorder) и только
+    считает действия, поэтому кадры можно построить и для готового повтора.
+    """
+
+    def __init__(self, filename, every):
+        self.filename = filename
+        self.every = every
+        self.actions = 0
+        self._file = open(filename, 'wb')
+        self._file.write(_KEYFRAME_HEADER.pack(KEYFRAME_MAGIC, VERSION, every))
+
+    def record(self, battle, player, action):
+        self.actions += 1
+
+    def end_round(self, battle):
+        if self._file is not None and battle.round % self.every == 0:
+            data = snapshot.dumps(battle)
+            self._file.write(_KEYFRAME.pack(battle.round, self.actions, len(data)) + data)
+            self._file.flush()
+
+    def finish(self, battle):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class Keyframes:
+    """Указатель ключевых кадров: раунд, номер действия и смещение снимка в файле"""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.rounds = []
+        self.positions = []
+        self.offsets = []
+        with open(filename, 'rb') as f:
+            end = f.seek(0, 2)
+            f.seek(0)
+            header = f.read(_KEYFRAME_HEADER.size)
+            if len(header) < _KEYFRAME_HEADER.size:
+                raise ReplayError("Файл ключевых кадров поврежден")
+            magic, version, self.every = _KEYFRAME_HEADER.unpack(header)
+            if magic != KEYFRAME_MAGIC or version != VERSION:
+                raise ReplayError("Это не файл ключевых кадров или версия не поддерживается")
+            # Читаются только заголовки кадров, снимки пропускаются;
+            # оборванный последний кадр отбрасывается
+            while True:
+                frame = f.read(_KEYFRAME.size)
+                if len(frame) < _KEYFRAME.size:
+                    break
+                round_number, position, size = _KEYFRAME.unpack(frame)
+                offset = f.tell()
+                if offset + size > end:
+                    break
+                f.seek(offset + size)
+                self.rounds.append(round_number)
+                self.positions.append(position)
+                self.offsets.append((offset, size))
+
+    def __len__(self):
+        return len(self.rounds)
+
+    def nearest(self, round_number):
+        """Номер последнего кадра не позже round_number или None"""
+        i = bisect.bisect_right(self.rounds, round_number) - 1
+        return i if i >= 0 else None
+
+    def load(self, i, battle_class):
+        offset, size = self.offsets[i]
+        with open(self.filename, 'rb') as f:
+            f.seek(offset)
+            return snapshot.loads(f.read(size), battle_class)
+
+
+class Replay:
+    """Прочитанный повтор"""
+
+    def __init__(self, seed, difficulty, multiple_actions, party, actions, rounds=None, final_hash=None,
+                 filename=None):
+        self.filename = filename
+        self.seed = seed
+        self.difficulty = difficulty
+        self.multiple_actions = multiple_actions
+        self.party = party
+        # Действия: (ходящий, тип, индекс, цель) с номерами участников
+        self.actions = actions
+        self.rounds = rounds
+        self.final_hash = final_hash
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename, 'rb') as f:
+            data = f.read()
+        reader = snapshot._Reader(memoryview(data))
+        try:
+            magic, version = reader.unpack(_HEADER)
+            if magic != MAGIC or version != VERSION:
+                raise ReplayError("Это не повтор боя или версия не поддерживается")
+            seed = reader.value()
+            difficulty = reader.value()
+            multiple_actions = reader.value()
+            party = reader.value()
+        except (struct.error, IndexError, snapshot.SnapshotError) as e:
+            raise ReplayError(f"Повтор поврежден: {e}")
+
+        actions = []
+        rounds = final_hash = None
+        try:
+            while reader.pos < len(data):
+                tag = data[reader.pos:reader.pos + 1]
+                reader.pos += 1
+                if tag == b"A":
+                    actor, code, index, target = reader.unpack(_ACTION)
+                    actions.append((actor, ACTION_TYPES[code],
+                                    None if index == NONE else index,
+                                    None if target == NONE else target))
+                elif tag == b"E":
+                    rounds, final_hash = reader.unpack(_END)
+                    break
+                else:
+                    raise ReplayError(f"Неизвестная запись {tag!r}")
+        except struct.error:
+            # Оборванный хвост (игра прервана): повтор без итогового хеша
+            pass
+        return cls(seed, difficulty, multiple_actions, party, actions, rounds, final_hash, filename)
+
+    def create_battle(self, battle_class=None, **kwargs):
+        """Начальное состояние боя: группа и босс по конфигурации, генератор по seed"""
+        from battle import HeadlessBattle
+        from roster import create_character, create_boss
+        battle_class = battle_class or HeadlessBattle
+        party = [create_character(code, name, self.difficulty) for code, name in self.party]
+        boss = create_boss(self.difficulty)
+        battle = battle_class(party, boss, multiple_actions=self.multiple_actions,
+                              rng=random.Random(self.seed), **kwargs)
+        battle.difficulty = self.difficulty
+        return battle
+
+
+class ReplayPolicy(PlayerPolicy):
+    """Действия игроков из записи повтора по порядку"""
+
+    def __init__(self, actions, start=0):
+        self.actions = actions
+        self.position = start
+
+    def choose_action(self, battle, player):
+        participants = battle.party + [battle.boss]
+        if self.position >= len(self.actions):
+            raise ReplayExhausted(f"Действия закончились на раунде {battle.round}")
+        actor, action_type, index, target = self.actions[self.position]
+        if participants[actor] is not player:
+            raise ReplayError(f"Повтор разошелся на действии {self.position}: "
+                              f"ходит {player.name}, записан {participants[actor].name}")
+        self.position += 1
+        return action_type, index, None if target is None else participants[target]
+
+
+class ReplayResult:
+    def __init__(self, battle, expected_hash, actual_hash):
+        self.battle = battle
+        self.expected_hash = expected_hash
+        self.actual_hash = actual_hash
+
+    @property
+    def matches(self):
+        return self.expected_hash is None or self.expected_hash == self.actual_hash
+
+
+def run(replay):
+    """Проведение записанного боя без вывода, с максимальной скоростью"""
+    policy = ReplayPolicy(replay.actions)
+    max_rounds = replay.rounds if replay.rounds is not None else 10 ** 9
+    battle = replay.create_battle(policies=policy, max_rounds=max_rounds)
+    try:
+        battle.run()
+    except ReplayExhausted:
+        # Незавершенная запись проигрывается до последнего записанного действия
+        if replay.final_hash is not None:
+            raise
+    return ReplayResult(battle, replay.final_hash, state_hash(battle))
+
+
+def seek(replay, round_number, keyframes=None):
+    """Бой в конце раунда round_number: от ближайшего ключевого кадра или с начала"""
+    from functools import partial
+    from battle import HeadlessBattle
+    if keyframes is None and replay.filename is not None:
+        try:
+            keyframes = Keyframes(keyframe_file(replay.filename))
+        except FileNotFoundError:
+            keyframes = None
+
+    frame = keyframes.nearest(round_number) if keyframes else None
+    if frame is None:
+        policy = ReplayPolicy(replay.actions)
+        battle = replay.create_battle(policies=policy, max_rounds=round_number)
+    else:
+        policy = ReplayPolicy(replay.actions, keyframes.positions[frame])
+        battle = keyframes.load(frame, partial(HeadlessBattle, policies=policy, max_rounds=round_number))
+
+    if battle.is_active:
+        try:
+            battle.run()
+        except ReplayExhausted:
+            pass
+        # Остановка на нужном раунде - не конец боя
+        battle.is_active = battle.winner is None
+    return battle
+
+
+def build_keyframes(replay, every):
+    """Ключевые кадры для готового повтора: бой проигрывается один раз"""
+    writer = KeyframeWriter(keyframe_file(replay.filename), every)
+    policy = ReplayPolicy(replay.actions)
+    battle = replay.create_battle(policies=policy, max_rounds=replay.rounds or 10 ** 9)
+    battle.recorder = writer
+    try:
+        battle.run()
+    except ReplayExhausted:
+        pass
+    writer.finish(battle)
+    return writer.filename
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Повтор записанного боя с проверкой итогового состояния")
+    parser.add_argument("replay", help="файл повтора (.pbr)")
+    parser.add_argument("--keyframes", type=int, metavar="N",
+                        help="построить ключевые кадры каждые N раундов")
+    parser.add_argument("--seek", type=int, metavar="ROUND",
+                        help="показать состояние боя в конце раунда")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="сэмплирующий профилировщик: свернутые стеки записываются в FILE")
+    args = parser.parse_args(argv)
+    with profiling(args.profile):
+        _run_cli(args)
+
+
+def _run_cli(args):
+
+    replay = Replay.load(args.replay)
+    if args.keyframes:
+        print(f"Ключевые кадры: {build_keyframes(replay, args.keyframes)}")
+    if args.seek is not None:
+        start = time.perf_counter()
+        battle = seek(replay, args.seek)
+        elapsed = time.perf_counter() - start
+        print(f"Раунд {battle.round} ({elapsed * 1000:.1f} мс):")
+        for participant in battle.party + [battle.boss]:
+            print(f"  {participant}")
+        return
+    start = time.perf_counter()
+    result = run(replay)
+    elapsed = time.perf_counter() - start
+
+    battle = result.battle
+    print(f"Сложность: {replay.difficulty}, seed: {replay.seed}, действий: {len(replay.actions)}")
+    print(f"Раундов: {battle.round}, победитель: {battle.winner or 'нет'}, время: {elapsed * 1000:.1f} мс")
+    if replay.final_hash is None:
+        print("Запись не завершена: итоговый хеш не проверялся")
+    elif result.matches:
+        print("✓ Итоговое состояние совпадает с записью")
+    else:
+        print("✗ Итоговое состояние отличается от записи")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Создание группы и босса по уровню сложности без ввода с клавиатуры
+
+Модуль легкий: его импортируют рабочие процессы симуляций, поэтому он не
+тянет за собой меню, подсказки, поиск и сохранения из main.py.
+"""
+from characters import Warrior, Mage, Healer
+from bosses import Boss
+
+# Модификаторы сложности для персонажей
+PARTY_DIFFICULTY_MODIFIERS = {
+    "easy": {"hp_multiplier": 1.3, "mp_multiplier": 1.2, "stats_multiplier": 1.1},
+    "normal": {"hp_multiplier": 1.0, "mp_multiplier": 1.0, "stats_multiplier": 1.0},
+    "hard": {"hp_multiplier": 0.8, "mp_multiplier": 0.9, "stats_multiplier": 0.9},
+    "hardcore": {"hp_multiplier": 0.7, "mp_multiplier": 0.8, "stats_multiplier": 0.8}
+}
+
+# Модификаторы сложности для босса
+BOSS_DIFFICULTY_MODIFIERS = {
+    "easy": {"hp_multiplier": 0.7, "stats_multiplier": 0.8, "damage_multiplier": 0.8},
+    "normal": {"hp_multiplier": 1.0, "stats_multiplier": 1.0, "damage_multiplier": 1.0},
+    "hard": {"hp_multiplier": 1.3, "stats_multiplier": 1.2, "damage_multiplier": 1.2},
+    "hardcore": {"hp_multiplier": 1.6, "stats_multiplier": 1.4, "damage_multiplier": 1.5}
+}
+
+CHARACTER_CLASSES = {1: Warrior, 2: Mage, 3: Healer}
+
+
+def create_character(class_choice, name, difficulty):
+    """Создание персонажа выбранного класса (1-3) с учетом сложности"""
+    mod = PARTY_DIFFICULTY_MODIFIERS[difficulty]
+    character = CHARACTER_CLASSES[class_choice](name)
+
+    # Применяем модификаторы сложности
+    character.max_hp = int(character.max_hp * mod["hp_multiplier"])
+    character.hp = character.max_hp
+    character.max_mp = int(character.max_mp * mod["mp_multiplier"])
+    character.mp = character.max_mp
+    character.strength = int(character.strength * mod["stats_multiplier"])
+    character.agility = int(character.agility * mod["stats_multiplier"])
+    character.intelligence = int(character.intelligence * mod["stats_multiplier"])
+
+    return character
+
+
+def create_party(difficulty, composition):
+    """Группа по списку номеров классов (1-3) с учетом сложности"""
+    return [create_character(class_choice, f"{CHARACTER_CLASSES[class_choice].__name__} {i + 1}", difficulty)
+            for i, class_choice in enumerate(composition)]
+
+
+def create_boss(difficulty, level=10):
+    """Создание босса с учетом сложности"""
+    mod = BOSS_DIFFICULTY_MODIFIERS[difficulty]
+    boss = Boss("Древний Великан", level)
+
+    # Применяем модификаторы
+    boss.max_hp = int(boss.max_hp * mod["hp_multiplier"])
+    boss.hp = boss.max_hp
+    boss.max_mp = int(boss.max_mp * mod["stats_multiplier"])
+    boss.mp = boss.max_mp
+    boss.strength = int(boss.strength * mod["stats_multiplier"])
+    boss.agility = int(boss.agility * mod["stats_multiplier"])
+    boss.intelligence = int(boss.intelligence * mod["stats_multiplier"])
+    boss.damage_multiplier = mod["damage_multiplier"]
+
+    return boss
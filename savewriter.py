@@ -0,0 +1,58 @@
+import queue
+import threading
+
+
+class BackgroundWriter:
+    """Сохранения в фоновом потоке, по одному заданию в порядке поступления
+
+    submit() только кладет задание в очередь, поэтому ход боя не ждет диска.
+    Задания получают неизменяемые снимки состояния (snapshot.freeze), так что
+    запись, которая еще идет, не видит последующих изменений боя. Ошибки
+    заданий не останавливают поток и забираются через pop_errors().
+    """
+
+    def __init__(self):
+        self._queue = queue.SimpleQueue()
+        self._errors = []
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="save-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, job, *args):
+        self._queue.put((job, args))
+
+    def flush(self):
+        """Ждет завершения всех заданий, поставленных до вызова"""
+        if self._thread.is_alive():
+            done = threading.Event()
+            self._queue.put((done.set, ()))
+            done.wait()
+
+    def close(self):
+        """Выполняет оставшиеся задания и останавливает поток"""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def pop_errors(self):
+        with self._lock:
+            errors, self._errors = self._errors, []
+        return errors
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _run(self):
+        while True:
+            task = self._queue.get()
+            if task is None:
+                break
+            job, args = task
+            try:
+                job(*args)
+            except Exception as e:
+                with self._lock:
+                    self._errors.append(e)
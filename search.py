@@ -0,0 +1,269 @@
+"""Поиск хода босса методом Монте-Карло (MCTS) с бюджетом времени на ход
+
+Корень дерева - ход босса, его дети - допустимые действия: атака каждой
+живой цели, массовая атака и яд на каждую цель. Действие выбирается по
+UCB1, затем бой доигрывается без участия игрока: остаток раунда, затем
+до horizon раундов, где группой управляет политика (GreedyPolicy), а
+босс - обычные стратегии фаз. Ценность доигрывания для босса: от 0.8 до 1
+за победу (чем быстрее, тем больше), иначе (доля потерянного группой HP +
+доля оставшегося HP босса) / 2.
+
+Доигрывания идут до истечения budget_ms. С workers > 0 часть из них
+выполняет пул процессов: каждый процесс получает снимок боя
+(snapshot.dumps), ведет свою статистику UCB1 до того же срока, и итоги
+складываются (параллелизм по корню). Выбирается действие с наибольшим
+числом доигрываний. Пулы общие для всех боев; shutdown() останавливает их
+при выходе из игры.
+
+Решения зависят от времени, поэтому бой с таким боссом не повторяется по
+seed; для воспроизводимых решений задайте budget_ms=None, iterations и
+seed без workers.
+"""
+import functools
+import math
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+
+import snapshot
+from battle import HeadlessBattle
+from bosses import BossStrategy
+from policies import GreedyPolicy
+
+# Раундов доигрывания после текущего
+HORIZON = 20
+# Насколько победа в конце горизонта ценится меньше победы сразу
+SLOW_WIN_PENALTY = 0.2
+# Коэффициент исследования UCB1
+EXPLORATION = math.sqrt(2)
+# Запас времени на возврат результатов из процессов пула
+IPC_MARGIN = 0.002
+
+
+def boss_actions(boss, party):
+    """Допустимые действия босса: (тип, индекс цели в группе или None для массовой атаки)"""
+    alive = [i for i, member in enumerate(party) if member.is_alive]
+    actions = [("attack", i) for i in alive]
+    if len(alive) >= 2 and boss.mp >= 40:
+        actions.append(("aoe", None))
+    if boss.mp >= 25:
+        actions.extend(("poison", i) for i in alive)
+    return actions
+
+
+def resolve(action, party):
+    """Действие в виде (тип, цель), как его возвращает BossStrategy.choose_action"""
+    action_type, index = action
+    if action_type == "aoe":
+        return "aoe", [member for member in party if member.is_alive]
+    return action_type, party[index]
+
+
+def perform(boss, party, action):
+    action_type, target = resolve(action, party)
+    if action_type == "aoe":
+        boss.aoe_attack(target)
+    elif action_type == "poison":
+        boss.poison_attack(target)
+    else:
+        boss.basic_attack(target)
+
+
+def finish_round(battle, actor_index):
+    """Ходы участников после хода участника actor_index (босс - последний) и конец раунда
+
+    Порядок ходов - тот же, что в бою (battle.create_turn_order(), в том числе
+    с несколькими действиями за раунд), с позиции battle.turn_position, на
+    которой стоял раунд перед этим ходом.
+    """
+    actor = (battle.party + [battle.boss])[actor_index]
+    turn_order = battle.create_turn_order()
+    if battle.turn_position is not None:
+        turn_order.seek(battle.round, battle.turn_position)
+    battle.check_battle_end()
+    for participant in turn_order:
+        if participant is actor:
+            battle.finish_round(turn_order)
+            return
+    # Участника нет среди оставшихся ходов раунда
+    battle.update_all_effects()
+    battle.turn_position = None
+
+
+def outcome_value(battle, start_round):
+    """Ценность исхода доигрывания для босса, от 0 до 1; быстрая победа ценнее"""
+    if battle.winner == "boss":
+        return 1.0 - SLOW_WIN_PENALTY * (battle.round - start_round) / (battle.max_rounds - start_round + 1)
+    party_hp = sum(member.hp for member in battle.party) / sum(member.max_hp for member in battle.party)
+    return (1 - party_hp + battle.boss.hp / battle.boss.max_hp) / 2
+
+
+def party_value(battle, start_round):
+    """Ценность исхода для группы: 1 за победу, 0 за поражение, иначе 1 - outcome_value"""
+    if battle.winner == "party":
+        return 1.0
+    return 1.0 - outcome_value(battle, start_round)
+
+
+def rollout(root, action, seed, horizon=HORIZON):
+    """Ценность действия босса в одном доигрывании от корня root (HeadlessBattle)"""
+    battle = root.clone()
+    battle.rng.seed(seed)
+    battle.max_rounds = battle.round + horizon
+    perform(battle.boss, battle.party, action)
+    finish_round(battle, len(battle.party))
+    if battle.is_active:
+        battle.run()
+    return outcome_value(battle, root.round)
+
+
+def ucb_choice(stats, total):
+    """Индекс действия с наибольшей оценкой UCB1; stats - [доигрываний, сумма ценностей]"""
+    log_total = math.log(total)
+    return max(range(len(stats)), key=lambda i: stats[i][1] / stats[i][0]
+               + EXPLORATION * math.sqrt(log_total / stats[i][0]))
+
+
+def search(root, actions, deadline, rng, horizon=HORIZON, iterations=None):
+    """UCB1 по действиям до срока deadline (time.monotonic) или iterations доигрываний
+
+    Возвращает [(число доигрываний, сумма ценностей)] по действиям.
+    """
+    stats = [[0, 0.0] for _ in actions]
+    total = 0
+    while (iterations is None or total < iterations) and (total < len(actions) or time.monotonic() < deadline):
+        choice = total if total < len(actions) else ucb_choice(stats, total)
+        value = rollout(root, actions[choice], rng.getrandbits(64), horizon)
+        stats[choice][0] += 1
+        stats[choice][1] += value
+        total += 1
+    return stats
+
+
+def rules_of(boss):
+    """Обычные стратегии фаз босса, даже если он уже ходит поиском"""
+    return {phase: getattr(strategy, "base", strategy) for phase, strategy in boss.strategies.items()}
+
+
+def use_strategies(boss, strategies):
+    """Заменяет стратегии фаз босса, сохраняя текущую фазу"""
+    phase = next(phase for phase, strategy in boss.strategies.items() if strategy is boss.current_strategy)
+    boss.strategies = strategies
+    boss.current_strategy = strategies[phase]
+
+
+def _search_snapshot(data, turn_position, actions, deadline, seed, horizon, iterations=None):
+    """Поиск в процессе пула по снимку боя
+
+    Снимок не хранит позицию внутри раунда, поэтому она передается отдельно.
+    """
+    root = snapshot.loads(data, functools.partial(HeadlessBattle, policies=GreedyPolicy()))
+    root.turn_position = turn_position
+    return search(root, actions, deadline, random.Random(seed), horizon, iterations)
+
+
+def _warm_up():
+    return None
+
+
+# Пулы процессов по числу процессов, общие для всех боев
+_pools = {}
+
+
+def get_pool(workers):
+    """Пул из workers процессов; процессы запускаются сразу, а не на первом ходу босса"""
+    pool = _pools.get(workers)
+    if pool is None:
+        pool = _pools[workers] = ProcessPoolExecutor(max_workers=workers)
+        wait([pool.submit(_warm_up) for _ in range(workers)])
+    return pool
+
+
+def shutdown():
+    """Останавливает пулы процессов поиска"""
+    while _pools:
+        _, pool = _pools.popitem()
+        pool.shutdown(cancel_futures=True)
+
+
+class BossSearch:
+    """Поиск хода босса для одного боя; создается attach()"""
+
+    def __init__(self, battle, rules, budget_ms=50, workers=0, horizon=HORIZON, iterations=None, seed=None):
+        self.battle = battle
+        # Обычные стратегии фаз: ими босс ходит в доигрываниях
+        self.rules = rules
+        self.budget_ms = budget_ms
+        self.workers = workers
+        self.horizon = horizon
+        self.iterations = iterations
+        self.rng = random.Random(seed)
+        # Статистика последнего хода: [(действие, [доигрываний, сумма ценностей])]
+        self.last_stats = None
+        self._pool = get_pool(workers) if workers else None
+
+    def _root(self):
+        root = HeadlessBattle.from_battle(self.battle, GreedyPolicy())
+        use_strategies(root.boss, self.rules)
+        return root
+
+    def choose(self, party):
+        """Лучшее действие босса (тип, цель) в текущем состоянии боя"""
+        boss = self.battle.boss
+        actions = boss_actions(boss, party)
+        if not actions:
+            return ("attack", None)
+        if len(actions) == 1:
+            return resolve(actions[0], party)
+
+        if self.budget_ms is None:
+            deadline = math.inf
+        else:
+            deadline = time.monotonic() + self.budget_ms / 1000
+        futures = []
+        if self._pool is not None:
+            data = snapshot.dumps(self.battle)
+            futures = [self._pool.submit(_search_snapshot, data, self.battle.turn_position, actions,
+                                         deadline - IPC_MARGIN, self.rng.getrandbits(64), self.horizon,
+                                         self.iterations)
+                       for _ in range(self.workers)]
+        stats = search(self._root(), actions, deadline, self.rng, self.horizon, self.iterations)
+        if futures:
+            timeout = None if deadline == math.inf else max(0.0, deadline - time.monotonic()) + IPC_MARGIN
+            done, _ = wait(futures, timeout=timeout)
+            for future in done:
+                if future.exception() is None:
+                    for total, (visits, value) in zip(stats, future.result()):
+                        total[0] += visits
+                        total[1] += value
+
+        self.last_stats = list(zip(actions, stats))
+        best = max(range(len(actions)), key=lambda i: (stats[i][0], stats[i][1]))
+        return resolve(actions[best], party)
+
+
+class SearchStrategy(BossStrategy):
+    """Стратегия фазы, которая выбирает ход поиском (BossSearch)"""
+
+    __slots__ = ('base', 'search')
+
+    def __init__(self, boss, base, search):
+        super().__init__(boss)
+        self.base = base
+        self.search = search
+
+    @property
+    def title(self):
+        return f"{self.base.title} + поиск"
+
+    def choose_action(self, targets):
+        return self.search.choose(targets)
+
+
+def attach(battle, budget_ms=50, workers=0, **kwargs):
+    """Босс боя battle выбирает ходы поиском; возвращает BossSearch"""
+    boss = battle.boss
+    rules = rules_of(boss)
+    engine = BossSearch(battle, rules, budget_ms, workers, **kwargs)
+    use_strategies(boss, {phase: SearchStrategy(boss, base, engine) for phase, base in rules.items()})
+    return engine
@@ -0,0 +1,230 @@
+"""Оценка вероятности победы методом Монте-Карло по уровням сложности"""
+import argparse
+import math
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import instrument
+import streams
+from profiler import profiling
+from battle import HeadlessBattle
+from roster import create_party, create_boss
+from policies import GreedyPolicy, RandomPolicy
+
+DIFFICULTIES = ["easy", "normal", "hard", "hardcore"]
+
+CLASS_CODES = {"w": 1, "m": 2, "h": 3}
+
+POLICIES = {
+    "greedy": GreedyPolicy,
+    "random": RandomPolicy,
+}
+
+# z-значения для двусторонних доверительных интервалов
+Z_VALUES = {0.9: 1.645, 0.95: 1.96, 0.99: 2.576}
+
+
+def parse_composition(text):
+    """'wmh' -> [1, 2, 3] (w - воин, m - маг, h - лекарь)"""
+    try:
+        composition = [CLASS_CODES[code] for code in text.lower()]
+    except KeyError:
+        raise ValueError(f"Неизвестный класс в составе группы: {text}")
+    if not 3 <= len(composition) <= 4:
+        raise ValueError("Размер группы должен быть 3-4")
+    return composition
+
+
+def run_battle(difficulty, composition, seed, policy="greedy", max_rounds=200, buffered=False):
+    """Один воспроизводимый бой со своим потоком случайных чисел, возвращает BattleResult"""
+    party = create_party(difficulty, composition)
+    boss = create_boss(difficulty)
+    rng = streams.new_stream(seed, buffered)
+    return HeadlessBattle(party, boss, POLICIES[policy](), max_rounds, rng=rng).run()
+
+
+def run_batch(difficulty, composition, seeds, policy="greedy", max_rounds=200, buffered=False,
+              instrumented=False):
+    """Серия боев в рабочем процессе: (победы, сумма раундов, сумма квадратов, число боев)
+
+    С instrumented к результату добавляются метрики пакета (instrument.Metrics.state()).
+    """
+    if instrumented:
+        metrics = instrument.enable()
+        metrics.reset()
+    wins = rounds_sum = rounds_sq = 0
+    for seed in seeds:
+        result = run_battle(difficulty, composition, seed, policy, max_rounds, buffered)
+        wins += result.party_won
+        rounds_sum += result.rounds
+        rounds_sq += result.rounds * result.rounds
+    if instrumented:
+        return wins, rounds_sum, rounds_sq, len(seeds), metrics.state()
+    return wins, rounds_sum, rounds_sq, len(seeds)
+
+
+def wilson_interval(wins, n, z=1.96):
+    """Доверительный интервал Уилсона для доли побед"""
+    if n == 0:
+        return 0.0, 1.0
+    p = wins / n
+    denominator = 1 + z * z / n
+    center = (p + z * z / (2 * n)) / denominator
+    half = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denominator
+    return max(0.0, center - half), min(1.0, center + half)
+
+
+class SimulationStats:
+    """Накопленная статистика серии боев"""
+
+    def __init__(self, difficulty, composition, z=1.96):
+        self.difficulty = difficulty
+        self.composition = composition
+        self.z = z
+        self.wins = 0
+        self.rounds_sum = 0
+        self.rounds_sq = 0
+        self.battles = 0
+        # Метрики горячих путей (instrument.Metrics), если серия инструментирована
+        self.metrics = None
+
+    def add(self, batch):
+        wins, rounds_sum, rounds_sq, count = batch[:4]
+        if len(batch) > 4:
+            if self.metrics is None:
+                self.metrics = instrument.Metrics()
+            self.metrics.merge(batch[4])
+        self.wins += wins
+        self.rounds_sum += rounds_sum
+        self.rounds_sq += rounds_sq
+        self.battles += count
+
+    @property
+    def win_rate(self):
+        return self.wins / self.battles if self.battles else 0.0
+
+    @property
+    def win_interval(self):
+        return wilson_interval(self.wins, self.battles, self.z)
+
+    @property
+    def mean_rounds(self):
+        return self.rounds_sum / self.battles if self.battles else 0.0
+
+    @property
+    def rounds_interval(self):
+        if self.battles < 2:
+            return 0.0, float("inf")
+        mean = self.mean_rounds
+        variance = max(0.0, (self.rounds_sq - self.battles * mean * mean) / (self.battles - 1))
+        half = self.z * math.sqrt(variance / self.battles)
+        return mean - half, mean + half
+
+    def is_precise(self, precision):
+        """Половина ширины интервала доли побед не больше precision"""
+        low, high = self.win_interval
+        return (high - low) / 2 <= precision
+
+    def __str__(self):
+        low, high = self.win_interval
+        r_low, r_high = self.rounds_interval
+        party = "".join(code for class_choice in self.composition
+                        for code, value in CLASS_CODES.items() if value == class_choice)
+        return (f"{self.difficulty:<9} {party:<5} боев: {self.battles:>6}  "
+                f"победы: {self.win_rate:6.1%} [{low:.1%}; {high:.1%}]  "
+                f"раунды: {self.mean_rounds:6.2f} [{r_low:.2f}; {r_high:.2f}]")
+
+
+def simulate(executor, difficulty, composition, battles, seed=0, policy="greedy",
+             batch_size=200, precision=None, min_battles=1000, z=1.96, max_rounds=200, buffered=False,
+             instrumented=False, workers=None):
+    """Серия из battles боев в пуле процессов с ранней остановкой по точности
+
+    workers - число процессов пула executor: в очереди держится по два пакета
+    на процесс (по умолчанию os.cpu_count()).
+
+    Seed боя выводится из seed серии и номера боя (streams.spawn_seeds),
+    поэтому потоки боев независимы и не зависят от разбиения на пакеты.
+    """
+    stats = SimulationStats(difficulty, composition, z)
+    workers = workers or os.cpu_count() or 1
+    pending = deque()
+    next_seed = seed
+
+    def submit():
+        nonlocal next_seed
+        count = min(batch_size, seed + battles - next_seed)
+        seeds = streams.spawn_seeds(seed, count, start=next_seed - seed)
+        next_seed += count
+        pending.append(executor.submit(run_batch, difficulty, composition, seeds, policy, max_rounds,
+                                       buffered, instrumented))
+
+    while next_seed < seed + battles and len(pending) < workers * 2:
+        submit()
+
+    # Результаты учитываются в порядке seed, поэтому итог не зависит от планировщика
+    while pending:
+        stats.add(pending.popleft().result())
+        if precision is not None and stats.battles >= min_battles and stats.is_precise(precision):
+            for future in pending:
+                future.cancel()
+            break
+        if next_seed < seed + battles:
+            submit()
+
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Монте-Карло оценка вероятности победы группы")
+    parser.add_argument("-n", "--battles", type=int, default=10000, help="максимум боев на конфигурацию")
+    parser.add_argument("-d", "--difficulty", action="append", choices=DIFFICULTIES,
+                        help="уровень сложности (по умолчанию все)")
+    parser.add_argument("-p", "--party", action="append",
+                        help="состав группы: w - воин, m - маг, h - лекарь (по умолчанию wmh)")
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="greedy")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--precision", type=float, default=0.01,
+                        help="остановиться, когда половина интервала доли побед меньше этого значения")
+    parser.add_argument("--confidence", type=float, choices=sorted(Z_VALUES), default=0.95)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--buffered", action="store_true",
+                        help="броски случайных чисел блоками (streams.BufferedRandom)")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="сэмплирующий профилировщик: свернутые стеки в FILE; "
+                             "бои идут в одном потоке этого процесса, --workers не учитывается")
+    parser.add_argument("--instrument", metavar="FILE",
+                        help="замерить горячие пути боя и записать отчет JSON в FILE")
+    args = parser.parse_args(argv)
+
+    difficulties = args.difficulty or DIFFICULTIES
+    compositions = [parse_composition(text) for text in (args.party or ["wmh"])]
+    metrics = instrument.Metrics()
+
+    # Профилировщик видит только потоки своего процесса
+    if args.profile:
+        workers = 1
+        executor = ThreadPoolExecutor(max_workers=workers)
+    else:
+        workers = args.workers
+        executor = ProcessPoolExecutor(max_workers=workers)
+    with profiling(args.profile), executor:
+        for difficulty in difficulties:
+            for composition in compositions:
+                stats = simulate(executor, difficulty, composition, args.battles, args.seed, args.policy,
+                                 args.batch_size, args.precision, z=Z_VALUES[args.confidence],
+                                 buffered=args.buffered, instrumented=bool(args.instrument),
+                                 workers=workers)
+                print(stats)
+                if stats.metrics is not None:
+                    print(stats.metrics.format())
+                    metrics.merge(stats.metrics.state())
+
+    if args.instrument:
+        metrics.dump(args.instrument)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,11 @@
 from abc import ABC, abstractmethod
+from events import DamageDealt, Healed, SkillUsed
 
 class Skill(ABC):
     """Абстрактный базовый класс для навыков"""
     
+    __slots__ = ('name', 'mana_cost', 'cooldown')
+    
     def __init__(self, name, mana_cost, cooldown):
         self.name = name
         self.mana_cost = mana_cost
@@ -18,6 +21,8 @@ class Skill(ABC):
 class DamageSkill(Skill):
     """Навык нанесения урона"""
     
+    __slots__ = ('base_damage', 'damage_type')
+    
     def __init__(self, name, mana_cost, cooldown, base_damage, damage_type="physical"):
         super().__init__(name, mana_cost, cooldown)
         self.base_damage = base_damage
@@ -39,7 +44,7 @@ class DamageSkill(Skill):
         damage = caster.calculate_crit(damage)
         
         actual_damage = target.take_damage(int(damage))
-        print(f"{caster.name} использует {self.name} на {target.name} и наносит {actual_damage} урона!")
+        caster.events.emit(DamageDealt, caster, target, actual_damage, "skill", self.name)
         
         caster.cooldowns[self.name] = self.cooldown
         return True
@@ -47,6 +52,8 @@ class DamageSkill(Skill):
 class HealSkill(Skill):
     """Навык лечения"""
     
+    __slots__ = ('base_heal',)
+    
     def __init__(self, name, mana_cost, cooldown, base_heal):
         super().__init__(name, mana_cost, cooldown)
         self.base_heal = base_heal
@@ -62,7 +69,7 @@ class HealSkill(Skill):
         target.hp = min(target.max_hp, target.hp + int(heal_amount))
         actual_heal = target.hp - old_hp
         
-        print(f"{caster.name} использует {self.name} на {target.name} и восстанавливает {actual_heal} HP!")
+        caster.events.emit(Healed, caster, target, actual_heal, "skill", self.name)
         
         caster.cooldowns[self.name] = self.cooldown
         return True
@@ -70,6 +77,8 @@ class HealSkill(Skill):
 class EffectSkill(Skill):
     """Навык наложения эффекта"""
     
+    __slots__ = ('effect_class', 'effect_kwargs')
+    
     def __init__(self, name, mana_cost, cooldown, effect_class, **effect_kwargs):
         super().__init__(name, mana_cost, cooldown)
         self.effect_class = effect_class
@@ -83,32 +92,42 @@ class EffectSkill(Skill):
         
         # Создаем новый экземпляр эффекта
         new_effect = self.effect_class(**self.effect_kwargs)
-        new_effect.apply_effect(target)
+        target.add_effect(new_effect)
         
-        print(f"{caster.name} использует {self.name} на {target.name}!")
+        caster.events.emit(SkillUsed, caster, target, self.name)
         
         caster.cooldowns[self.name] = self.cooldown
         return True
 
 # Конкретные навыки
 class PowerStrike(DamageSkill):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__("Мощный удар", 15, 2, 25)
 
 class Fireball(DamageSkill):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__("Огненный шар", 30, 3, 40, "magical")
 
 class Heal(HealSkill):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__("Лечение", 10, 2, 40)
 
 class PoisonDart(EffectSkill):
+    __slots__ = ()
+
     def __init__(self):
         from effects import PoisonEffect
         super().__init__("Отравленный дротик", 12, 3, PoisonEffect, damage_per_turn=20, duration=3)
 
 class Shield(EffectSkill):
+    __slots__ = ()
+
     def __init__(self):
         from effects import ShieldEffect
         super().__init__("Щит", 18, 4, ShieldEffect, shield_amount=25, duration=2)
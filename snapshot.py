@@ -0,0 +1,445 @@
+"""Компактный двоичный снимок полного состояния боя
+
+Формат (little-endian):
+    заголовок    b"PBSN", версия (u16)
+    бой          раунд (u32), активен (u8), несколько действий за раунд (u8),
+                 победитель (строка или None), сложность (строка или None,
+                 с версии 2), состояние ГСЧ
+    участники    число (u16), затем каждый участник группы и босс последним
+
+Участник: класс, имя, уровень, HP/MP и их максимумы и характеристики
+одной записью, немота, перезарядки, эффекты со всеми полями, у босса -
+множитель урона и текущая фаза. Остальные значения хранятся с тегом типа,
+поэтому int и float восстанавливаются без изменений.
+"""
+import os
+import struct
+
+import streams
+from bosses import Boss
+from characters import Warrior, Mage, Healer
+from effects import EffectList, PoisonEffect, ShieldEffect, RegenerationEffect
+
+MAGIC = b"PBSN"
+VERSION = 2
+# Версии, которые умеет читать loads()
+READ_VERSIONS = (1, 2)
+EXTENSION = ".pbs"
+
+_HEADER = struct.Struct("<4sH")
+_BATTLE = struct.Struct("<IBB")
+_U8 = struct.Struct("<B")
+_U16 = struct.Struct("<H")
+_U32 = struct.Struct("<I")
+_INT = struct.Struct("<q")
+_FLOAT = struct.Struct("<d")
+_MT_STATE = struct.Struct("<625I")
+# Буферизованный генератор (streams.BufferedRandom): метка вместо версии MT,
+# размер блока, NumPy, есть ли блок, seed блока, выдано бросков; затем основной генератор
+_BUFFERED_RNG = 0x80
+_BUFFERED = struct.Struct("<IBBQI")
+# Характеристики одной записью: значения и маска целых (бит i - поле i было int)
+_STATS = struct.Struct("<7dB")
+
+# Классы, которые можно восстановить из снимка, по имени
+CLASSES = {cls.__name__: cls for cls in (Warrior, Mage, Healer, Boss,
+                                         PoisonEffect, ShieldEffect, RegenerationEffect)}
+
+STAT_FIELDS = ('hp', 'mp', 'max_hp', 'max_mp', 'strength', 'agility', 'intelligence')
+
+
+class SnapshotError(Exception):
+    """Снимок поврежден или записан несовместимой версией"""
+
+
+def register(cls):
+    """Регистрация дополнительного класса участника или эффекта"""
+    CLASSES[cls.__name__] = cls
+    return cls
+
+
+def _slot_names(cls):
+    """Все слоты класса по цепочке наследования"""
+    names = []
+    for klass in reversed(cls.__mro__):
+        slots = klass.__dict__.get('__slots__', ())
+        names.extend((slots,) if isinstance(slots, str) else slots)
+    return names
+
+
+# --- Запись ---
+
+def _pack_value(out, value):
+    kind = type(value)
+    if value is None:
+        out += b"N"
+    elif kind is bool:
+        out += b"T" if value else b"F"
+    elif kind is int:
+        out += b"i"
+        out += _INT.pack(value)
+    elif kind is float:
+        out += b"d"
+        out += _FLOAT.pack(value)
+    elif kind is str:
+        data = value.encode("utf-8")
+        out += b"s"
+        out += _U32.pack(len(data))
+        out += data
+    elif kind is list or kind is tuple:
+        out += b"l" if kind is list else b"t"
+        out += _U32.pack(len(value))
+        for item in value:
+            _pack_value(out, item)
+    elif kind is dict:
+        out += b"m"
+        out += _U32.pack(len(value))
+        for key, item in value.items():
+            _pack_value(out, key)
+            _pack_value(out, item)
+    else:
+        raise TypeError(f"Нельзя сохранить значение типа {kind.__name__}")
+
+
+def _pack_rng(out, state):
+    if state is None:
+        out += b"\x00"
+        return
+    if state[0] == streams.BUFFERED:
+        _, block_size, use_numpy, core_state, block_seed, consumed = state
+        out += _U8.pack(_BUFFERED_RNG)
+        out += _BUFFERED.pack(block_size, use_numpy, block_seed is not None, block_seed or 0, consumed)
+        _pack_rng(out, core_state)
+        return
+    version, internal, gauss_next = state
+    out += _U8.pack(version)
+    out += _MT_STATE.pack(*internal)
+    _pack_value(out, gauss_next)
+
+
+# --- Неизменяемое состояние ---
+#
+# freeze() копирует все, что попадет в снимок, в кортежи и собственные
+# копии списков и словарей. Такой снимок состояния дешев (без кодирования)
+# и не видит последующих изменений боя, поэтому его можно кодировать и
+# записывать в другом потоке.
+
+class ParticipantState:
+    """Состояние участника: класс, имя, уровень и части записи (SECTIONS)"""
+
+    __slots__ = ('class_name', 'name', 'level', 'sections')
+
+    def __init__(self, class_name, name, level, sections):
+        self.class_name = class_name
+        self.name = name
+        self.level = level
+        self.sections = sections
+
+
+class BattleState:
+    """Состояние боя на момент freeze()"""
+
+    __slots__ = ('round', 'is_active', 'multiple_actions', 'winner', 'difficulty', 'rng', 'participants')
+
+    def __init__(self, round, is_active, multiple_actions, winner, difficulty, rng, participants):
+        self.round = round
+        self.is_active = is_active
+        self.multiple_actions = multiple_actions
+        self.winner = winner
+        self.difficulty = difficulty
+        self.rng = rng
+        self.participants = participants
+
+
+def _copy_value(value):
+    kind = type(value)
+    if kind is list:
+        return [_copy_value(item) for item in value]
+    if kind is dict:
+        return {key: _copy_value(item) for key, item in value.items()}
+    return value
+
+
+_effect_slots = {}
+
+
+def _freeze_effect(effect):
+    cls = type(effect)
+    names = _effect_slots.get(cls)
+    if names is None:
+        names = _effect_slots[cls] = tuple(_slot_names(cls))
+    return cls.__name__, tuple(_copy_value(getattr(effect, name, None)) for name in names)
+
+
+def _freeze_stats(participant):
+    return tuple([getattr(participant, name) for name in STAT_FIELDS])
+
+
+def _freeze_silence(participant):
+    return participant._silenced, participant._silence_duration
+
+
+def _freeze_cooldowns(participant):
+    return dict(participant.cooldowns)
+
+
+def _freeze_effects(participant):
+    return tuple([_freeze_effect(effect) for effect in participant.effects])
+
+
+def _freeze_boss(participant):
+    if not isinstance(participant, Boss):
+        return None
+    phase = next((key for key, strategy in participant.strategies.items()
+                  if strategy is participant.current_strategy), None)
+    return participant.damage_multiplier, phase
+
+
+def freeze_participant(participant):
+    return ParticipantState(participant.__class__.__name__, participant.name, participant.level,
+                            tuple([freeze(participant) for freeze, _, _ in SECTIONS]))
+
+
+def freeze(battle):
+    """Неизменяемая копия состояния боя для кодирования позже или в другом потоке"""
+    return BattleState(battle.round, battle.is_active, battle.multiple_actions, battle.winner,
+                       battle.difficulty, battle.rng.getstate() if battle.rng is not None else None,
+                       tuple([freeze_participant(p) for p in battle.party + [battle.boss]]))
+
+
+# --- Запись ---
+
+def _pack_stats(out, values):
+    int_mask = sum(1 << i for i, value in enumerate(values) if type(value) is int)
+    out += _STATS.pack(*values, int_mask)
+
+
+def _pack_silence(out, silence):
+    _pack_value(out, silence[0])
+    _pack_value(out, silence[1])
+
+
+def _pack_effects(out, effects):
+    out += _U16.pack(len(effects))
+    for class_name, values in effects:
+        _pack_value(out, class_name)
+        for value in values:
+            _pack_value(out, value)
+
+
+def _pack_boss(out, boss):
+    if boss is not None:
+        _pack_value(out, boss[0])
+        _pack_value(out, boss[1])
+
+
+def _pack_participant(out, state):
+    _pack_value(out, state.class_name)
+    _pack_value(out, state.name)
+    _pack_value(out, state.level)
+    for (_, pack, _), section in zip(SECTIONS, state.sections):
+        pack(out, section)
+
+
+def encode(state):
+    """Снимок в байтах из состояния freeze()"""
+    out = bytearray(_HEADER.pack(MAGIC, VERSION))
+    out += _BATTLE.pack(state.round, state.is_active, state.multiple_actions)
+    _pack_value(out, state.winner)
+    _pack_value(out, state.difficulty)
+    _pack_rng(out, state.rng)
+
+    out += _U16.pack(len(state.participants))
+    for participant in state.participants:
+        _pack_participant(out, participant)
+    return bytes(out)
+
+
+def dumps(battle):
+    """Снимок боя в байтах"""
+    return encode(freeze(battle))
+
+
+# --- Чтение ---
+
+class _Reader:
+    __slots__ = ('data', 'pos')
+
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def unpack(self, fmt):
+        values = fmt.unpack_from(self.data, self.pos)
+        self.pos += fmt.size
+        return values
+
+    def byte(self):
+        value = self.data[self.pos]
+        self.pos += 1
+        return value
+
+    def value(self):
+        tag = self.data[self.pos:self.pos + 1]
+        self.pos += 1
+        if tag == b"i":
+            return self.unpack(_INT)[0]
+        if tag == b"d":
+            return self.unpack(_FLOAT)[0]
+        if tag == b"s":
+            size = self.unpack(_U32)[0]
+            text = bytes(self.data[self.pos:self.pos + size]).decode("utf-8")
+            self.pos += size
+            return text
+        if tag == b"N":
+            return None
+        if tag == b"T":
+            return True
+        if tag == b"F":
+            return False
+        if tag == b"l" or tag == b"t":
+            items = [self.value() for _ in range(self.unpack(_U32)[0])]
+            return items if tag == b"l" else tuple(items)
+        if tag == b"m":
+            return {self.value(): self.value() for _ in range(self.unpack(_U32)[0])}
+        raise SnapshotError(f"Неизвестный тег значения {tag!r} в позиции {self.pos - 1}")
+
+
+def _class(name):
+    try:
+        return CLASSES[name]
+    except KeyError:
+        raise SnapshotError(f"Неизвестный класс в снимке: {name}")
+
+
+def _unpack_rng(reader):
+    version = reader.byte()
+    if version == 0:
+        return None
+    if version == _BUFFERED_RNG:
+        block_size, use_numpy, has_block, block_seed, consumed = reader.unpack(_BUFFERED)
+        return (streams.BUFFERED, block_size, bool(use_numpy), _unpack_rng(reader),
+                block_seed if has_block else None, consumed)
+    internal = reader.unpack(_MT_STATE)
+    return version, internal, reader.value()
+
+
+def _unpack_effect(reader):
+    cls = _class(reader.value())
+    effect = cls.__new__(cls)
+    for name in _slot_names(cls):
+        setattr(effect, name, reader.value())
+    return effect
+
+
+def _unpack_stats(reader, participant):
+    *values, int_mask = reader.unpack(_STATS)
+    for i, (field, value) in enumerate(zip(STAT_FIELDS, values)):
+        setattr(participant, field, int(value) if int_mask >> i & 1 else value)
+
+
+def _unpack_silence(reader, participant):
+    participant._silenced = reader.value()
+    participant._silence_duration = reader.value()
+
+
+def _unpack_cooldowns(reader, participant):
+    participant.cooldowns = reader.value()
+
+
+def _unpack_effects(reader, participant):
+    participant.effects = EffectList(_unpack_effect(reader) for _ in range(reader.unpack(_U16)[0]))
+
+
+def _unpack_boss(reader, participant):
+    if isinstance(participant, Boss):
+        participant.damage_multiplier = reader.value()
+        phase = reader.value()
+        if phase is not None:
+            try:
+                participant.current_strategy = participant.strategies[phase]
+            except (KeyError, TypeError):
+                raise SnapshotError(f"Неизвестная фаза босса: {phase!r}")
+
+
+# Части записи участника по порядку: (копия, запись, чтение).
+# Журнал автосохранения пишет только измененные части
+SECTIONS = (
+    (_freeze_stats, _pack_stats, _unpack_stats),
+    (_freeze_silence, _pack_silence, _unpack_silence),
+    (_freeze_cooldowns, _pack_value, _unpack_cooldowns),
+    (_freeze_effects, _pack_effects, _unpack_effects),
+    (_freeze_boss, _pack_boss, _unpack_boss),
+)
+
+
+def _unpack_participant(reader):
+    cls = _class(reader.value())
+    name = reader.value()
+    level = reader.value()
+    participant = cls(name, level)
+    for _, _, unpack in SECTIONS:
+        unpack(reader, participant)
+    return participant
+
+
+def loads(data, battle_class=None):
+    """Восстановление боя из байтов снимка"""
+    if battle_class is None:
+        from battle import Battle
+        battle_class = Battle
+
+    reader = _Reader(memoryview(data))
+    try:
+        magic, version = reader.unpack(_HEADER)
+        if magic != MAGIC:
+            raise SnapshotError("Это не снимок боя")
+        if version not in READ_VERSIONS:
+            raise SnapshotError(f"Неподдерживаемая версия снимка: {version}")
+
+        round_number, is_active, multiple_actions = reader.unpack(_BATTLE)
+        winner = reader.value()
+        difficulty = reader.value() if version >= 2 else None
+        rng_state = _unpack_rng(reader)
+        participants = [_unpack_participant(reader) for _ in range(reader.unpack(_U16)[0])]
+    except (struct.error, IndexError, UnicodeDecodeError) as e:
+        raise SnapshotError(f"Снимок поврежден: {e}")
+
+    # Восстановленный бой получает собственный генератор, глобальный random не меняется
+    rng = streams.from_state(rng_state) if rng_state is not None else None
+    battle = battle_class(participants[:-1], participants[-1], multiple_actions=bool(multiple_actions), rng=rng)
+    battle.round = round_number
+    battle.is_active = bool(is_active)
+    battle.winner = winner
+    battle.difficulty = difficulty
+    return battle
+
+
+def write_state(state, filename):
+    """Кодирование и атомарная запись состояния freeze(); годится для фонового потока"""
+    write_atomic(filename, encode(state))
+    return filename
+
+
+def write_atomic(filename, data):
+    """Запись файла целиком: во временный файл, fsync и переименование"""
+    temp = filename + ".tmp"
+    with open(temp, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp, filename)
+
+
+def save(battle, filename):
+    if not filename.endswith(EXTENSION):
+        filename += EXTENSION
+    write_atomic(filename, dumps(battle))
+    return filename
+
+
+def load(filename, battle_class=None):
+    if not filename.endswith(EXTENSION):
+        filename += EXTENSION
+    with open(filename, 'rb') as f:
+        return loads(f.read(), battle_class)
@@ -0,0 +1,390 @@
+"""Решатель небольших боев с таблицей транспозиций и таблица политики группы
+
+Решатель перебирает все ходы группы (лучший из battle.legal_actions) и
+все исходы бросков на критический удар (математическое ожидание по их
+вероятностям); босс ходит обычными стратегиями фаз. Ценность позиции -
+вероятность победы группы при лучшей игре, поэтому ценность начала боя -
+верхняя граница для любой политики группы (для работы над балансом).
+С horizon перебор останавливается через horizon раундов, и позиция
+оценивается search.party_value.
+
+Позиции хешируются по Зобристу (StateHasher): HP в долях max_hp по
+hp_buckets корзинам (0 HP - отдельно), MP с шагом mp_step, перезарядки,
+немота, эффекты, чей ход и четность раунда. Позиции из одних корзин
+считаются одной: чем грубее корзины, тем меньше позиций и тем
+приблизительнее ответ. При 10 корзинах границы фаз босса (70% и 30% HP)
+совпадают с границами корзин.
+
+Таблица транспозиций ограничена: 2**table_bits ячеек, ячейка - младшие
+биты ключа; при коллизии остается позиция, решенная на большую глубину.
+Лучшие ходы из нее образуют PolicyTable: ее можно сохранить в JSON и
+отдать SolvedPolicy для HeadlessBattle.
+"""
+import argparse
+import json
+import sys
+import time
+
+import search
+import snapshot
+import streams
+from battle import Battle, HeadlessBattle, TurnOrder
+from policies import PlayerPolicy, GreedyPolicy
+
+HP_BUCKETS = 10
+MP_STEP = 10
+TABLE_BITS = 20
+# Общий seed чисел Зобриста: ключи совпадают в разных процессах и запусках
+ZOBRIST_SEED = "solver"
+FORMAT_VERSION = 1
+_MASK = (1 << 64) - 1
+
+
+class StateHasher:
+    """Ключ позиции по Зобристу: XOR 64-битных чисел признаков позиции"""
+
+    def __init__(self, hp_buckets=HP_BUCKETS, mp_step=MP_STEP):
+        self.hp_buckets = hp_buckets
+        self.mp_step = mp_step
+        self._numbers = {}
+
+    def number(self, feature):
+        """Число Зобриста признака; выводится из ZOBRIST_SEED, а не из hash()"""
+        number = self._numbers.get(feature)
+        if number is None:
+            number = self._numbers[feature] = streams.derive_seed(ZOBRIST_SEED, feature) & _MASK
+        return number
+
+    def hp_bucket(self, participant):
+        if participant.hp <= 0:
+            return 0
+        # Вверх: корзина k - доля HP в ((k - 1) / n, k / n]
+        return -(-participant.hp * self.hp_buckets // participant.max_hp)
+
+    def features(self, battle, actor):
+        """Признаки позиции; actor - индекс ходящего в battle.party + [battle.boss]"""
+        yield ("actor", actor)
+        yield ("parity", battle.round & 1)
+        for slot, participant in enumerate(battle.party + [battle.boss]):
+            yield (slot, "hp", self.hp_bucket(participant))
+            if not participant.is_alive:
+                continue
+            yield (slot, "mp", int(participant.mp) // self.mp_step)
+            for name, turns in participant.cooldowns.items():
+                yield (slot, "cooldown", name, turns)
+            if participant.is_silenced:
+                yield (slot, "silence", participant._silence_duration)
+            # Одинаковые эффекты различаются номером, иначе их числа сократятся в XOR
+            effects = sorted((type(effect).__name__, effect.remaining_duration, effect.intensity)
+                             for effect in participant.effects)
+            for i, effect in enumerate(effects):
+                yield (slot, "effect", i) + effect
+
+    def key(self, battle, actor):
+        key = 0
+        for feature in self.features(battle, actor):
+            key ^= self.number(feature)
+        return key
+
+
+class _Roll(float):
+    """Бросок random(): сравнение с шансом крита записывает шанс и дает заданный исход"""
+
+    __slots__ = ('rolls',)
+
+    def __lt__(self, chance):
+        return self.rolls.resolve(chance)
+
+
+class _ScriptedRolls:
+    """ГСЧ для перебора исходов: первые броски по script, остальные - без крита
+
+    CritMixin.calculate_crit сравнивает random() с шансом крита, поэтому
+    шанс каждого броска становится известен в момент сравнения. Состояние -
+    только script, поэтому streams.copy (Battle.clone) почти ничего не стоит.
+    """
+
+    def __init__(self, script=()):
+        self.setstate(script)
+
+    def getstate(self):
+        return self.script
+
+    def setstate(self, script):
+        self.script = script
+        self.chances = []
+
+    def random(self):
+        roll = _Roll(0.5)
+        roll.rolls = self
+        return roll
+
+    def resolve(self, chance):
+        i = len(self.chances)
+        self.chances.append(chance)
+        return self.script[i] if i < len(self.script) else False
+
+
+def _use_rng(battle, rng):
+    battle.rng = rng
+    for participant in battle.party + [battle.boss]:
+        participant.rng = rng
+
+
+class _Position(HeadlessBattle):
+    """Позиция перебора: бой без статистики урона и ее копирования"""
+
+    clone = Battle.clone
+    take_action = Battle.take_action
+    process_start_of_turn_effects = Battle.process_start_of_turn_effects
+
+
+class Solver:
+    """Ожидаемый максимум по ходам группы и броскам критов с таблицей транспозиций"""
+
+    def __init__(self, hp_buckets=HP_BUCKETS, mp_step=MP_STEP, horizon=None, table_bits=TABLE_BITS):
+        self.hasher = StateHasher(hp_buckets, mp_step)
+        self.horizon = horizon
+        self.mask = (1 << table_bits) - 1
+        # Ячейки: (ключ, глубина в раундах, ценность, лучший ход или None)
+        self.table = [None] * (1 << table_bits)
+        self.nodes = 0
+        self.hits = 0
+        self._order = None
+        self._start_round = 0
+
+    def solve(self, battle):
+        """Вероятность победы группы при лучшей игре от начала следующего раунда battle"""
+        root = _Position.from_battle(battle, PlayerPolicy())
+        search.use_strategies(root.boss, search.rules_of(root.boss))
+        _use_rng(root, _ScriptedRolls())
+        participants = root.party + [root.boss]
+        self._order = [participants.index(p) for p in TurnOrder(participants).order]
+        self._start_round = root.round
+        depth = self.horizon if self.horizon is not None else root.max_rounds - root.round
+        # Перебор рекурсивный: несколько кадров стека на каждый ход раунда
+        limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(max(limit, 4 * len(participants) * depth + 200))
+        try:
+            return self._round(root, depth)
+        finally:
+            sys.setrecursionlimit(limit)
+
+    def policy(self):
+        """Лучшие ходы группы из таблицы транспозиций"""
+        actions = {entry[0]: entry[3] for entry in self.table if entry is not None and entry[3] is not None}
+        return PolicyTable(actions, self.hasher.hp_buckets, self.hasher.mp_step)
+
+    def _value(self, battle):
+        return search.party_value(battle, self._start_round)
+
+    def _round(self, battle, depth):
+        if depth <= 0 or battle.round >= battle.max_rounds:
+            return self._value(battle)
+        battle.round += 1
+        return self._turn(battle, 0, depth)
+
+    def _turn(self, battle, position, depth):
+        """Ценность позиции перед ходом участника номер position в порядке ходов раунда"""
+        participants = battle.party + [battle.boss]
+        while position < len(self._order) and not participants[self._order[position]].is_alive:
+            position += 1
+        if position == len(self._order):
+            battle.update_all_effects()
+            return self._round(battle, depth - 1)
+
+        actor = self._order[position]
+        participant = participants[actor]
+        battle.process_start_of_turn_effects(participant)
+        if not participant.is_alive:
+            if battle.check_battle_end():
+                return self._value(battle)
+            return self._turn(battle, position + 1, depth)
+
+        self.nodes += 1
+        key = self.hasher.key(battle, actor)
+        entry = self.table[key & self.mask]
+        if entry is not None and entry[0] == key and entry[1] >= depth:
+            self.hits += 1
+            return entry[2]
+
+        if participant is battle.boss:
+            value = self._expect(self._outcomes(battle, lambda b: b.take_action(b.boss)), position, depth)
+            best = None
+        else:
+            value, best = -1.0, None
+            seen = []
+            for action_type, index, target in battle.legal_actions(participant):
+                action = (action_type, index, None if target is None else participants.index(target))
+                outcomes = self._outcomes(battle, _action_step(actor, action))
+                # Ходы с теми же исходами (зелье здоровому, пропуск) не перебираются повторно
+                signature = [(probability, _exact_state(child)) for probability, child in outcomes]
+                if signature in seen:
+                    continue
+                seen.append(signature)
+                action_value = self._expect(outcomes, position, depth)
+                if action_value > value:
+                    value, best = action_value, action
+                    if value >= 1.0:
+                        # Лучше верной победы не бывает
+                        break
+
+        slot = key & self.mask
+        if entry is None or entry[0] == key or entry[1] <= depth:
+            self.table[slot] = (key, depth, value, best)
+        return value
+
+    def _expect(self, outcomes, position, depth):
+        total = 0.0
+        for probability, child in outcomes:
+            if child.check_battle_end():
+                total += probability * self._value(child)
+            else:
+                total += probability * self._turn(child, position + 1, depth)
+        return total
+
+    def _outcomes(self, battle, step):
+        """[(вероятность, копия боя после step)] по всем исходам бросков на крит"""
+        results = []
+        pending = [()]
+        while pending:
+            script = pending.pop()
+            child = battle.clone()
+            # Генератор копии общий у ее участников (Battle.clone)
+            rolls = child.rng
+            rolls.setstate(script)
+            step(child)
+            probability = 1.0
+            for i, chance in enumerate(rolls.chances):
+                if i < len(script):
+                    crit = script[i]
+                else:
+                    # Исход с критом в броске i, которого не было в сценарии
+                    crit = False
+                    pending.append(script + (False,) * (i - len(script)) + (True,))
+                probability *= chance if crit else 1 - chance
+            results.append((probability, child))
+        return results
+
+
+def _exact_state(battle):
+    return [snapshot.freeze_participant(participant).sections for participant in battle.party + [battle.boss]]
+
+
+def _action_step(actor, action):
+    action_type, index, target = action
+
+    def step(battle):
+        participants = battle.party + [battle.boss]
+        battle.perform_action(participants[actor],
+                              (action_type, index, None if target is None else participants[target]))
+    return step
+
+
+class PolicyTable:
+    """Ходы группы по ключам позиций: {ключ: (тип, индекс, индекс цели)}"""
+
+    def __init__(self, actions, hp_buckets=HP_BUCKETS, mp_step=MP_STEP):
+        self.actions = actions
+        self.hasher = StateHasher(hp_buckets, mp_step)
+
+    def __len__(self):
+        return len(self.actions)
+
+    def action(self, battle, player):
+        """Ход из таблицы в виде battle.legal_actions или None, если позиции нет"""
+        entry = self.actions.get(self.hasher.key(battle, battle.party.index(player)))
+        if entry is None:
+            return None
+        action_type, index, target = entry
+        participants = battle.party + [battle.boss]
+        action = (action_type, index, None if target is None else participants[target])
+        # В корзине могут быть позиции, где ход недопустим (например, не хватает MP)
+        if action not in battle.legal_actions(player):
+            return None
+        return action
+
+    def save(self, filename):
+        data = {
+            "version": FORMAT_VERSION,
+            "hp_buckets": self.hasher.hp_buckets,
+            "mp_step": self.hasher.mp_step,
+            "actions": {f"{key:016x}": list(action) for key, action in self.actions.items()},
+        }
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Неподдерживаемая версия таблицы политики: {data.get('version')}")
+        actions = {int(key, 16): tuple(action) for key, action in data["actions"].items()}
+        return cls(actions, data["hp_buckets"], data["mp_step"])
+
+
+class SolvedPolicy(PlayerPolicy):
+    """Ходы из таблицы решателя; позиции, которых в ней нет, решает fallback"""
+
+    def __init__(self, table, fallback=None):
+        self.table = table
+        self.fallback = fallback or GreedyPolicy()
+        self.hits = 0
+        self.misses = 0
+
+    def choose_action(self, battle, player):
+        action = self.table.action(battle, player)
+        if action is None:
+            self.misses += 1
+            return self.fallback.choose_action(battle, player)
+        self.hits += 1
+        return action
+
+
+def main(argv=None):
+    from roster import create_party, create_boss
+    from simulate import DIFFICULTIES, parse_composition
+
+    parser = argparse.ArgumentParser(description="Решение небольшого боя: лучшая игра группы и таблица политики")
+    parser.add_argument("-d", "--difficulty", choices=DIFFICULTIES, default="easy")
+    parser.add_argument("-p", "--party", default="wmh", help="состав группы: w - воин, m - маг, h - лекарь")
+    parser.add_argument("--level", type=int, default=1, help="уровень босса")
+    parser.add_argument("--horizon", type=int, help="раундов перебора (по умолчанию до конца боя)")
+    parser.add_argument("--hp-buckets", type=int, default=HP_BUCKETS)
+    parser.add_argument("--mp-step", type=int, default=MP_STEP)
+    parser.add_argument("--table-bits", type=int, default=TABLE_BITS)
+    parser.add_argument("-o", "--output", metavar="FILE", help="сохранить таблицу политики в JSON")
+    parser.add_argument("--evaluate", type=int, default=0, metavar="N",
+                        help="сыграть N боев политикой из таблицы и GreedyPolicy")
+    args = parser.parse_args(argv)
+
+    composition = parse_composition(args.party)
+
+    def new_battle(policy, seed):
+        party = create_party(args.difficulty, composition)
+        boss = create_boss(args.difficulty, args.level)
+        return HeadlessBattle(party, boss, policy, rng=streams.new_stream(seed))
+
+    solver = Solver(args.hp_buckets, args.mp_step, args.horizon, args.table_bits)
+    start = time.perf_counter()
+    value = solver.solve(new_battle(GreedyPolicy(), 0))
+    elapsed = time.perf_counter() - start
+    table = solver.policy()
+    print(f"Шанс победы при лучшей игре: {value:.3f}")
+    print(f"Позиций: {solver.nodes}, из таблицы: {solver.hits}, ходов в политике: {len(table)}, "
+          f"время: {elapsed:.1f} с")
+    if args.output:
+        table.save(args.output)
+        print(f"Таблица политики: {args.output}")
+
+    if args.evaluate:
+        solved = SolvedPolicy(table)
+        for name, policy in (("решатель", solved), ("greedy", GreedyPolicy())):
+            wins = sum(new_battle(policy, seed).run().party_won for seed in range(args.evaluate))
+            print(f"{name}: {wins}/{args.evaluate} побед")
+        print(f"Ходов из таблицы: {solved.hits}, вне таблицы: {solved.misses}")
+
+
+if __name__ == "__main__":
+    main()
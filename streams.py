@@ -0,0 +1,156 @@
+"""Независимые потоки случайных чисел для боев
+
+У каждого боя свой генератор (Battle.rng): криты и случайные решения
+берутся только из него, поэтому бои в параллельных процессах не влияют
+друг на друга и воспроизводятся по seed.
+
+spawn_seeds() выводит seed для потоков из общего seed и номера потока
+через sha256: seed не зависят от того, какой процесс какой бой считает,
+и не зависят от наличия NumPy. BufferedRandom заранее генерирует броски
+random() блоками (NumPy, если установлен).
+"""
+import hashlib
+import itertools
+import operator
+import random
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+BUFFERED = "buffered"
+BLOCK_SIZE = 1024
+
+
+def derive_seed(seed, index):
+    """128-битный seed потока index, выведенный из общего seed"""
+    digest = hashlib.sha256(f"{seed}/{index}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:16], "little")
+
+
+def spawn_seeds(seed, count, start=0):
+    """Seed для потоков start..start+count-1"""
+    return [derive_seed(seed, index) for index in range(start, start + count)]
+
+
+def new_stream(seed=None, buffered=False, block_size=BLOCK_SIZE):
+    """Генератор для одного боя"""
+    if buffered:
+        return BufferedRandom(seed, block_size)
+    return random.Random(seed)
+
+
+def split(rng, count, buffered=False):
+    """count независимых потоков, порожденных из rng (например, для рабочих процессов)"""
+    root = rng.getrandbits(128)
+    return [new_stream(seed, buffered) for seed in spawn_seeds(root, count)]
+
+
+def from_state(state):
+    """Генератор, восстановленный из getstate() (снимки боя)"""
+    rng = BufferedRandom(block_size=state[1]) if state[0] == BUFFERED else random.Random()
+    rng.setstate(state)
+    return rng
+
+
+def copy(rng):
+    """Независимый генератор с тем же состоянием, что у rng (для Battle.clone)
+
+    Копия создается через __new__ без __init__, то есть без seed() и засева
+    из os.urandom, поэтому она дешевле from_state(): остается только перенос
+    состояния. BufferedRandom копирует и остаток текущего блока.
+    """
+    if isinstance(rng, BufferedRandom):
+        return rng.copy()
+    cls = type(rng)
+    clone = cls.__new__(cls)
+    clone.setstate(rng.getstate())
+    return clone
+
+
+class BufferedRandom(random.Random):
+    """random.Random, у которого random() выдает заранее сгенерированные блоки
+
+    Блок генерируется по seed, взятому из основного генератора: NumPy
+    (PCG64), если он есть, иначе отдельным random.Random. random() - это
+    __next__ итератора по блокам, поэтому бросок не вызывает Python-код;
+    Python работает только раз на блок. Остальные методы (choice, randint)
+    берут числа из основного генератора. Состояние - основной генератор,
+    seed текущего блока и число выданных из него бросков.
+    """
+
+    def __init__(self, seed=None, block_size=BLOCK_SIZE, use_numpy=None):
+        self.block_size = block_size
+        self.use_numpy = np is not None if use_numpy is None else use_numpy
+        if self.use_numpy and np is None:
+            raise RuntimeError("Для блоков NumPy нужен установленный NumPy")
+        super().__init__(seed)
+
+    def seed(self, *args, **kwargs):
+        super().seed(*args, **kwargs)
+        self._start(None, 0)
+
+    def copy(self):
+        """Копия с тем же основным генератором и остатком текущего блока
+
+        В отличие от setstate(getstate()) блок не генерируется заново: копия
+        продолжает тот же список бросков (списки блоков не изменяются).
+        """
+        cls = type(self)
+        clone = cls.__new__(cls)
+        clone.block_size = self.block_size
+        clone.use_numpy = self.use_numpy
+        random.Random.setstate(clone, random.Random.getstate(self))
+        clone._block_seed = self._block_seed
+        consumed = len(self._values) - operator.length_hint(self._block)
+        clone._resume(self._values, consumed)
+        return clone
+
+    def _generate(self, block_seed):
+        if self.use_numpy:
+            return np.random.Generator(np.random.PCG64(block_seed)).random(self.block_size).tolist()
+        generate = random.Random(block_seed).random
+        return [generate() for _ in range(self.block_size)]
+
+    def _blocks(self):
+        """Остаток текущего блока, затем новые блоки с seed из основного генератора"""
+        yield self._block
+        while True:
+            self._block_seed = super().getrandbits(64)
+            self._values = self._generate(self._block_seed)
+            self._block = iter(self._values)
+            yield self._block
+
+    def _start(self, block_seed, skip):
+        self._block_seed = block_seed
+        self._resume(self._generate(block_seed) if block_seed is not None else [], skip)
+
+    def _resume(self, values, skip):
+        """Продолжение блока values после skip выданных бросков"""
+        self._values = values
+        self._block = iter(values)
+        if skip:
+            next(itertools.islice(self._block, skip, skip), None)
+        # Бросок - это C-вызов: chain перебирает блоки, генератор нужен раз на блок
+        self.random = itertools.chain.from_iterable(self._blocks()).__next__
+
+    def getstate(self):
+        consumed = self.block_size - operator.length_hint(self._block)
+        return (BUFFERED, self.block_size, self.use_numpy, super().getstate(),
+                self._block_seed, consumed if self._block_seed is not None else 0)
+
+    def setstate(self, state):
+        if state[0] != BUFFERED:
+            super().setstate(state)
+            self._start(None, 0)
+            return
+        _, self.block_size, use_numpy, core_state, block_seed, consumed = state
+        if use_numpy and np is None:
+            raise RuntimeError("Состояние записано с блоками NumPy, а NumPy не установлен")
+        self.use_numpy = use_numpy
+        super().setstate(core_state)
+        if block_seed is not None and consumed >= self.block_size:
+            # Блок выдан целиком: следующий бросок берет новый блок
+            block_seed, consumed = None, 0
+        self._start(block_seed, consumed)
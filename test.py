@@ -4,6 +4,8 @@ from bosses import Boss
 from skills import PowerStrike, Fireball, Heal
 from effects import PoisonEffect, ShieldEffect
 from items import HealthPotion, ManaPotion
+from battle import HeadlessBattle
+from policies import GreedyPolicy, RandomPolicy
 
 class TestCharacters(unittest.TestCase):
     
@@ -26,6 +28,14 @@ class TestCharacters(unittest.TestCase):
         start_hp = self.warrior.hp
         self.warrior.take_damage(20)
         self.assertEqual(self.warrior.hp, start_hp - 20)
+    
+    def test_stat_bounds(self):
+        self.warrior.hp = -10
+        self.assertEqual(self.warrior.hp, 0)
+        self.warrior.mp = 10000
+        self.assertEqual(self.warrior.mp, 500)
+        self.warrior.agility = 0
+        self.assertEqual(self.warrior.agility, 1)
 
 class TestSkills(unittest.TestCase):
     
@@ -64,6 +74,49 @@ class TestEffects(unittest.TestCase):
         poison.on_turn_start(self.warrior)
         self.assertLess(self.warrior.hp, start_hp)
     
+    def test_effect_index(self):
+        from effects import RegenerationEffect
+        poison, shield, regen = PoisonEffect(), ShieldEffect(), RegenerationEffect()
+        for effect in (poison, shield, regen):
+            self.warrior.effects.append(effect)
+        self.assertEqual(list(self.warrior.effects.absorbers), [shield])
+        self.assertEqual(self.warrior.effects.turn_start(), [poison, regen])
+        self.assertTrue(self.warrior.effects.has(PoisonEffect))
+        self.warrior.effects.remove(poison)
+        self.assertFalse(self.warrior.effects.has(PoisonEffect))
+        self.assertEqual(len(self.warrior.effects), 2)
+    
+    def test_effect_registered_once(self):
+        boss = Boss("Босс", 1)
+        boss.poison_attack(self.warrior)
+        self.assertEqual(len(self.warrior.effects), 1)
+    
+    def test_poison_stacks_merge(self):
+        for _ in range(5):
+            self.warrior.add_effect(PoisonEffect(damage_per_turn=4, duration=3))
+        self.assertEqual(len(self.warrior.effects), 1)
+        poison = self.warrior.effects.first_of_type(PoisonEffect)
+        self.assertEqual(poison.damage_per_turn, 20)
+    
+    def test_merged_poison_parts_expire_separately(self):
+        self.warrior.add_effect(PoisonEffect(damage_per_turn=10, duration=1))
+        self.warrior.add_effect(PoisonEffect(damage_per_turn=5, duration=3))
+        poison = self.warrior.effects.first_of_type(PoisonEffect)
+        self.warrior.update_effects()
+        self.assertEqual(poison.damage_per_turn, 5)
+        self.assertIn(poison, self.warrior.effects)
+        self.warrior.update_effects()
+        self.warrior.update_effects()
+        self.assertNotIn(poison, self.warrior.effects)
+    
+    def test_shield_stacks_add_intensity(self):
+        self.warrior.add_effect(ShieldEffect(shield_amount=10))
+        self.warrior.add_effect(ShieldEffect(shield_amount=15))
+        self.assertEqual(len(self.warrior.effects), 1)
+        start_hp = self.warrior.hp
+        self.warrior.take_damage(30)
+        self.assertEqual(self.warrior.hp, start_hp - 5)
+    
     def test_shield_effect(self):
         shield = ShieldEffect()
         damage = shield.absorb_damage(15)
@@ -88,5 +141,998 @@ class TestBoss(unittest.TestCase):
         self.boss.hp = self.boss.max_hp * 0.5  # Фаза 2  
         self.boss.choose_action(self.party)
 
+class TestHeadlessBattle(unittest.TestCase):
+    
+    def setUp(self):
+        self.party = [Warrior("Воин"), Mage("Маг"), Healer("Лекарь")]
+        self.boss = Boss("Босс", 1)
+    
+    def test_battle_finishes(self):
+        result = HeadlessBattle(self.party, self.boss, GreedyPolicy()).run()
+        self.assertIn(result.winner, ("party", "boss"))
+        self.assertGreater(result.rounds, 0)
+        self.assertEqual(len(result.stats), 4)
+    
+    def test_damage_stats(self):
+        result = HeadlessBattle(self.party, self.boss, GreedyPolicy()).run()
+        boss_stats = result.stats[-1]
+        party_damage = sum(s["damage_dealt"] for s in result.stats[:-1])
+        self.assertEqual(boss_stats["damage_taken"], self.boss.max_hp - self.boss.hp)
+        self.assertLessEqual(party_damage, boss_stats["damage_taken"])
+    
+    def test_random_policy_actions_are_legal(self):
+        import random
+        result = HeadlessBattle(self.party, self.boss, RandomPolicy(random.Random(1)), max_rounds=50).run()
+        self.assertLessEqual(result.rounds, 50)
+
+class TestSimulation(unittest.TestCase):
+    
+    def test_seeded_battle_is_reproducible(self):
+        from simulate import run_battle
+        first = run_battle("normal", [1, 2, 3], seed=7)
+        second = run_battle("normal", [1, 2, 3], seed=7)
+        self.assertEqual((first.winner, first.rounds), (second.winner, second.rounds))
+    
+    def test_wilson_interval(self):
+        from simulate import wilson_interval
+        low, high = wilson_interval(50, 100)
+        self.assertLess(low, 0.5)
+        self.assertGreater(high, 0.5)
+        self.assertEqual(wilson_interval(0, 0), (0.0, 1.0))
+    
+    def test_simulate_with_explicit_workers(self):
+        from concurrent.futures import ThreadPoolExecutor
+        from simulate import simulate
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            stats = simulate(executor, "easy", [1, 2, 3], 6, batch_size=2, workers=1)
+        self.assertEqual(stats.battles, 6)
+        self.assertEqual(stats.wins, 6)
+    
+    def test_workers_do_not_import_main(self):
+        import subprocess
+        import sys
+        code = "import sys, simulate; print('main' in sys.modules, 'hints' in sys.modules)"
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+        self.assertEqual(output.stdout.split(), ["False", "False"])
+
+class TestVectorized(unittest.TestCase):
+    
+    def setUp(self):
+        try:
+            import numpy
+        except ImportError:
+            self.skipTest("NumPy не установлен")
+    
+    def test_batch_matches_object_engine(self):
+        from vectorized import check_against_object_engine
+        batch, win_rate, mean_rounds, z = check_against_object_engine("normal", [1, 2, 3], 200)
+        self.assertEqual(batch.battles, 200)
+        self.assertLess(abs(z), 3)
+        self.assertAlmostEqual(batch.mean_rounds, mean_rounds, delta=0.5)
+
+class TestEvents(unittest.TestCase):
+    
+    def test_headless_battle_is_silent(self):
+        import io
+        import contextlib
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            HeadlessBattle([Warrior("Воин"), Mage("Маг"), Healer("Лекарь")], Boss("Босс", 1), GreedyPolicy()).run()
+        self.assertEqual(output.getvalue(), "")
+    
+    def test_subscriber_receives_typed_events(self):
+        from events import EventBus, DamageDealt, ShieldAbsorbed
+        bus = EventBus()
+        received = []
+        bus.subscribe(DamageDealt, received.append)
+        bus.subscribe(ShieldAbsorbed, received.append)
+        warrior, boss = Warrior("Воин"), Boss("Босс", 1)
+        warrior.events = boss.events = bus
+        warrior.add_effect(ShieldEffect(shield_amount=10))
+        boss.basic_attack(warrior)
+        self.assertIsInstance(received[0], ShieldAbsorbed)
+        self.assertEqual(received[0].amount, 10)
+        self.assertIsInstance(received[-1], DamageDealt)
+        self.assertIs(received[-1].source, boss)
+    
+    def test_no_events_without_subscribers(self):
+        from events import EventBus, DamageDealt
+        bus = EventBus()
+        self.assertFalse(bus.wants(DamageDealt))
+        bus.emit(DamageDealt, None, None, 0, "attack")
+
+class TestLogger(unittest.TestCase):
+    
+    def test_log_is_bounded_and_lazy(self):
+        import mixins
+        boss = Boss("Босс", 1)
+        boss.log_echo = False
+        for i in range(mixins.LOG_SIZE + 10):
+            boss.add_log("Запись %s", i)
+        self.assertEqual(len(boss.log), mixins.LOG_SIZE)
+        self.assertTrue(boss.log[-1].endswith(f"Запись {mixins.LOG_SIZE + 9}"))
+    
+    def test_async_file_sink(self):
+        import os
+        import tempfile
+        from logsink import AsyncFileSink
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "battle.log")
+            boss = Boss("Босс", 1)
+            boss.log_echo = False
+            with AsyncFileSink(filename, max_bytes=200, backup_count=2, batch_size=2) as sink:
+                boss.log_sink = sink
+                for i in range(20):
+                    boss.add_log("Запись %s", i)
+            with open(filename, encoding="utf-8") as f:
+                lines = f.read().splitlines()
+            self.assertTrue(lines[-1].endswith("Запись 19"))
+            self.assertTrue(os.path.exists(filename + ".1"))
+
+class TestTurnOrder(unittest.TestCase):
+    
+    def setUp(self):
+        self.party = [Warrior("Воин"), Mage("Маг"), Healer("Лекарь"), Warrior("Воин 2")]
+        self.boss = Boss("Босс", 1)
+    
+    def test_order_matches_stable_sort(self):
+        from battle import TurnOrder
+        participants = self.party + [self.boss]
+        expected = sorted(participants, key=lambda x: x.agility, reverse=True)
+        turn_order = TurnOrder(participants)
+        self.assertEqual(list(turn_order), expected)
+        self.assertEqual(list(turn_order), expected)
+    
+    def test_dead_participants_are_dropped(self):
+        from battle import TurnOrder
+        turn_order = TurnOrder(self.party + [self.boss])
+        self.party[1].hp = 0
+        self.assertNotIn(self.party[1], list(turn_order))
+        self.assertNotIn(self.party[1], turn_order.order)
+    
+    def test_agility_change_reorders(self):
+        from battle import TurnOrder
+        turn_order = TurnOrder(self.party + [self.boss])
+        self.party[0].agility = 100
+        list(turn_order)
+        self.assertIs(next(iter(turn_order)), self.party[0])
+    
+    def test_multiple_actions(self):
+        from battle import SpeedTurnOrder
+        slow, fast = Warrior("Медленный"), Warrior("Быстрый")
+        slow.agility, fast.agility = 10, 30
+        turn_order = SpeedTurnOrder([slow, fast])
+        round_turns = list(turn_order)
+        self.assertEqual(round_turns.count(fast), 3)
+        self.assertEqual(round_turns.count(slow), 1)
+
+class TestSnapshot(unittest.TestCase):
+    
+    def make_battle(self):
+        party = [Warrior("Воин"), Mage("Маг"), Healer("Лекарь")]
+        return HeadlessBattle(party, Boss("Босс", 3), GreedyPolicy())
+    
+    def resume(self, battle):
+        battle.max_rounds = 300
+        result = battle.run()
+        return result.winner, result.rounds, [p.hp for p in battle.party + [battle.boss]]
+    
+    def test_round_trip_preserves_state(self):
+        import snapshot
+        from functools import partial
+        battle = self.make_battle()
+        battle.party[0].add_effect(PoisonEffect(5, 3))
+        battle.party[0].add_effect(PoisonEffect(7, 2))
+        battle.party[1].add_effect(ShieldEffect(30))
+        battle.party[2].cooldowns["Лечение"] = 2
+        battle.boss.damage_multiplier = 1.5
+        data = snapshot.dumps(battle)
+        restored = snapshot.loads(data, partial(HeadlessBattle, policies=GreedyPolicy()))
+        self.assertEqual(snapshot.dumps(restored), data)
+        poison = restored.party[0].effects.first_of_type(PoisonEffect)
+        self.assertEqual(poison.damage_per_turn, 12)
+        self.assertEqual(restored.party[2].cooldowns, {"Лечение": 2})
+        self.assertEqual(restored.boss.damage_multiplier, 1.5)
+    
+    def test_restored_battle_continues_identically(self):
+        import random
+        import snapshot
+        from functools import partial
+        battle = self.make_battle()
+        battle.rng.seed(11)
+        battle.max_rounds = 4
+        battle.run()
+        battle.is_active = True
+        data = snapshot.dumps(battle)
+        expected = self.resume(battle)
+        restored = snapshot.loads(data, partial(HeadlessBattle, policies=GreedyPolicy()))
+        self.assertEqual(self.resume(restored), expected)
+    
+    def test_rejects_foreign_data(self):
+        import snapshot
+        with self.assertRaises(snapshot.SnapshotError):
+            snapshot.loads(b"not a snapshot")
+        data = snapshot.dumps(self.make_battle())
+        with self.assertRaises(snapshot.SnapshotError):
+            snapshot.loads(data[:len(data) // 2])
+        # Поврежденное имя фазы босса той же длины
+        self.assertEqual(data.count(b"phase1"), 1)
+        with self.assertRaises(snapshot.SnapshotError):
+            snapshot.loads(data.replace(b"phase1", b"phaseX"))
+
+class TestJournal(unittest.TestCase):
+    
+    def setUp(self):
+        import tempfile
+        self.directory = tempfile.TemporaryDirectory()
+        self.basename = self.directory.name + "/autosave"
+    
+    def tearDown(self):
+        self.directory.cleanup()
+    
+    def make_battle(self, max_rounds, rng=None):
+        import random
+        party = [Warrior("Воин"), Mage("Маг"), Healer("Лекарь")]
+        battle = HeadlessBattle(party, Boss("Босс", 5), GreedyPolicy(), max_rounds=max_rounds,
+                                rng=rng or random.Random(5))
+        battle.enable_autosave(self.basename, checkpoint_every=3, sync=False)
+        self.battle = battle
+        return battle
+    
+    def recover(self):
+        import journal
+        self.battle.wait_for_saves()
+        from functools import partial
+        return journal.recover(self.basename, partial(HeadlessBattle, policies=GreedyPolicy()))
+    
+    def test_recovery_replays_checkpoint_and_journal(self):
+        import snapshot
+        battle = self.make_battle(max_rounds=7)
+        battle.run()
+        self.assertEqual(snapshot.dumps(self.recover()), snapshot.dumps(battle))
+    
+    def test_recovery_with_buffered_rng(self):
+        import snapshot
+        import streams
+        battle = self.make_battle(max_rounds=7, rng=streams.BufferedRandom(5, block_size=16))
+        battle.run()
+        recovered = self.recover()
+        self.assertEqual(snapshot.dumps(recovered), snapshot.dumps(battle))
+        self.assertEqual(recovered.rng.random(), battle.rng.random())
+    
+    def crash_and_recover(self, multiple_actions, crash_turn):
+        import random
+        import snapshot
+        from functools import partial
+        
+        class Crash(Exception):
+            pass
+        
+        class CrashingPolicy(GreedyPolicy):
+            turns = 0
+            
+            def choose_action(self, battle, player):
+                CrashingPolicy.turns += 1
+                if CrashingPolicy.turns == crash_turn:
+                    raise Crash()
+                return super().choose_action(battle, player)
+        
+        def make(policy):
+            party = [Warrior("Воин"), Mage("Маг"), Healer("Лекарь")]
+            return HeadlessBattle(party, Boss("Босс", 5), policy, multiple_actions=multiple_actions,
+                                  rng=random.Random(11))
+        
+        expected = make(GreedyPolicy())
+        expected_result = expected.run()
+        
+        battle = self.battle = make(CrashingPolicy())
+        battle.enable_autosave(self.basename, checkpoint_every=3, sync=False)
+        with self.assertRaises(Crash):
+            battle.run()
+        import journal
+        battle.wait_for_saves()
+        recovered = journal.recover(self.basename, partial(HeadlessBattle, policies=GreedyPolicy(),
+                                                           multiple_actions=multiple_actions))
+        self.assertIsNotNone(recovered.turn_position)
+        result = recovered.run()
+        self.assertEqual((result.winner, result.rounds), (expected_result.winner, expected_result.rounds))
+        self.assertEqual(snapshot.dumps(recovered), snapshot.dumps(expected))
+    
+    def test_crash_inside_round_resumes_the_round(self):
+        # 3 игрока за раунд: ход 8 - второй ход игрока в третьем раунде
+        self.crash_and_recover(multiple_actions=False, crash_turn=8)
+    
+    def test_crash_inside_round_with_multiple_actions(self):
+        self.crash_and_recover(multiple_actions=True, crash_turn=9)
+    
+    def test_interrupted_battle_flushes_journal(self):
+        import journal
+        import random
+        import snapshot
+        from functools import partial
+        
+        class InterruptingPolicy(GreedyPolicy):
+            turns = 0
+            
+            def choose_action(self, battle, player):
+                InterruptingPolicy.turns += 1
+                if InterruptingPolicy.turns == 8:
+                    raise KeyboardInterrupt()
+                return super().choose_action(battle, player)
+        
+        party = [Warrior("Воин"), Mage("Маг"), Healer("Лекарь")]
+        battle = HeadlessBattle(party, Boss("Босс", 5), InterruptingPolicy(), rng=random.Random(5))
+        battle.enable_autosave(self.basename, checkpoint_every=3, sync=False)
+        with self.assertRaises(KeyboardInterrupt):
+            battle.start_battle()
+        self.assertFalse(battle.writer._thread.is_alive())
+        recovered = journal.recover(self.basename, partial(HeadlessBattle, policies=GreedyPolicy()))
+        self.assertEqual(snapshot.dumps(recovered), snapshot.dumps(battle))
+        self.assertEqual(recovered.turn_position, battle.turn_position)
+    
+    def test_torn_record_is_ignored(self):
+        import snapshot
+        battle = self.make_battle(max_rounds=5)
+        battle.run()
+        expected = snapshot.dumps(battle)
+        with open(self.basename + ".pbj", "ab") as f:
+            f.write(b"\x40\x00\x00\x00garbage")
+        self.assertEqual(snapshot.dumps(self.recover()), expected)
+    
+    def test_journal_of_other_checkpoint_is_ignored(self):
+        import snapshot
+        battle = self.make_battle(max_rounds=5)
+        battle.run()
+        battle.wait_for_saves()
+        battle.round = 99
+        snapshot.save(battle, self.basename)
+        self.assertEqual(self.recover().round, 99)
+    
+    def test_background_save_does_not_see_later_changes(self):
+        import snapshot
+        battle = self.make_battle(max_rounds=2)
+        battle.party[0].add_effect(PoisonEffect(5, 3))
+        state = snapshot.freeze(battle)
+        expected = snapshot.encode(state)
+        battle.party[0].hp = 1
+        battle.party[0].cooldowns["Удар"] = 3
+        battle.party[0].effects.first_of_type(PoisonEffect).merge(PoisonEffect(7, 2))
+        self.assertEqual(snapshot.encode(state), expected)
+        self.assertNotEqual(snapshot.dumps(battle), expected)
+    
+    def test_save_snapshot_writes_in_background(self):
+        import snapshot
+        battle = self.make_battle(max_rounds=2)
+        battle.log_echo = False
+        expected = snapshot.dumps(battle)
+        battle.save_snapshot(self.basename + "_manual")
+        battle.party[0].hp = 1
+        battle.wait_for_saves()
+        with open(self.basename + "_manual.pbs", "rb") as f:
+            self.assertEqual(f.read(), expected)
+
+class TestSaveCatalog(unittest.TestCase):
+    
+    def setUp(self):
+        import tempfile
+        from battle import Battle
+        import snapshot
+        self.directory = tempfile.TemporaryDirectory()
+        battle = Battle([Warrior("Воин"), Mage("Маг")], Boss("Босс", 2))
+        battle.difficulty = "hard"
+        battle.round = 7
+        battle.boss.hp = battle.boss.max_hp // 4
+        self.state = snapshot.freeze(battle)
+    
+    def tearDown(self):
+        self.directory.cleanup()
+    
+    def catalog_with_read_counter(self):
+        from catalog import SaveCatalog
+        catalog = SaveCatalog(self.directory.name)
+        reads = []
+        read = catalog._read
+        catalog._read = lambda path: reads.append(path) or read(path)
+        return catalog, reads
+    
+    def test_metadata_from_index(self):
+        from catalog import SaveCatalog
+        SaveCatalog(self.directory.name).write(self.state, "first")
+        catalog, reads = self.catalog_with_read_counter()
+        [(name, meta)] = catalog.entries()
+        self.assertEqual(name, "first.pbs")
+        self.assertEqual(meta["difficulty"], "hard")
+        self.assertEqual(meta["round"], 7)
+        self.assertEqual(meta["boss_hp_percent"], 25)
+        self.assertEqual(meta["party"], [["Воин", "Warrior"], ["Маг", "Mage"]])
+        self.assertEqual(reads, [])
+    
+    def test_only_changed_files_are_read(self):
+        import os
+        import snapshot
+        from catalog import SaveCatalog
+        writer = SaveCatalog(self.directory.name)
+        writer.write(self.state, "first")
+        writer.write(self.state, "second")
+        path = os.path.join(self.directory.name, "second.pbs")
+        snapshot.write_state(self.state, path)
+        os.utime(path, ns=(1, 1))
+        os.remove(os.path.join(self.directory.name, "first.pbs"))
+        with open(os.path.join(self.directory.name, "notes.json"), "w") as f:
+            f.write("[]")
+        
+        catalog, reads = self.catalog_with_read_counter()
+        self.assertEqual([name for name, _ in catalog.entries()], ["second.pbs"])
+        self.assertEqual(len(reads), 2)
+        catalog, reads = self.catalog_with_read_counter()
+        catalog.entries()
+        self.assertEqual(reads, [])
+    
+    def test_legacy_json_saves_are_imported_once(self):
+        import os
+        import tempfile
+        from catalog import SaveCatalog
+        from battle import Battle
+        party = [Warrior("Воин"), Mage("Маг"), Healer("Лекарь")]
+        with tempfile.TemporaryDirectory() as legacy:
+            Battle(party, Boss("Босс", 5)).save_state(os.path.join(legacy, "old"))
+            with open(os.path.join(legacy, "notes.json"), "w") as f:
+                f.write("[]")
+            catalog = SaveCatalog(self.directory.name)
+            self.assertEqual(catalog.import_legacy(legacy), ["old.json"])
+            [(name, meta)] = catalog.entries()
+            self.assertEqual((name, meta["version"]), ("old.json", "json"))
+            
+            # Удаленная копия не возвращается при следующем запуске
+            os.remove(os.path.join(self.directory.name, "old.json"))
+            self.assertEqual(SaveCatalog(self.directory.name).import_legacy(legacy), [])
+            
+            # Не сохранение читается снова, только когда изменится
+            catalog = SaveCatalog(self.directory.name)
+            reads = []
+            read = catalog._read
+            catalog._read = lambda path: reads.append(path) or read(path)
+            catalog.import_legacy(legacy)
+            self.assertEqual(reads, [])
+            with open(os.path.join(legacy, "notes.json"), "w") as f:
+                f.write("[1, 2]")
+            catalog.import_legacy(legacy)
+            self.assertEqual(reads, [os.path.join(legacy, "notes.json")])
+
+class TestReplay(unittest.TestCase):
+    
+    def setUp(self):
+        import tempfile
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = self.directory.name + "/battle"
+    
+    def tearDown(self):
+        self.directory.cleanup()
+    
+    def record(self, seed, difficulty="normal", keyframe_every=None):
+        import random
+        import replay
+        from roster import create_party, create_boss
+        battle = HeadlessBattle(create_party(difficulty, [1, 2, 3]), create_boss(difficulty),
+                                RandomPolicy(random.Random(seed)), max_rounds=1000,
+                                rng=random.Random(seed))
+        battle.difficulty = difficulty
+        battle.recorder = replay.Recorder.for_battle(self.filename, battle, seed, keyframe_every)
+        battle.run()
+        battle.recorder.finish(battle)
+        return battle
+    
+    def test_replay_reproduces_final_state(self):
+        import replay
+        battle = self.record("seed-1")
+        recorded = replay.Replay.load(self.filename + ".pbr")
+        result = replay.run(recorded)
+        self.assertTrue(result.matches)
+        self.assertEqual(result.battle.round, battle.round)
+        self.assertEqual(result.battle.winner, battle.winner)
+    
+    def test_crits_do_not_use_global_random(self):
+        import random
+        import replay
+        self.record("seed-2")
+        recorded = replay.Replay.load(self.filename + ".pbr")
+        random.seed(0)
+        first = replay.run(recorded).actual_hash
+        random.seed(1)
+        self.assertEqual(replay.run(recorded).actual_hash, first)
+    
+    def test_seek_from_keyframe_matches_full_replay(self):
+        import replay
+        import snapshot
+        battle = self.record("seed-4", "easy", keyframe_every=3)
+        recorded = replay.Replay.load(self.filename + ".pbr")
+        keyframes = replay.Keyframes(replay.keyframe_file(self.filename))
+        self.assertEqual(len(keyframes), battle.round // 3)
+        for round_number in range(1, battle.round + 1):
+            from_keyframe = replay.seek(recorded, round_number, keyframes)
+            from_start = replay.seek(recorded, round_number, keyframes=())
+            self.assertEqual(from_keyframe.round, round_number)
+            self.assertEqual(snapshot.dumps(from_keyframe), snapshot.dumps(from_start))
+    
+    def test_build_keyframes_for_existing_replay(self):
+        import replay
+        battle = self.record("seed-5", "easy")
+        recorded = replay.Replay.load(self.filename + ".pbr")
+        replay.build_keyframes(recorded, 2)
+        self.assertEqual(len(replay.Keyframes(replay.keyframe_file(self.filename))), battle.round // 2)
+    
+    def test_other_seed_does_not_match(self):
+        import replay
+        self.record("seed-3")
+        recorded = replay.Replay.load(self.filename + ".pbr")
+        recorded.seed = "other"
+        self.assertFalse(replay.run(recorded).matches)
+
+class TestStreams(unittest.TestCase):
+    
+    def test_buffered_state_round_trip_mid_block(self):
+        import streams
+        rng = streams.BufferedRandom(3, block_size=8)
+        for _ in range(13):
+            rng.random()
+        state = rng.getstate()
+        expected = [rng.random() for _ in range(20)] + [rng.randint(1, 6)]
+        restored = streams.from_state(state)
+        self.assertEqual([restored.random() for _ in range(20)] + [restored.randint(1, 6)], expected)
+    
+    def test_buffered_copy_keeps_pending_block(self):
+        import streams
+        from unittest import mock
+        rng = streams.BufferedRandom(3, block_size=8, use_numpy=False)
+        for _ in range(13):
+            rng.random()
+        with mock.patch.object(streams.BufferedRandom, "_generate", side_effect=AssertionError):
+            clone = streams.copy(rng)
+            self.assertEqual([clone.random() for _ in range(3)], [rng.random() for _ in range(3)])
+        self.assertEqual(clone.getstate(), rng.getstate())
+        self.assertEqual([clone.random() for _ in range(10)] + [clone.randint(1, 6)],
+                         [rng.random() for _ in range(10)] + [rng.randint(1, 6)])
+    
+    def test_copy_does_not_seed(self):
+        import random
+        import streams
+        from unittest import mock
+        for rng in (random.Random(4), streams.BufferedRandom(4, block_size=8)):
+            with mock.patch.object(random.Random, "seed", side_effect=AssertionError), \
+                    mock.patch.object(streams.BufferedRandom, "seed", side_effect=AssertionError):
+                clone = streams.copy(rng)
+            self.assertEqual(clone.random(), rng.random())
+    
+    def test_buffered_rng_survives_snapshot(self):
+        import snapshot
+        import streams
+        from functools import partial
+        party = [Warrior("Воин"), Mage("Маг"), Healer("Лекарь")]
+        battle = HeadlessBattle(party, Boss("Босс", 3), GreedyPolicy(), max_rounds=4,
+                                rng=streams.new_stream(9, buffered=True))
+        battle.run()
+        restored = snapshot.loads(snapshot.dumps(battle), partial(HeadlessBattle, policies=GreedyPolicy()))
+        self.assertIsInstance(restored.rng, streams.BufferedRandom)
+        self.assertEqual([restored.rng.random() for _ in range(5)], [battle.rng.random() for _ in range(5)])
+    
+    def test_spawned_streams_are_reproducible_and_distinct(self):
+        import random
+        import streams
+        self.assertEqual(streams.spawn_seeds(42, 3, start=2), streams.spawn_seeds(42, 5)[2:])
+        first = [rng.random() for rng in streams.split(random.Random(1), 4)]
+        second = [rng.random() for rng in streams.split(random.Random(1), 4)]
+        self.assertEqual(first, second)
+        self.assertEqual(len(set(first)), 4)
+    
+    def test_battles_do_not_share_global_random(self):
+        import random
+        from simulate import run_battle
+        expected = run_battle("normal", [1, 2, 3], seed=7, policy="random")
+        random.seed(123)
+        random.random()
+        result = run_battle("normal", [1, 2, 3], seed=7, policy="random")
+        self.assertEqual((result.winner, result.rounds), (expected.winner, expected.rounds))
+
+class TestBenchmarks(unittest.TestCase):
+    
+    def test_compare_flags_regressions_above_threshold(self):
+        from benchmarks import compare_results
+        baseline = {"take_damage": 100.0, "TurnOrder": 200.0, "removed": 50.0}
+        current = {"take_damage": 109.0, "TurnOrder": 260.0, "new": 10.0}
+        rows = {name: regressed for name, _, _, _, regressed in compare_results(baseline, current, 0.1)}
+        self.assertEqual(rows, {"take_damage": False, "TurnOrder": True})
+    
+    def test_baseline_round_trip(self):
+        import os
+        import tempfile
+        from benchmarks import save_baseline, load_baseline, SUITE_CASES
+        self.assertTrue(any(name.startswith("Boss.choose_action") for name in SUITE_CASES))
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "baseline.json")
+            save_baseline({"update_all_effects": 1500.0}, filename)
+            self.assertEqual(load_baseline(filename), {"update_all_effects": 1500.0})
+    
+    def test_suite_cases_run(self):
+        from benchmarks import SUITE_CASES
+        for name, factory in SUITE_CASES.items():
+            if not name.startswith("10 боев"):
+                factory()()
+    
+    def test_filter_matches_whole_names(self):
+        from benchmarks import matches
+        self.assertTrue(matches("10 боев/hard", ["10 боев/hard"]))
+        self.assertFalse(matches("10 боев/hardcore", ["10 боев/hard"]))
+        self.assertTrue(matches("10 боев/hardcore", ["10 боев/*"]))
+        self.assertTrue(matches("TurnOrder/раунд", None))
+    
+    def test_boss_case_starts_each_call_from_same_state(self):
+        from benchmarks import SUITE_CASES
+        from effects import PoisonEffect
+        call = SUITE_CASES["Boss.choose_action/phase3"]()
+        for _ in range(5):
+            call()
+            self.assertEqual(sum(len(member.effects.of_type(PoisonEffect)) for member in call.party), 1)
+            self.assertEqual(call.boss.mp, call.boss.max_mp - 25)
+
+class TestClone(unittest.TestCase):
+    
+    def make_battle(self):
+        import random
+        party = [Warrior("Воин"), Mage("Маг"), Healer("Лекарь")]
+        battle = HeadlessBattle(party, Boss("Босс", 5), GreedyPolicy(), max_rounds=3, rng=random.Random(4))
+        battle.run()
+        battle.is_active = True
+        battle.max_rounds = 300
+        party[0].add_effect(PoisonEffect(4, 3))
+        party[0].add_effect(PoisonEffect(6, 2))
+        party[1].add_effect(ShieldEffect(25))
+        party[2].cooldowns["Лечение"] = 1
+        return battle
+    
+    def test_clone_is_independent_copy(self):
+        import snapshot
+        battle = self.make_battle()
+        expected = snapshot.dumps(battle)
+        clone = battle.clone()
+        self.assertEqual(snapshot.dumps(clone), expected)
+        self.assertIs(clone.party[0].skills[0], battle.party[0].skills[0])
+        self.assertIs(clone.boss.strategies, battle.boss.strategies)
+        result = clone.run()
+        self.assertFalse(clone.is_active)
+        self.assertEqual(snapshot.dumps(battle), expected)
+        self.assertEqual(battle.run().rounds, result.rounds)
+    
+    def test_restore_returns_to_saved_state_repeatedly(self):
+        import snapshot
+        battle = self.make_battle()
+        saved = battle.clone()
+        expected = snapshot.dumps(saved)
+        outcomes = []
+        for _ in range(2):
+            outcomes.append(battle.run().rounds)
+            battle.restore(saved)
+            self.assertEqual(snapshot.dumps(battle), expected)
+        self.assertEqual(outcomes[0], outcomes[1])
+    
+    def test_clone_of_interactive_battle_is_silent(self):
+        import io
+        import contextlib
+        from battle import Battle
+        battle = Battle([Warrior("Воин")], Boss("Босс"))
+        clone = battle.clone()
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            clone.boss.choose_action(clone.party)
+            clone.add_log("Раунд %s", 1)
+        self.assertEqual(output.getvalue(), "")
+        self.assertEqual(battle.party[0].hp, battle.party[0].max_hp)
+
+class TestInstrument(unittest.TestCase):
+    
+    def tearDown(self):
+        import instrument
+        instrument.disable()
+    
+    def test_enable_counts_hot_paths_and_disable_restores(self):
+        import instrument
+        from battle import Battle
+        original = Battle.process_turn
+        metrics = instrument.enable()
+        self.assertIsNot(Battle.process_turn, original)
+        party = [Warrior("Воин"), Mage("Маг"), Healer("Лекарь")]
+        result = HeadlessBattle(party, Boss("Босс", 3), GreedyPolicy()).run()
+        report = metrics.report()
+        self.assertEqual(report["timers"]["battle.Battle.update_all_effects"]["calls"], result.rounds)
+        self.assertGreater(report["timers"]["bosses.Boss.choose_action"]["calls"], 0)
+        self.assertGreater(report["timers"]["skills.DamageSkill.use"]["calls"], 0)
+        self.assertEqual(sorted(report["effect_ticks"]), list(range(1, result.rounds + 1)))
+        instrument.disable()
+        self.assertIs(Battle.process_turn, original)
+    
+    def test_exit_dump_is_registered_once(self):
+        import os
+        import subprocess
+        import sys
+        import tempfile
+        with tempfile.TemporaryDirectory() as directory:
+            report = os.path.join(directory, "metrics.json")
+            # Отчет пишется при выходе процесса: повторные enable не добавляют записей,
+            # disable отменяет запись, а следующий enable снова ее включает
+            code = ("import instrument\n"
+                    "instrument.Metrics.dump = lambda self, filename: print('dump', filename)\n"
+                    f"instrument.enable({report!r}); instrument.enable({report!r})\n"
+                    "instrument.enable(); instrument.disable()\n"
+                    f"instrument.enable({report!r})\n")
+            output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+        self.assertEqual(output.stdout.splitlines(), [f"dump {report}"])
+    
+    def test_merged_timer_keeps_totals(self):
+        import instrument
+        first, second = instrument.Metrics(), instrument.Metrics()
+        for duration in range(100):
+            first.timer("t").add(duration)
+        second.timer("t").add(1000)
+        second.add_ticks(1, 5)
+        first.merge(second.state())
+        summary = first.report()["timers"]["t"]
+        self.assertEqual((summary["calls"], summary["total_ms"]), (101, (4950 + 1000) / 1e6))
+        self.assertEqual(first.effect_ticks, {1: 5})
+
+class TestProfiler(unittest.TestCase):
+    
+    def test_collapsed_stacks_are_labeled_by_module(self):
+        import time
+        from profiler import SamplingProfiler
+        from simulate import run_battle
+        with SamplingProfiler(interval=0.001) as profiler:
+            deadline = time.perf_counter() + 0.2
+            while time.perf_counter() < deadline:
+                run_battle("normal", [1, 2, 3], seed=1)
+        self.assertGreater(profiler.samples, 0)
+        stacks = [line.rsplit(" ", 1)[0].split(";") for line in profiler.collapsed()]
+        self.assertTrue(any(stack[0] == "MainThread" and "battle:HeadlessBattle.run" in stack
+                            for stack in stacks))
+        self.assertIn("battle", profiler.module_totals())
+    
+    def test_waiting_for_input_is_idle(self):
+        import time
+        from unittest import mock
+        from profiler import SamplingProfiler, wait_input
+        
+        def slow_input(prompt=""):
+            time.sleep(0.1)
+            return "1"
+        
+        for include_idle in (False, True):
+            with mock.patch("builtins.input", slow_input):
+                with SamplingProfiler(interval=0.001, include_idle=include_idle) as profiler:
+                    self.assertEqual(wait_input("> "), "1")
+            waiting = [stack for stack in profiler.stacks if "profiler:wait_input" in stack]
+            self.assertEqual(bool(waiting), include_idle)
+
+class TestSearch(unittest.TestCase):
+    
+    def make_battle(self):
+        import random
+        party = [Warrior("Воин"), Mage("Маг"), Healer("Лекарь")]
+        return HeadlessBattle(party, Boss("Босс", 5), GreedyPolicy(), max_rounds=60, rng=random.Random(7))
+    
+    def test_fixed_iterations_are_reproducible(self):
+        import search
+        import snapshot
+        choices = []
+        for _ in range(2):
+            battle = self.make_battle()
+            expected = snapshot.dumps(battle)
+            engine = search.attach(battle, budget_ms=None, iterations=24, horizon=5, seed=3)
+            action_type, target = battle.boss.current_strategy.choose_action(battle.party)
+            self.assertIn(action_type, ("attack", "aoe", "poison"))
+            self.assertEqual(sum(visits for _, (visits, _) in engine.last_stats), 24)
+            self.assertEqual(snapshot.dumps(battle), expected)
+            choices.append((action_type, [member.name for member in target] if action_type == "aoe" else target.name))
+        self.assertEqual(choices[0], choices[1])
+    
+    def test_battle_with_search_boss_finishes(self):
+        import search
+        battle = self.make_battle()
+        search.attach(battle, budget_ms=None, iterations=8, horizon=3, seed=1)
+        self.assertTrue(battle.boss.current_strategy.title.endswith("поиск"))
+        result = battle.run()
+        self.assertFalse(battle.is_active)
+        self.assertIn(result.winner, ("party", "boss", None))
+    
+    def test_finish_round_follows_battle_turn_order(self):
+        import random
+        import search
+        import snapshot
+        
+        class Probe(HeadlessBattle):
+            probe = None
+            
+            def take_action(self, participant):
+                # Копия перед первым ходом босса во втором раунде
+                if participant is self.boss and self.round == 2 and self.probe is None:
+                    self.probe = HeadlessBattle.from_battle(self, GreedyPolicy())
+                super().take_action(participant)
+        
+        for multiple_actions in (False, True):
+            party = [Warrior("Воин"), Mage("Маг"), Healer("Лекарь")]
+            battle = Probe(party, Boss("Босс", 5), GreedyPolicy(), multiple_actions=multiple_actions,
+                           rng=random.Random(3))
+            turn_order = battle.create_turn_order()
+            battle.play_round(turn_order)
+            battle.play_round(turn_order)
+            
+            probe = battle.probe
+            probe.take_action(probe.boss)
+            search.finish_round(probe, len(probe.party))
+            self.assertEqual(snapshot.dumps(probe), snapshot.dumps(battle))
+    
+    def boss_turn_mid_round(self):
+        """Бой с несколькими действиями за раунд, остановленный перед вторым ходом босса в первом раунде"""
+        import random
+        
+        class Stop(Exception):
+            pass
+        
+        class Probe(HeadlessBattle):
+            boss_turns = 0
+            
+            def take_action(self, participant):
+                if participant is self.boss:
+                    Probe.boss_turns += 1
+                    if Probe.boss_turns == 2:
+                        raise Stop()
+                super().take_action(participant)
+        
+        party = [Warrior("Воин"), Mage("Маг"), Healer("Лекарь")]
+        battle = Probe(party, Boss("Босс", 5), GreedyPolicy(), multiple_actions=True, rng=random.Random(3))
+        with self.assertRaises(Stop):
+            battle.play_round(battle.create_turn_order())
+        return battle
+    
+    def test_worker_root_keeps_turn_position(self):
+        import math
+        import random
+        import search
+        import snapshot
+        battle = self.boss_turn_mid_round()
+        self.assertIsNotNone(battle.turn_position)
+        actions = search.boss_actions(battle.boss, battle.party)
+        engine = search.BossSearch(battle, search.rules_of(battle.boss), horizon=3)
+        local = search.search(engine._root(), actions, math.inf, random.Random(5), 3, iterations=30)
+        worker = search._search_snapshot(snapshot.dumps(battle), battle.turn_position, actions,
+                                         math.inf, 5, 3, iterations=30)
+        self.assertEqual(worker, local)
+    
+    def test_worker_pool_search(self):
+        import search
+        self.addCleanup(search.shutdown)
+        battle = self.boss_turn_mid_round()
+        engine = search.attach(battle, budget_ms=None, workers=1, iterations=10, horizon=3, seed=2)
+        battle.boss.current_strategy.choose_action(battle.party)
+        self.assertEqual(sum(visits for _, (visits, _) in engine.last_stats), 20)
+
+class TestHints(unittest.TestCase):
+    
+    def make_battle(self):
+        import random
+        from battle import Battle
+        party = [Warrior("Воин"), Mage("Маг"), Healer("Лекарь")]
+        return Battle(party, Boss("Босс", 5), rng=random.Random(2))
+    
+    def test_background_rollouts_leave_battle_unchanged(self):
+        import time
+        import snapshot
+        from hints import HintEngine
+        battle = self.make_battle()
+        expected = snapshot.dumps(battle)
+        engine = HintEngine(horizon=10, seed=1)
+        hints = engine.start(battle, battle.party[1])
+        deadline = time.monotonic() + 10
+        while hints.rollouts < 2 * len(hints.actions) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        engine.cancel()
+        hints.join(1)
+        self.assertFalse(hints._thread.is_alive())
+        rows = hints.ranking()
+        self.assertEqual(len(rows), len(battle.legal_actions(battle.party[1])))
+        self.assertTrue(all(0 <= chance <= 1 for _, _, _, chance in rows))
+        self.assertIn(rows[0][0], engine.format())
+        self.assertEqual(snapshot.dumps(battle), expected)
+    
+    def test_perform_action_cancels_search(self):
+        from hints import HintEngine
+        battle = self.make_battle()
+        battle.hints = HintEngine(seed=1)
+        hints = battle.hints.start(battle, battle.party[0])
+        battle.perform_action(battle.party[0], ("skip", None, None))
+        # perform_action дожидается остановки потока
+        self.assertFalse(hints._thread.is_alive())
+        self.assertIsNone(battle.clone().hints)
+    
+    def test_hints_are_opt_in(self):
+        import main
+        self.assertFalse(main.HINTS)
+
+class TestSolver(unittest.TestCase):
+    
+    def make_battle(self, policy=None, seed=0):
+        import random
+        party = [Warrior("Воин"), Mage("Маг"), Healer("Лекарь")]
+        return HeadlessBattle(party, Boss("Босс", 1), policy or GreedyPolicy(), rng=random.Random(seed))
+    
+    def test_crit_outcomes_cover_all_rolls(self):
+        import solver
+        battle = self.make_battle()
+        position = solver._Position.from_battle(battle, GreedyPolicy())
+        solver._use_rng(position, solver._ScriptedRolls())
+        outcomes = solver.Solver()._outcomes(position, lambda b: b.party[0].basic_attack(b.boss))
+        self.assertEqual(sorted(round(p, 2) for p, _ in outcomes), [0.45, 0.55])
+        self.assertEqual(len({child.boss.hp for _, child in outcomes}), 2)
+        self.assertEqual(battle.boss.hp, battle.boss.max_hp)
+    
+    def test_hasher_buckets_hp_and_separates_actors(self):
+        import solver
+        battle = self.make_battle()
+        hasher = solver.StateHasher(hp_buckets=10)
+        key = hasher.key(battle, 0)
+        self.assertEqual(solver.StateHasher(hp_buckets=10).key(battle, 0), key)
+        self.assertNotEqual(hasher.key(battle, 1), key)
+        battle.boss.hp -= 1
+        self.assertEqual(hasher.key(battle, 0), key)
+        battle.boss.hp = battle.boss.max_hp // 2
+        self.assertNotEqual(hasher.key(battle, 0), key)
+    
+    def test_solved_policy_table_round_trip(self):
+        import os
+        import tempfile
+        import solver
+        engine = solver.Solver()
+        self.assertEqual(engine.solve(self.make_battle()), 1.0)
+        table = engine.policy()
+        self.assertGreater(len(table), 0)
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "policy.json")
+            table.save(filename)
+            loaded = solver.PolicyTable.load(filename)
+        self.assertEqual(loaded.actions, table.actions)
+        policy = solver.SolvedPolicy(loaded)
+        self.assertTrue(self.make_battle(policy, seed=3).run().party_won)
+        self.assertGreater(policy.hits, 0)
+
+class TestEstimator(unittest.TestCase):
+    
+    def test_crit_hit_mean_and_variance(self):
+        from estimator import hit
+        self.assertEqual(hit(100.9, 0.0), (100, 0.0))
+        mean, variance = hit(100, 0.5)
+        self.assertEqual(mean, 125)
+        self.assertEqual(variance, 625)
+    
+    def test_estimate_orders_difficulties(self):
+        from estimator import estimate
+        from roster import create_party, create_boss
+        easy = estimate(create_party("easy", [1, 2, 3]), create_boss("easy"))
+        hardcore = estimate(create_party("hardcore", [1, 2, 3]), create_boss("hardcore"))
+        self.assertGreater(easy.win_chance, 0.9)
+        self.assertLess(hardcore.win_chance, 0.1)
+        self.assertGreater(easy.party_dpr, hardcore.party_dpr)
+        self.assertIn("Прогноз", str(easy))
+    
+    def test_wiped_party_is_not_targeted(self):
+        from estimator import estimate
+        from roster import create_party, create_boss
+        party = create_party("normal", [1, 2, 3])
+        for member in party:
+            member.hp = 0
+        self.assertEqual(estimate(party, create_boss("normal")).win_chance, 0.0)
+    
+    def test_calibration_against_simulation(self):
+        from estimator import calibrate, summarize
+        rows = calibrate(["easy", "hardcore"], ["wmh"], battles=10)
+        self.assertEqual(len(rows), 2)
+        self.assertLess(summarize(rows)["win_mae"], 0.2)
+
 if __name__ == '__main__':
-    unittest.main()
\ No newline at end of file
+    unittest.main()
@@ -0,0 +1,345 @@
+"""Пакетный симулятор: множество независимых боев в массивах NumPy
+
+Состояние всех боев хранится по столбцам (структура массивов), и бои
+продвигаются синхронно по ходам. Формулы повторяют Warrior/Mage/Healer.basic_attack,
+DamageSkill/HealSkill/EffectSkill.use, Boss.basic_attack/aoe_attack/poison_attack
+и пороги фаз Boss.choose_action. Персонажи действуют по правилам GreedyPolicy.
+Эффект регенерации не моделируется: его не накладывает ни один навык.
+"""
+import argparse
+import math
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - NumPy необязателен
+    np = None
+
+from battle import TurnOrder
+from characters import Warrior, Mage, Healer
+from effects import PoisonEffect, ShieldEffect
+from roster import create_party, create_boss
+from skills import DamageSkill, HealSkill, EffectSkill
+
+HP_LIMIT = 1000
+
+PARTY_WON = 1
+BOSS_WON = 2
+
+
+class BatchResult:
+    """Итоги пакета боев: массивы победителей и числа раундов"""
+
+    def __init__(self, winners, rounds):
+        self.winners = winners
+        self.rounds = rounds
+
+    @property
+    def battles(self):
+        return len(self.winners)
+
+    @property
+    def win_rate(self):
+        return float(np.mean(self.winners == PARTY_WON))
+
+    @property
+    def mean_rounds(self):
+        return float(np.mean(self.rounds))
+
+    def __repr__(self):
+        return f"BatchResult(battles={self.battles}, win_rate={self.win_rate:.3f}, mean_rounds={self.mean_rounds:.2f})"
+
+
+class BatchBattle:
+    """Много одинаково настроенных боев, продвигаемых синхронно"""
+
+    def __init__(self, difficulty, composition, battles, seed=None, max_rounds=200):
+        if np is None:
+            raise ImportError("Для пакетного симулятора нужен NumPy")
+
+        self.party = create_party(difficulty, composition)
+        self.boss = create_boss(difficulty)
+        self.battles = battles
+        self.max_rounds = max_rounds
+        self.rng = np.random.default_rng(seed)
+
+        size = len(self.party)
+        self.order = TurnOrder(self.party + [self.boss]).order
+
+        # Состояние группы: [бой, персонаж]
+        self.hp = np.tile(np.array([c.hp for c in self.party], dtype=np.int64), (battles, 1))
+        self.mp = np.tile(np.array([c.mp for c in self.party], dtype=np.float64), (battles, 1))
+        self.max_hp = np.array([c.max_hp for c in self.party], dtype=np.int64)
+        self.cooldowns = np.zeros((battles, size, max(len(c.skills) for c in self.party)), dtype=np.int64)
+        # Яд босса на персонаже: оставшаяся длительность
+        self.poison_left = np.zeros((battles, size), dtype=np.int64)
+        # Щит от мага: цель, запас и длительность, по индексу наложившего
+        self.shield_target = np.full((battles, size), -1, dtype=np.int64)
+        self.shield_amount = np.zeros((battles, size), dtype=np.int64)
+        self.shield_left = np.zeros((battles, size), dtype=np.int64)
+
+        # Состояние босса: [бой]
+        self.boss_hp = np.full(battles, self.boss.hp, dtype=np.int64)
+        self.boss_mp = np.full(battles, self.boss.mp, dtype=np.float64)
+        # Яд отравленного дротика на боссе, по индексу лекаря
+        self.boss_poison_left = np.zeros((battles, size), dtype=np.int64)
+        self.boss_poison_damage = np.zeros(size, dtype=np.int64)
+
+        self.active = np.ones(battles, dtype=bool)
+        self.winners = np.zeros(battles, dtype=np.int8)
+        self.rounds = np.zeros(battles, dtype=np.int64)
+        self.boss_poison_damage_per_turn = int(12 * self.boss.damage_multiplier)
+
+    def run(self):
+        """Проведение всех боев до конца"""
+        for _ in range(self.max_rounds):
+            if not self.active.any():
+                break
+            self.play_round()
+        return BatchResult(self.winners.copy(), self.rounds.copy())
+
+    def play_round(self):
+        self.rounds[self.active] += 1
+        for participant in self.order:
+            if participant is self.boss:
+                self.boss_turn()
+            else:
+                self.party_turn(self.party.index(participant))
+            self.check_battle_end()
+        self.update_all_effects()
+
+    def check_battle_end(self):
+        boss_dead = self.active & (self.boss_hp <= 0)
+        self.winners[boss_dead] = PARTY_WON
+        party_dead = self.active & ~boss_dead & (self.hp <= 0).all(axis=1)
+        self.winners[party_dead] = BOSS_WON
+        self.active &= ~(boss_dead | party_dead)
+
+    def update_all_effects(self):
+        alive = self.active[:, None] & (self.hp > 0)
+        self.poison_left -= alive
+        np.maximum(self.poison_left, 0, out=self.poison_left)
+        self.cooldowns -= alive[:, :, None]
+        np.maximum(self.cooldowns, 0, out=self.cooldowns)
+
+        # Щит обновляется вместе с эффектами живой цели
+        target = np.clip(self.shield_target, 0, None)
+        target_alive = np.take_along_axis(alive, target, axis=1) & (self.shield_target >= 0)
+        self.shield_left -= target_alive
+        expired = self.shield_left <= 0
+        self.shield_target[expired] = -1
+        self.shield_amount[expired] = 0
+        self.shield_left[expired] = 0
+
+        boss_alive = self.active & (self.boss_hp > 0)
+        self.boss_poison_left -= boss_alive[:, None]
+        np.maximum(self.boss_poison_left, 0, out=self.boss_poison_left)
+
+    # --- Урон и лечение ---
+
+    def crit(self, damage, chance, mask):
+        """CritMixin.calculate_crit для всех боев сразу"""
+        rolls = self.rng.random(self.battles)
+        return np.where(mask & (rolls < chance), damage * 1.5, damage)
+
+    def damage_party(self, target, damage, mask):
+        """Human.take_damage для персонажа target с учетом щитов"""
+        damage = np.where(mask, damage, 0).astype(np.int64)
+        for caster in range(len(self.party)):
+            covers = (self.shield_target[:, caster] == target) & (damage > 0)
+            absorbed = np.where(covers, np.minimum(self.shield_amount[:, caster], damage), 0)
+            self.shield_amount[:, caster] -= absorbed
+            damage -= absorbed
+        self.hp[:, target] = np.maximum(0, self.hp[:, target] - damage)
+
+    def damage_boss(self, damage, mask):
+        self.boss_hp = np.where(mask, np.maximum(0, self.boss_hp - damage.astype(np.int64)), self.boss_hp)
+
+    def heal_party(self, target, amount, mask):
+        healed = np.minimum(np.minimum(self.max_hp[target], self.hp[:, target] + amount), HP_LIMIT)
+        self.hp[:, target] = np.where(mask, healed, self.hp[:, target])
+
+    # --- Ход персонажа ---
+
+    def party_turn(self, index):
+        character = self.party[index]
+        acting = self.active & (self.hp[:, index] > 0)
+
+        # Эффекты начала хода: яд босса
+        poisoned = acting & (self.poison_left[:, index] > 0)
+        self.damage_party(index, np.full(self.battles, self.boss_poison_damage_per_turn), poisoned)
+        acting &= self.hp[:, index] > 0
+
+        # GreedyPolicy: лечение самого раненого союзника
+        ratio = self.hp / self.max_hp
+        ratio = np.where(self.hp > 0, ratio, np.inf)
+        weakest_ally = np.argmin(ratio, axis=1)
+        needs_help = np.min(ratio, axis=1) < 0.5
+
+        remaining = acting.copy()
+        for skill_index, skill in enumerate(character.skills):
+            if not self.is_support_skill(skill):
+                continue
+            use = remaining & needs_help & self.skill_ready(index, skill_index, skill)
+            self.use_skill(index, skill_index, skill, weakest_ally, use)
+            remaining &= ~use
+
+        # Атакующий навык по боссу
+        for skill_index, skill in enumerate(character.skills):
+            if self.is_support_skill(skill):
+                continue
+            use = remaining & self.skill_ready(index, skill_index, skill)
+            self.use_skill(index, skill_index, skill, None, use)
+            remaining &= ~use
+            break
+
+        self.basic_attack(character, remaining)
+
+    @staticmethod
+    def is_support_skill(skill):
+        return isinstance(skill, HealSkill) or (isinstance(skill, EffectSkill) and skill.effect_class == ShieldEffect)
+
+    def skill_ready(self, index, skill_index, skill):
+        return (self.mp[:, index] >= skill.mana_cost) & (self.cooldowns[:, index, skill_index] <= 0)
+
+    def use_skill(self, index, skill_index, skill, target, mask):
+        if not mask.any():
+            return
+        caster = self.party[index]
+        self.mp[:, index] = np.where(mask, np.maximum(0, self.mp[:, index] - skill.mana_cost), self.mp[:, index])
+
+        if isinstance(skill, DamageSkill):
+            if skill.damage_type == "physical":
+                damage = skill.base_damage + caster.strength * 1.5
+            else:
+                damage = skill.base_damage + caster.intelligence * 1.7
+            damage = self.crit(np.full(self.battles, damage), 0.1, mask)
+            self.damage_boss(damage.astype(np.int64), mask)
+        elif isinstance(skill, HealSkill):
+            amount = int(skill.base_heal + caster.intelligence * 1.2)
+            for ally in range(len(self.party)):
+                self.heal_party(ally, amount, mask & (target == ally))
+        elif skill.effect_class == ShieldEffect:
+            amount = skill.effect_kwargs.get("shield_amount", 20)
+            self.shield_target[:, index] = np.where(mask, target, self.shield_target[:, index])
+            self.shield_amount[:, index] = np.where(mask, amount, self.shield_amount[:, index])
+            self.shield_left[:, index] = np.where(mask, skill.effect_kwargs.get("duration", 2),
+                                                  self.shield_left[:, index])
+        elif skill.effect_class == PoisonEffect:
+            self.boss_poison_damage[index] = skill.effect_kwargs.get("damage_per_turn", 5)
+            self.boss_poison_left[:, index] = np.where(mask, skill.effect_kwargs.get("duration", 3),
+                                                       self.boss_poison_left[:, index])
+
+        self.cooldowns[:, index, skill_index] = np.where(mask, skill.cooldown, self.cooldowns[:, index, skill_index])
+
+    def basic_attack(self, character, mask):
+        if isinstance(character, Warrior):
+            damage = self.crit(np.full(self.battles, 50 + character.strength * 0.3), 0.45, mask)
+        elif isinstance(character, Mage):
+            damage = np.full(self.battles, 45 + character.intelligence * 0.2)
+        elif isinstance(character, Healer):
+            damage = np.full(self.battles, 35 + character.strength * 0.2)
+        else:
+            raise TypeError(f"Неизвестный класс персонажа: {character.__class__.__name__}")
+        self.damage_boss(damage.astype(np.int64), mask)
+
+    # --- Ход босса ---
+
+    def boss_turn(self):
+        boss = self.boss
+        acting = self.active & (self.boss_hp > 0)
+
+        # Эффекты начала хода: отравленные дротики
+        ticks = (self.boss_poison_left > 0) @ self.boss_poison_damage
+        self.damage_boss(ticks, acting)
+        acting &= self.boss_hp > 0
+
+        alive = self.hp > 0
+        hp_percent = self.boss_hp / boss.max_hp
+        phase1 = acting & (hp_percent > 0.7)
+        phase2 = acting & ~phase1 & (hp_percent > 0.3)
+        phase3 = acting & ~phase1 & ~phase2
+
+        weakest = np.argmin(np.where(alive, self.hp, np.iinfo(np.int64).max), axis=1)
+        first_alive = np.argmax(alive, axis=1)
+
+        # AggressiveStrategy
+        self.boss_attack(weakest, phase1)
+
+        # AOEStrategy
+        several = alive.sum(axis=1) >= 2
+        aoe = phase2 & several & (self.boss_mp >= 40)
+        self.boss_attack(first_alive, phase2 & several & ~aoe)
+        self.boss_attack(weakest, phase2 & ~several)
+        if aoe.any():
+            self.boss_mp = np.where(aoe, np.maximum(0, self.boss_mp - 40), self.boss_mp)
+            damage = int((15 + boss.intelligence * 0.3) * boss.damage_multiplier)
+            for target in range(len(self.party)):
+                self.damage_party(target, np.full(self.battles, damage), aoe & alive[:, target])
+
+        # DebuffStrategy
+        unpoisoned = alive & (self.poison_left <= 0)
+        has_unpoisoned = unpoisoned.any(axis=1)
+        first_unpoisoned = np.argmax(unpoisoned, axis=1)
+        poison = phase3 & has_unpoisoned & (self.boss_mp >= 25)
+        self.boss_attack(first_unpoisoned, phase3 & has_unpoisoned & ~poison)
+        self.boss_attack(weakest, phase3 & ~has_unpoisoned)
+        if poison.any():
+            self.boss_mp = np.where(poison, np.maximum(0, self.boss_mp - 25), self.boss_mp)
+            rows = np.nonzero(poison)[0]
+            self.poison_left[rows, first_unpoisoned[rows]] = 3
+
+    def boss_attack(self, target, mask):
+        """Boss.basic_attack по цели target[бой]"""
+        if not mask.any():
+            return
+        damage = (20 + self.boss.strength * 0.4) * self.boss.damage_multiplier
+        damage = self.crit(np.full(self.battles, damage), 0.2, mask).astype(np.int64)
+        for index in range(len(self.party)):
+            self.damage_party(index, damage, mask & (target == index))
+
+
+def check_against_object_engine(difficulty, composition, battles, seed=0, max_rounds=200):
+    """Сравнение распределений исходов с объектным движком (HeadlessBattle + GreedyPolicy)
+
+    Возвращает (результат пакета, доля побед объектного движка, средние раунды, z-статистика)
+    """
+    from simulate import run_battle
+
+    batch = BatchBattle(difficulty, composition, battles, seed, max_rounds).run()
+    results = [run_battle(difficulty, composition, seed + i, "greedy", max_rounds) for i in range(battles)]
+    wins = sum(result.party_won for result in results)
+    mean_rounds = sum(result.rounds for result in results) / battles
+
+    # Двухвыборочный z-тест для долей побед
+    pooled = (wins + batch.win_rate * battles) / (2 * battles)
+    spread = math.sqrt(max(pooled * (1 - pooled) * 2 / battles, 1e-12))
+    z = (batch.win_rate - wins / battles) / spread
+    return batch, wins / battles, mean_rounds, z
+
+
+def main(argv=None):
+    from simulate import DIFFICULTIES, parse_composition
+
+    parser = argparse.ArgumentParser(description="Пакетная симуляция боев на NumPy")
+    parser.add_argument("-n", "--battles", type=int, default=100000)
+    parser.add_argument("-d", "--difficulty", action="append", choices=DIFFICULTIES)
+    parser.add_argument("-p", "--party", action="append")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--check", action="store_true", help="сравнить с объектным движком")
+    args = parser.parse_args(argv)
+
+    for difficulty in args.difficulty or DIFFICULTIES:
+        for text in args.party or ["wmh"]:
+            composition = parse_composition(text)
+            if args.check:
+                batch, win_rate, mean_rounds, z = check_against_object_engine(
+                    difficulty, composition, args.battles, args.seed)
+                status = "OK" if abs(z) < 3 else "РАСХОЖДЕНИЕ"
+                print(f"{difficulty:<9} {text:<5} numpy: {batch.win_rate:6.1%} / {batch.mean_rounds:6.2f}  "
+                      f"объекты: {win_rate:6.1%} / {mean_rounds:6.2f}  z={z:+.2f} {status}")
+            else:
+                print(f"{difficulty:<9} {text:<5} {BatchBattle(difficulty, composition, args.battles, args.seed).run()}")
+
+
+if __name__ == "__main__":
+    main()